@@ -1,5 +1,6 @@
 import argparse
 import random
+import sys
 import time
 import hashlib
 import uuid
@@ -8,12 +9,11 @@ import matplotlib.pyplot as plt
 import numpy as np
 from blockchain import Block
 from blockchain import Blockchain
-import heapq
 import os
 from Tree import Tree
-
-UTX = []       #Unspent Transaction pool
-glob_time = 0  # a variable to maintain time used for simulation
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'common'))    # simulation.py is shared by both assignments
+from simulation import Simulation, TimedPriorityQueue
+from simulation import GEN_TX, RECV_TX, START_MINING, SEND_BLK, MINED_BLK, RECV_BLK
 
 
 
@@ -30,42 +30,6 @@ def exponential_iterator(mean):
     while True:
         yield np.random.exponential(scale=mean)
 
-class TimedPriorityQueue:
-    """
-    Priority queue implementation based on timestamps.
-
-    Attributes:
-        heap (list): List representing the priority queue.
-        counter (int): Counter for maintaining the insertion order of elements.
-    """
-    def __init__(self):
-        """
-        Initializes a new TimedPriorityQueue object.
-        """
-        self.heap = []
-        self.counter = 0
-
-    def push(self, variable_list, timestamp):
-        """
-        Pushes a variable list into the priority queue with a specified timestamp.
-
-        Args:
-            variable_list (list): List of variables to be pushed into the queue.
-            timestamp (float): Timestamp associated with the variable list.
-        """
-        heapq.heappush(self.heap, (timestamp, self.counter, variable_list))
-        self.counter += 1
-
-    def pop(self):
-        """
-        Pops the variable list with the smallest timestamp from the priority queue.
-
-        Returns:
-            tuple: A tuple containing the timestamp and the variable list.
-        """
-        ts, _, variable_list = heapq.heappop(self.heap)
-        return ts, variable_list
-
 class Transaction:
     """
     Class for creating Transaction details between 2 parties
@@ -109,14 +73,16 @@ class Transaction:
         return f'{self.txid}: {self.sender.name} pays {self.receiver.name} {self.amount} coins'
     
 class Peer:
-    def __init__(self, name, id):
+    def __init__(self, name, id, sim=None):
         """
         Initializes a new Peer object.
 
         Args:
             name (str): Name of the peer.
             id (str): Unique identifier for the peer.
+            sim (P2PSimulation, optional): Run the peer belongs to, for the clock, event queue and UTX. Defaults to None.
         """
+        self.sim = sim
         self.simtime = time.time()
         self.name = name
         self.ID = id
@@ -172,8 +138,8 @@ class Peer:
         """
         for others in self.neighbor:                            #broadcasting to all neighbors
             if msg not in others.txpool:
-                t = glob_time + self.Delay(others, msg)         # calculating the delay for transaction
-                tpq.push([others, 2, msg], t)
+                t = self.sim.now + self.Delay(others, msg)      # calculating the delay for transaction
+                self.sim.queue.push(t, RECV_TX, others, msg)
 
     def sendblock(self, msg : Block, arrv_time):
         """
@@ -188,7 +154,7 @@ class Peer:
             if msg not in others.localchain.chain:
                 t = arrv_time + self.Delay(others, msg)
                 others.blkqueue[msg.blkid] = t                      #updating block queue of other peer and putting timestamp
-                tpq.push([others, 6, msg], t)
+                self.sim.queue.push(t, RECV_BLK, others, msg)
 
     def UpdateChain(self, blk, arrival_time):
         """
@@ -207,7 +173,7 @@ class Peer:
                 if self.ID not in self.ballist.keys():                  # If peer is not in the dict then he has given the initial bal
                     self.ballist[self.ID] = 100
                 self.balance = self.ballist[self.ID]
-                tpq.push([self,4,blk],arrival_time)                     #broadcasting block to all neighbors
+                self.sim.queue.push(arrival_time, SEND_BLK, self, blk)  #broadcasting block to all neighbors
                 self.lastblkarrivaltime = arrival_time
                 if not self.is_mining:                                  #if not mining then start mining
                     self.generateblk()
@@ -224,10 +190,9 @@ class Peer:
             tx (Transaction): The transaction to be added to the pool.
             arrival_time (float): Arrival time of the transaction.
         """
-        global UTX
         self.txpool.append(tx)                      # Adding the tx in txpool
-        if tx not in UTX:
-            UTX.append(tx)                          # Updating the tx in global txpool
+        if tx not in self.sim.UTX:
+            self.sim.UTX.append(tx)                 # Updating the tx in global txpool
         self.sendtx(tx)                             #broadcasting transaction to all neighbors
         return
 
@@ -290,10 +255,9 @@ class Peer:
         Returns:
             list: List of valid transactions.
         """
-        global UTX
         txlist = []
         bal = self.localchain.blkbal[self.localchain.getLastblk().blkid].copy()
-        for i,tx in enumerate(UTX):                               #itterating through all transactions in UTX and getting the valid txns according to the balance criteria
+        for i,tx in enumerate(self.sim.UTX):                      #itterating through all transactions in UTX and getting the valid txns according to the balance criteria
             if tx.sender.ID not in bal.keys():
                 bal[tx.sender.ID] = 100
             if tx.receiver.ID not in bal.keys():
@@ -309,7 +273,7 @@ class Peer:
             if len(txlist) == 999:                                #limiting the number of transactions in a block to 999
                 break
         for tx in txlist:
-            UTX.remove(tx)
+            self.sim.UTX.remove(tx)
         return txlist
 
     def marktxcomp(self, Txlist):
@@ -327,10 +291,10 @@ class Peer:
         Generates a new block and initiates the mining process.
         """
         newblk = Block([], self, self.localchain.getLastblk().blkid) #creating new block with its parent link as last block in local chain
-        print(f'{self.name} started mining...at time {glob_time}')
-        k = glob_time + next(self.blk_itr)                           #waiting for time to mine a block
+        print(f'{self.name} started mining...at time {self.sim.now}')
+        k = self.sim.now + next(self.blk_itr)                        #waiting for time to mine a block
         self.is_mining = True
-        tpq.push([self, 5, newblk, []], k)
+        self.sim.queue.push(k, MINED_BLK, self, newblk, [])
 
     def checkadd(self, newblk: Block, listoftx):
         """
@@ -340,45 +304,45 @@ class Peer:
             newblk (Block): The new block to be added.
             listoftx (list): List of transactions included in the block.
         """
-        global UTX
         # print(f"length of utx is {len(UTX)}")
         newblk.Txlist = self.findvalidTx(newblk.timestamp)
-        print(f'Checking Block by {self.name} at time {glob_time}')
+        print(f'Checking Block by {self.name} at time {self.sim.now}')
         if newblk.plink == self.localchain.getLastblk().blkid:          #checking if parent link of this block is still the last block in local chain
             if self.checkValidation(newblk):                            #checking if block is valid or not according to transactions present in it
                 
-                if self.localchain.AddBlock(newblk,glob_time):          #adding this block to its local chain
+                if self.localchain.AddBlock(newblk,self.sim.now):       #adding this block to its local chain
                     print(f'genrated id {newblk.blkid}')
-                    print(f'Generated Block is Valid Block by {self.name} at time {glob_time}')
+                    print(f'Generated Block is Valid Block by {self.name} at time {self.sim.now}')
                     self.lastblkarrivaltime = newblk.timestamp
-                    self.blkqueue[newblk.blkid] = glob_time
+                    self.blkqueue[newblk.blkid] = self.sim.now
                     self.ballist = self.localchain.blkbal[self.localchain.getLastblk().blkid].copy()
                     if self.ID not in self.ballist.keys():
                         self.ballist[self.ID] = 100
                     self.balance = self.ballist[self.ID]
-                    self.sendblock(newblk,glob_time)                    #broadcasting newly genarated block to all neighbors
+                    self.sendblock(newblk,self.sim.now)                 #broadcasting newly genarated block to all neighbors
                     if newblk in self.localchain.longchain:
                         self.marktxcomp(listoftx)                       #marking transactions as completed if block is added to local chain
                     self.is_mining = False                              #mining is completed
             else:
                 print('Generated Block is not Valid Block')
-                UTX = UTX + listoftx
+                self.sim.UTX = self.sim.UTX + listoftx
         else:
             print(f'longchain is updated before mining completed at node {self.name}')
             self.is_mining = True                                   #again start mining as local chain is updated and and genarated block is not valid to be added to local chain
             self.generateblk()
-            UTX = UTX + listoftx                                    #if block is not added to local chain then add transactions back to UTX
+            self.sim.UTX = self.sim.UTX + listoftx                  #if block is not added to local chain then add transactions back to UTX
         self.is_mining = False
         
         return
 
 
 class Network:
-    def __init__(self, num, z0, z1, Ttx, Tk):
+    def __init__(self, sim, num, z0, z1, Ttx, Tk):
         """
-        Initializes a network of peers.
+        Initializes a network of peers and schedules their first events.
 
         Args:
+            sim (P2PSimulation): Run the network belongs to.
             num (int): Total number of peers in the network.
             z0 (float): Percentage of slow peers in the network (0-100).
             z1 (float): Percentage of peers with low CPU speed in the network (0-100).
@@ -388,7 +352,8 @@ class Network:
         self.n = num
         self.slow = int(z0 * self.n / 100)
         self.lowcpu = int(z1 * self.n / 100)
-        self.all_peers = np.array([Peer(f'Node_{i}', i) for i in range(self.n)])
+        self.sim = sim
+        self.all_peers = np.array([Peer(f'Node_{i}', i, sim) for i in range(self.n)])
         # Creates graph
         self.graph = self.createNetwork()
         # to get z0 percent of slow nodes
@@ -450,9 +415,9 @@ class Network:
         for i in range(self.n):
             random_number = random.choice([num for num in range(self.n) if num != i])
             k = self.all_peers[random_number]   
-            tpq.push([self.all_peers[i], 1, k], 0)                  #pushing transaction generation event for each peer
+            self.sim.queue.push(0, GEN_TX, self.all_peers[i], k)    #pushing transaction generation event for each peer
         for i in range(self.n):
-            tpq.push([self.all_peers[i], 3],0)                     #all peers start mining at time 0
+            self.sim.queue.push(0, START_MINING, self.all_peers[i]) #all peers start mining at time 0
 
         return G
         
@@ -467,6 +432,81 @@ class Network:
 
 
 
+class P2PSimulation(Simulation):
+    """
+    One run of the network. The event queue, clock, UTX pool and network of a run are held here
+    instead of in module globals and every peer reaches them through its sim attribute,
+    so several runs can go one after another or side by side in one process.
+
+    Attributes:
+        network (Network): Peers of the run.
+        UTX (list): Unspent Transaction pool.
+        N (int): Number of mining events (START_MINING and MINED_BLK) the run stops after.
+        done (int): Mining events handled so far.
+    """
+
+    def __init__(self, num, z0, z1, Ttx, Tk, N):
+        """
+        Builds the network of a run and schedules its first events.
+
+        Args:
+            num (int): Total number of peers in the network.
+            z0 (float): Percentage of slow peers in the network (0-100).
+            z1 (float): Percentage of peers with low CPU speed in the network (0-100).
+            Ttx (float): Mean time between transaction generations.
+            Tk (float): Mean time between block generation attempts.
+            N (int): Number of mining events the run stops after.
+        """
+        super().__init__(TimedPriorityQueue(), {
+            GEN_TX: self.on_gentx,
+            RECV_TX: self.on_recvtx,
+            START_MINING: self.on_startmining,
+            SEND_BLK: self.on_sendblk,
+            MINED_BLK: self.on_minedblk,
+            RECV_BLK: self.on_recvblk,
+        })
+        self.UTX = []
+        self.N = N
+        self.done = 0
+        self.network = Network(self, num, z0, z1, Ttx, Tk)
+
+    def on_gentx(self, ts, peer, recv, extra):
+        peer.generateTx(recv, ts)
+        random_number = random.choice([num for num in range(self.network.n) if num != peer.ID])
+        k = self.network.all_peers[random_number]
+        self.queue.push(ts + next(peer.txn_itr), GEN_TX, peer, k)  #genrating new txn after some time
+
+    def on_recvtx(self, ts, peer, tx, extra):
+        peer.UpdateTx(tx, ts)                                   #updating transaction pool of sender and broadcasting transaction to all neighbors
+
+    def on_startmining(self, ts, peer, msg, extra):
+        peer.generateblk()                                      #genrating new block
+
+    def on_sendblk(self, ts, peer, blk, extra):
+        print(f"broadcasting block by {peer.name} at {ts} of msg {blk.blkid} to all neighbors")
+        peer.sendblock(blk, ts)                                 #checking if it is already sent and broadcasting block to all neighbors
+
+    def on_minedblk(self, ts, peer, blk, listoftx):
+        peer.checkadd(blk, listoftx)                            #checking if block is valid and adding it to local chain and broadcasting it to all neighbors
+
+    def on_recvblk(self, ts, peer, blk, extra):
+        peer.UpdateChain(blk, ts)                               #updating local chain of a peer and broadcasting block to all neighbors
+        print(f"block recieved at {peer.name} ")
+
+    def run(self, until=None):
+        """
+        Runs till N mining events are handled. Stopped early at a time, the run goes on with the next call.
+
+        Args:
+            until (float, optional): Stop before the first event later than this time. Defaults to the end of the run.
+
+        Returns:
+            bool: True once the run is complete.
+        """
+        self.done += super().run(limit=self.N - self.done, counted=(START_MINING, MINED_BLK), until=until)  #stopping simulation after genrating certain no of blocks
+        return self.done >= self.N or not self.queue.heap
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Peer2Peer Network')
     parser.add_argument('n', type=int, help='Number of Peers')
@@ -483,62 +523,12 @@ if __name__ == "__main__":
     arg5 = args.Tk
     N = args.N
 
-    tpq = TimedPriorityQueue()                  #creating a priority queue for maintaining events
-    network = Network(arg1,arg2,arg3,arg4,arg5) #creating a network of peers
+    sim = P2PSimulation(arg1,arg2,arg3,arg4,arg5,N)   #creating a network of peers
+    network = sim.network
     network.visualizeNetwork()
     print("Network created")
 
-    #1  ->genrate txn
-    #2  ->send txn
-    #3  ->genrate blk
-    #4  ->send blk
-    #5  ->check blockhash with longest chain before addding block
-    #6  ->updating block chain of a peer
-
-
-
-    count = 0                                   #count to stop simulation after genrating required number of blocks 
-    while tpq.heap:
-        ts, variable_list = tpq.pop()
-        if variable_list[1] == 1:
-            glob_time = ts
-            variable_list[0].generateTx(variable_list[2],glob_time)
-            random_number = random.choice([num for num in range(arg1) if num != variable_list[0].ID])
-            k=network.all_peers[random_number]
-            amount=random.randint(1,100)
-            tpq.push([variable_list[0],1,k,amount],glob_time+next(variable_list[0].txn_itr)) #genrating new txn after some time
-
-            # count +=1
-
-        if variable_list[1] == 2:
-            glob_time = ts
-            variable_list[0].UpdateTx(variable_list[2],glob_time)                            #updating transaction pool of sender and broadcasting transaction to all neighbors
-            # count +=1
-        
-        if variable_list[1] == 3:
-            glob_time = ts
-            variable_list[0].generateblk() #genrating new block
-            count +=1
-
-        if variable_list[1] == 4:
-            glob_time =ts
-            print(f"broadcasting block by {variable_list[0].name} at {glob_time} of msg {variable_list[2].blkid} to all neighbors")
-            variable_list[0].sendblock(variable_list[2],glob_time)                          #checking if it is already sent and broadcasting block to all neighbors
-
-        if variable_list[1] == 5:
-            glob_time = ts
-            variable_list[0].checkadd(variable_list[2],variable_list[3])                    #checking if block is valid and adding it to local chain and broadcasting it to all neighbors
-            count +=1
-        
-        if variable_list[1] == 6:
-            glob_time = ts
-            variable_list[0].UpdateChain(variable_list[2],glob_time)                         #updating local chain of a peer and broadcasting block to all neighbors
-            print(f"block recieved at {variable_list[0].name} ")
-            # count +=1
-            
-        
-        if count == N:                                             #stopping simulation after genrating certain no of blocks
-            break
+    sim.run()
     # checks if folder exists or not
     if not os.path.exists('Trees'):
         os.makedirs('Trees')
@@ -13,7 +13,7 @@ class Tree:
             blkchain (Blockchain): Block chain we want to print in file
             filename (str): Filename
         """
-        self.n = len(blkchain.chain)
+        self.n = len(blkchain.blktime)
         self.blkchain = blkchain
         self.root = self.blkchain.genesisblk
         self.filename = filename
@@ -51,6 +51,7 @@ class Tree:
             file.write(f"{markers}|__ Miner: {blk.miner.name}\n")
         file.write(f"{markers}|__ Size: {len(blk.Txlist)+1}KB\n")
         # Going to child
-        for i, child in enumerate(self.blkchain.blkchild[blk.blkid]):
-            isLast = i == len(self.blkchain.blkchild[blk.blkid]) - 1
+        children = self.blkchain.children(blk)        # Children this peer has, in its arrival order
+        for i, child in enumerate(children):
+            isLast = i == len(children) - 1
             self.PrintTree(child,file, markerStr, [*levelMarkers, not isLast])
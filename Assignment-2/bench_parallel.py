@@ -0,0 +1,55 @@
+import argparse
+import time
+from main import P2PSimulation, Transaction
+from parallel import ParallelSimulation
+from log import log, LEVELS
+
+
+def timed(shards, args, seed, txprop):
+    """
+    Runs one simulation, sequentially for 0 shards and on that many worker processes otherwise.
+    Building the network is not timed, the workers of a parallel run build theirs inside run().
+
+    Args:
+        shards (int): Number of shards, 0 for the sequential engine.
+        args (tuple): Peers, Ttx, Tk, C1, C2 and N.
+        seed (int): Seed of the run.
+        txprop (bool): Compute Tx arrival times instead of flooding.
+
+    Returns:
+        dict: Wall and CPU seconds, CPU seconds on the critical path, rounds, MB sent between shards and Tx made.
+    """
+    if shards == 0:
+        sim = P2PSimulation(*args, seed=seed, txprop=txprop)
+        start, cpu = time.perf_counter(), time.process_time()
+        sim.run()
+        cpu = time.process_time() - cpu
+        return {'wall': time.perf_counter() - start, 'cpu': cpu, 'critical': cpu, 'rounds': 0, 'mb': 0.0, 'ntx': sim.ntx}
+    sim = ParallelSimulation(P2PSimulation, Transaction, shards, *args, seed=seed, txprop=txprop)
+    start = time.perf_counter()
+    sim.run()
+    return {'wall': time.perf_counter() - start, 'cpu': sim.cpu, 'critical': sim.critical, 'rounds': sim.rounds,
+            'mb': sim.nbytes / 1e6, 'ntx': sim.ntx}
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Measure the speedup of sharded runs over sequential ones')
+    parser.add_argument('--peers', type=int, nargs='+', default=[250, 1000], help='Network sizes')
+    parser.add_argument('--shards', type=int, nargs='+', default=[2, 4, 8], help='Shard counts compared with the sequential run')
+    parser.add_argument('--Ttx', type=float, default=10000, help='Mean time between Tx of a peer')
+    parser.add_argument('--Tk', type=float, default=600, help='Mean time between blocks of the whole network')
+    parser.add_argument('--blocks', type=int, default=50, help='Mining events after the first one of every peer')
+    parser.add_argument('--flood', action='store_true', help='Flood Tx hop by hop instead of computing their arrival times')
+    parser.add_argument('--seed', type=int, default=1, help='Seed of every run')
+    args = parser.parse_args()
+    log.configure(LEVELS['warning'])
+
+    print('speedup is the sequential CPU time over the critical path, what a core per shard would give')
+    print(f"{'peers':>6} {'shards':>6} {'wall':>9} {'cpu':>9} {'critical':>9} {'speedup':>8} {'rounds':>7} {'MB':>8} {'ntx':>7}")
+    for n in args.peers:
+        run = (n, args.Ttx, args.Tk, 25, 20, n + args.blocks)     # every peer's first mining event counts towards N
+        seq = timed(0, run, args.seed, not args.flood)
+        for shards in [0] + args.shards:
+            r = seq if shards == 0 else timed(shards, run, args.seed, not args.flood)
+            print(f"{n:>6} {shards or '-':>6} {r['wall']:>8.2f}s {r['cpu']:>8.2f}s {r['critical']:>8.2f}s "
+                  f"{seq['cpu'] / max(r['critical'], 1e-9):>7.2f}x {r['rounds']:>7} {r['mb']:>8.2f} {r['ntx']:>7}", flush=True)
@@ -0,0 +1,67 @@
+import argparse
+import os
+import sys
+import time
+import numpy as np
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'common'))    # simulation.py is shared by both assignments
+from simulation import SCHEDULERS
+
+
+def hold(queue, n, ops, mean, cancel, seed):
+    """
+    Classic hold benchmark: fills the queue with n events, then every operation pops the earliest
+    event and pushes a new one an exponential time later. A fraction of the pushed events is
+    cancelled again, like mining events that go stale.
+
+    Args:
+        queue (Scheduler): Empty queue to run on.
+        n (int): Events kept in the queue.
+        ops (int): Number of pop and push pairs.
+        mean (float): Mean time between an event and the one it schedules.
+        cancel (float): Fraction of pushes cancelled right after.
+        seed (int): Seed of the random draws.
+
+    Returns:
+        tuple: Seconds taken and the (timestamp, counter) of every popped event.
+    """
+    gen = np.random.default_rng(seed)
+    delays = (gen.standard_exponential(n + ops) * mean).tolist()
+    drops = (gen.random(ops) < cancel).tolist()
+    order = []
+    start = time.perf_counter()
+    for i in range(n):
+        queue.push(delays[i], 0, None)
+    for i in range(ops):
+        entry = queue.pop()
+        if entry is None:
+            break
+        order.append((entry[0], entry[1]))
+        handle = queue.push(entry[0] + delays[n + i], 0, None)
+        if drops[i]:
+            queue.cancel(handle)
+            queue.push(entry[0] + delays[n + i] / 2, 0, None)
+    while len(queue):
+        entry = queue.pop()
+        order.append((entry[0], entry[1]))
+    return time.perf_counter() - start, order
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare event queue backends')
+    parser.add_argument('--sizes', type=int, nargs='+', default=[1000, 100000, 1000000], help='Events kept in the queue')
+    parser.add_argument('--ops', type=int, default=200000, help='Pop and push pairs per run')
+    parser.add_argument('--mean', type=float, default=100.0, help='Mean gap of a newly scheduled event')
+    parser.add_argument('--cancel', type=float, default=0.05, help='Fraction of pushes cancelled')
+    parser.add_argument('--seed', type=int, default=1, help='Seed of the random draws')
+    args = parser.parse_args()
+
+    print(f"{'size':>10} " + ' '.join(f'{name:>12}' for name in SCHEDULERS) + '  same order')
+    for n in args.sizes:
+        times = []
+        orders = []
+        for name, cls in SCHEDULERS.items():
+            t, order = hold(cls(), n, args.ops, args.mean, args.cancel, args.seed)
+            times.append(t)
+            orders.append(order)
+        same = all(o == orders[0] for o in orders[1:])
+        print(f'{n:>10} ' + ' '.join(f'{t:>11.3f}s' for t in times) + f'  {same}')
@@ -2,13 +2,15 @@ import random
 import time
 import hashlib
 from collections import deque
+from ledger import Ledger, SNAPSHOT_INTERVAL
+from log import log
 # from transaction import Transaction
 class Block:
     """
     Creating Class for Blocks in Blockchain
     """
 
-    def __init__(self, Txlist, miner, plink=None):
+    def __init__(self, Txlist, miner, plink=None, serial=0, rng=random):
         """
         Initializes a new Block.
 
@@ -16,46 +18,153 @@ class Block:
             Txlist (List): List of Transactions present in the Block (Max length: 999 because the max block size is 1MB, and each empty block occupies 1KB, and each Transaction size is 1KB).
             miner (Peer): Name of the miner who mined this block.
             plink (str, optional): Hash of the block. Defaults to None.
+            serial (int, optional): Creation order within the run. Defaults to 0.
+            rng (random.Random, optional): Random numbers for the block ID. Defaults to the random module.
         """
         # Generating blkid using timestamp and a random number between 100 and 999
         self.timestamp = time.time()
-        self.blkid = hashlib.md5((str(random.randint(100, 999)) + str(self.timestamp)).encode()).hexdigest()
+        self.blkid = hashlib.md5((str(rng.randint(100, 999)) + str(self.timestamp)).encode()).hexdigest()
 
         # Details of block
         self.Txlist = Txlist
         self.miner = miner
         self.maxsize = 1e6
         self.plink = plink
+        self.num = None         # Numeric ID given when the block enters the network
+        self.serial = serial    # Creation order, the same when the run is replayed
+
+
+class BlockStore:
+    """
+    Block tree shared by all peers of a simulation.
+    Everything that does not depend on who received a block is kept here once.
+
+    Attributes:
+        genesisblk (Block): The genesis block.
+        blocks (dict): Mapping of block IDs to blocks.
+        blkdata (dict): Mapping of block IDs to block depths.
+        blkchild (dict): Mapping of block IDs to their child blocks, in the order they were first seen.
+        ledger (Ledger): Balances of all peers after each block.
+        watch (callable): Called with every block added, None to skip.
+    """
+
+    def __init__(self, snapk=SNAPSHOT_INTERVAL, rng=random):
+        """
+        Initializes a block store holding only the genesis block.
+
+        Args:
+            snapk (int, optional): Blocks between full balance snapshots. Defaults to SNAPSHOT_INTERVAL.
+            rng (random.Random, optional): Random numbers of the run, for the genesis block ID. Defaults to the random module.
+        """
+        self.genesisblk = Block([], None, rng=rng)
+        self.genesisblk.blkid = '00000000000000000000000000000000'
+        self.genesisblk.num = 0
+        self.blocks = {self.genesisblk.blkid: self.genesisblk}
+        self.blkdata = {self.genesisblk.blkid: 1}
+        self.blkchild = {self.genesisblk.blkid: []}
+        self.ledger = Ledger(self.genesisblk.blkid, snapk)
+        self.watch = None
+
+    def add(self, blk : Block):
+        """
+        Interns a block if no peer has added it before. Parent must already be present.
+
+        Args:
+            blk (Block): Block to add.
+        """
+        if blk.blkid in self.blocks:
+            return
+        blk.num = len(self.blocks)                          # Numeric ID in the order blocks entered the network
+        self.blocks[blk.blkid] = blk
+        self.blkdata[blk.blkid] = self.blkdata[blk.plink] + 1
+        self.blkchild[blk.plink].append(blk)
+        self.blkchild[blk.blkid] = []
+        self.getbal(blk)                                    # Finding balance after adding block
+        if self.watch is not None:
+            self.watch(blk)
+
+    def getbal(self,blk : Block):
+        """This will give balance of all node after generating block.
+        Only the balances touched by the block are stored in the ledger.
+
+        Args:
+            blk (Block): Newly added block
+
+        Returns:
+            BalanceView: View on the parent holding the balances changed by this block
+        """
+        bal = self.ledger.view(blk.plink)                   # Balance at Parent Node, unknown peers start at 100
+        for tx in blk.Txlist:
+            bal[tx.receiver.ID] = bal[tx.receiver.ID] + tx.amount   # Updating the balances
+            bal[tx.sender.ID] = bal[tx.sender.ID] - tx.amount
+        bal[blk.miner.ID] = bal[blk.miner.ID] + 50   # Rewarding the miner with 50 coins
+        self.ledger.add(blk.blkid, blk.plink, bal)
+        return bal
 
 
 class Blockchain:
     """
-    Class for managing a blockchain.
+    Class for managing the blockchain as seen by one peer.
+    Blocks, depths and balances live in the shared BlockStore, a peer only keeps
+    the arrival time of each block it has and its own tip.
 
     Attributes:
+        store (BlockStore): Block tree shared with the other peers.
         genesisblk (Block): The genesis block of the blockchain.
-        longchain (list): The longest chain in the blockchain.
-        chain (list): All blocks in the blockchain.
-        blkdata (dict): Mapping of block IDs to block depths.
-        blkchild (dict): Mapping of block IDs to their child blocks.
+        tip (Block): Last block of the longest chain.
+        longchain (list): The longest chain in the blockchain, built lazily from the tip.
+        chain (list): All blocks in the blockchain, in arrival order.
+        ledger (Ledger): Balances of all peers after each block.
         graph (graphviz.Digraph): Graph representation of the blockchain.
         blktime (dict): Mapping of block IDs to their arrival times.
+        watch (callable): Called as watch(chain, old tip, new tip) when the tip moves, None to skip.
     """
 
-    def __init__(self):
+    def __init__(self, store=None):
         """
         Initializes a new blockchain.
+
+        Args:
+            store (BlockStore, optional): Shared block store. Defaults to a new store for this chain alone.
         """
-        self.genesisblk = Block([], None)
-        self.genesisblk.blkid = '00000000000000000000000000000000'
-        self.longchain = [self.genesisblk]
-        self.chain = [self.genesisblk]
-        self.blkdata = {self.genesisblk.blkid: 1}
-        self.blkchild = {self.genesisblk.blkid: []}         # It contains child of a node
+        self.store = store if store is not None else BlockStore()
+        self.genesisblk = self.store.genesisblk
+        self.ledger = self.store.ledger
+        self.tip = self.genesisblk                          # Last block of the longest chain
+        self._longchain = [self.genesisblk]                 # Cached longest chain, rebuilt lazily from the tip
         self.blktime = {self.genesisblk.blkid: 0}           # Block arrival time list
-        self.blkbal = {self.genesisblk.blkid: {}}           # contains bal of all nodes after generation of this block
         self.private_chain = []
         self.lastplink = self.genesisblk.blkid
+        self.watch = None
+
+    @property
+    def chain(self):
+        """
+        All blocks this peer has, in arrival order.
+
+        Returns:
+            list: Blocks in the blockchain.
+        """
+        blocks = self.store.blocks
+        return [blocks[b] for b in self.blktime]
+
+    @property
+    def longchain(self):
+        """
+        Longest chain from the genesis block to the tip, built only when the tip has moved.
+
+        Returns:
+            list: Blocks of the longest chain in order.
+        """
+        if self._longchain is None:
+            path = []
+            blk = self.tip
+            while blk is not None:                          # Walking parent links back to genesis
+                path.append(blk)
+                blk = self.store.blocks.get(blk.plink)
+            path.reverse()
+            self._longchain = path
+        return self._longchain
 
     def AddBlock(self, newblk, time):
         """
@@ -68,46 +177,148 @@ class Blockchain:
         Returns:
             bool: True if the block was successfully added, False otherwise.
         """
-        if newblk.blkid in self.blkdata.keys():                 # Checking if the block is already present in the chain
-            print(f'{newblk.blkid} is already present in chain')
+        if newblk.blkid in self.blktime:                    # Checking if the block is already present in the chain
+            if log.chain:
+                log('chain', '%s is already present in chain', newblk.blkid)
             return False
-        pl = newblk.plink                                     # Parent block ID
-        if pl in self.blkdata.keys():                       # Checking if the parent block is present in the chain
-            self.chain.append(newblk)
+        if newblk.plink in self.blktime:                    # Checking if the parent block is present in the chain
+            self.store.add(newblk)                          # Adding the block to the shared tree if it is new to the network
             self.blktime[newblk.blkid] = time
-            self.blkdata[newblk.blkid] = self.blkdata[pl] + 1   # Adding the new block to the chain
-            self.blkchild[pl].append(newblk)                 # Adding the new block as a child of the parent block
-            self.blkchild[pl].sort(key=lambda x: self.blktime[x.blkid])  # sorting blocks based on arrival time
-            self.blkchild[newblk.blkid] = []
-            self.longchain = []
-            self.DFS(self.genesisblk)                         # Performing a depth-first search to find the longest chain
-            self.getbal(newblk)                               # Finding balance after adding block
+            self.UpdateTip(newblk)                            # Moving the tip if the new block makes a longer chain
             return True
         else:                                                # If the parent block is not present in the chain
-            print("Invalid due to plink")
+            if log.chain:
+                log('chain', 'Invalid due to plink')
             return False
 
-    def DFS(self, blk):
+    def has(self, blkid):
+        """
+        Checks if this peer has a block.
+
+        Args:
+            blkid (str): Block ID.
+
+        Returns:
+            bool: True if the block is in this peer's chain.
+        """
+        return blkid in self.blktime
+
+    def children(self, blk):
         """
-        Performs a depth-first search to find the longest chain.
+        Children of a block that this peer has, sorted by their arrival time at this peer.
 
         Args:
-            blk (Block): The block to start the search from.
+            blk (Block): Parent block.
 
         Returns:
-            list: The longest chain found.
-        """
-        if blk is None:
-            return []
-        max_path = []
-        for child in self.blkchild[blk.blkid]:           # For each child of the block
-            childpath = self.DFS(child)                  # Perform DFS on the child
-            if len(childpath) > len(max_path):           # If the child path is longer than the current max path
-                max_path = childpath                     # Update the max path
-
-        self.longchain = max(self.longchain, [blk] + max_path, key=len) # Update the longest chain
-        return [blk] + max_path
-    
+            list: Child blocks.
+        """
+        blktime = self.blktime
+        kids = [c for c in self.store.blkchild[blk.blkid] if c.blkid in blktime]
+        kids.sort(key=self.arrivalkey)
+        return kids
+
+    def arrivalkey(self, blk):
+        """
+        Sort key for the arrival order of a block at this peer.
+        Blocks that arrive at the same time keep the order in which they entered the network.
+
+        Args:
+            blk (Block): Block present in the blockchain.
+
+        Returns:
+            tuple: Arrival time and numeric block ID.
+        """
+        return (self.blktime[blk.blkid], blk.num)
+
+    def UpdateTip(self, blk):
+        """
+        Moves the tip to a newly added block if it makes the longest chain.
+        A longer chain always wins. On equal length the branch whose first block arrived
+        earlier at the fork point wins, which is the same choice the full DFS made.
+
+        Args:
+            blk (Block): Newly added leaf block.
+        """
+        depth = self.depth(blk)
+        tipdepth = self.depth(self.tip)
+        if depth < tipdepth:
+            return
+        if depth == tipdepth and not self.PrefersBranch(blk):
+            return
+        if blk.plink == self.tip.blkid and self._longchain is not None:
+            self._longchain.append(blk)                     # Extending the tip, so the cached chain stays valid
+        else:
+            self._longchain = None                          # Reorg, chain is rebuilt on next access
+        old = self.tip
+        self.tip = blk
+        if self.watch is not None:
+            self.watch(self, old, blk)
+
+    def PrefersBranch(self, blk):
+        """
+        Checks if the branch ending in blk beats the branch of the current tip of same length.
+        Only the diverging part of both branches is walked.
+
+        Args:
+            blk (Block): Leaf block at the same depth as the tip.
+
+        Returns:
+            bool: True if the new branch forked off earlier in arrival order.
+        """
+        blocks = self.store.blocks
+        a, b = blk, self.tip
+        while a.plink != b.plink:                           # Same depth, so walk both up together till they share the parent
+            a = blocks[a.plink]
+            b = blocks[b.plink]
+        return self.arrivalkey(a) < self.arrivalkey(b)
+
+    def depth(self, blk):
+        """
+        Length of the chain ending in a block.
+
+        Args:
+            blk (Block): Block present in the blockchain.
+
+        Returns:
+            int: Number of blocks from genesis to blk, both included.
+        """
+        return self.store.blkdata[blk.blkid]
+
+    def inLongchain(self, blk):
+        """
+        Checks if a block is part of the longest chain by walking down from the tip to its depth.
+
+        Args:
+            blk (Block): Block to check.
+
+        Returns:
+            bool: True if blk is on the longest chain.
+        """
+        if blk.blkid not in self.blktime:
+            return False
+        cur = self.tip
+        for _ in range(self.depth(cur) - self.depth(blk)):
+            cur = self.store.blocks[cur.plink]
+        return cur is blk
+
+    def load(self, blktime, tip, private_chain, lastplink):
+        """
+        Replaces what this peer has with the chain of the same peer from another process, e.g. a shard of a parallel run.
+        Every block must already be in the store.
+
+        Args:
+            blktime (dict): Mapping of block IDs to their arrival times.
+            tip (Block): Last block of the longest chain.
+            private_chain (list): Blocks an attacker holds back.
+            lastplink (str): Block ID an attacker's private chain starts from.
+        """
+        self.blktime = blktime
+        self.tip = tip
+        self._longchain = None                              # Rebuilt on next access
+        self.private_chain = private_chain
+        self.lastplink = lastplink
+
     # def count_nodes_chain(self,id):
     #     count = 0 
     #     for i in range(1,len(self.longchain)):
@@ -140,30 +351,6 @@ class Blockchain:
     #             queue.append(child)  
     #     return count
 
-    def getbal(self,blk : Block):
-        """This will give balance of all node after generating block.
-        We will get balance from longest chain
-
-        Args:
-            blk (Block): Newly added block
-
-        Returns:
-            Dict: This contains Dict mapping from Node ID to balance
-        """
-        bal = self.blkbal[blk.plink].copy()                                          # Dictionary of balance at Parent Node
-        for tx in blk.Txlist:
-            if tx.receiver.ID not in bal.keys():        
-                bal[tx.receiver.ID] = 100               # giving a intial balance of 100 to all peers
-            if tx.sender.ID not in bal.keys():
-                bal[tx.sender.ID] = 100
-            bal[tx.receiver.ID] = bal[tx.receiver.ID] + tx.amount   # Updating the balances
-            bal[tx.sender.ID] = bal[tx.sender.ID] - tx.amount
-        if blk.miner.ID not in bal.keys():
-            bal[blk.miner.ID] = 100
-        bal[blk.miner.ID] = bal[blk.miner.ID] + 50   # Rewarding the miner with 50 coins
-        self.blkbal[blk.blkid] = bal
-        return bal
-
     def getLastblk(self):
         """
         Retrieves the last block in the longest chain.
@@ -171,7 +358,7 @@ class Blockchain:
         Returns:
             Block: The last block in the longest chain.
         """
-        return self.longchain[-1]
+        return self.tip
 
     def printchain(self):
         """
@@ -0,0 +1,79 @@
+import math
+
+
+class BloomFilter:
+    """
+    Bounded Bloom filter over hex digest keys (Tx and block IDs are md5 hex digests).
+    It keeps two generations of bits, when the current one holds capacity keys it becomes
+    the old one and a fresh one is started, so memory stays fixed however long the run is.
+    Membership can give false positives but never false negatives for the last capacity keys.
+
+    Attributes:
+        capacity (int): Keys held by one generation.
+        m (int): Bits per generation.
+        k (int): Number of hash positions per key.
+        count (int): Keys added to the current generation.
+    """
+
+    def __init__(self, capacity, fprate=0.001):
+        """
+        Initializes an empty filter.
+
+        Args:
+            capacity (int): Keys held by one generation.
+            fprate (float, optional): Target false positive rate of a full generation. Defaults to 0.001.
+        """
+        self.capacity = capacity
+        self.m = max(8, math.ceil(-capacity * math.log(fprate) / (math.log(2) ** 2)))
+        self.k = max(1, round(self.m / capacity * math.log(2)))
+        self.bits = bytearray((self.m + 7) // 8)
+        self.old = bytearray((self.m + 7) // 8)
+        self.count = 0
+
+    def positions(self, key):
+        """
+        Bit positions of a key using double hashing on the two halves of the digest.
+
+        Args:
+            key (str): Hex digest.
+
+        Returns:
+            list: Bit positions.
+        """
+        h = int(key, 16)
+        h1 = h & 0xFFFFFFFFFFFFFFFF
+        h2 = (h >> 64) | 1
+        m = self.m
+        return [(h1 + i * h2) % m for i in range(self.k)]
+
+    def add(self, key):
+        """
+        Adds a key, rotating generations when the current one is full.
+
+        Args:
+            key (str): Hex digest.
+        """
+        if self.count >= self.capacity:
+            self.old = self.bits
+            self.bits = bytearray(len(self.old))
+            self.count = 0
+        bits = self.bits
+        for p in self.positions(key):
+            bits[p >> 3] |= 1 << (p & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        pos = self.positions(key)
+        for bits in (self.bits, self.old):
+            if all(bits[p >> 3] & (1 << (p & 7)) for p in pos):
+                return True
+        return False
+
+    def nbytes(self):
+        """
+        Memory held by the bit arrays.
+
+        Returns:
+            int: Size in bytes.
+        """
+        return len(self.bits) + len(self.old)
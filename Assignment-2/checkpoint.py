@@ -0,0 +1,348 @@
+import io
+import os
+import json
+import pickle
+import struct
+import zlib
+
+MAGIC = b'P2PCKPT\x01'          # segment file header, five length prefixed frames follow
+FRAME = struct.Struct('<Q')     # compressed length of a frame
+LEVEL = 1                       # zlib level, state is mostly floats and IDs that barely compress further
+BASE = 'base.json'              # in a forked directory: the checkpoint its segments continue
+
+
+class _Pickler(pickle.Pickler):
+    """
+    Pickler writing objects already stored in a segment, or rebuilt on load, as references.
+    Tx met for the first time are referenced too and collected in new, to be written once on their own.
+    """
+
+    def __init__(self, file, frozen, live, txcls, new):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.frozen = frozen
+        self.live = live
+        self.txcls = txcls
+        self.new = new
+
+    def persistent_id(self, obj):
+        key = self.frozen.get(id(obj)) or self.live.get(id(obj))
+        if key is None and type(obj) is self.txcls:
+            key = self.frozen[id(obj)] = ('tx', obj.num)
+            self.new.append(obj)
+        return key
+
+
+class _Unpickler(pickle.Unpickler):
+    """
+    Unpickler resolving references against the objects rebuilt from earlier frames.
+    """
+
+    def __init__(self, file, objs, home):
+        super().__init__(file)
+        self.objs = objs
+        self.home = home
+
+    def persistent_load(self, key):
+        kind, k = key
+        if kind == 'dict':
+            return self.objs['dict'].setdefault(k, {})
+        return self.objs[kind][k]
+
+    def find_class(self, module, name):
+        if module in ('__main__', 'main'):              # main.py saved as a script loads as a module and vice versa
+            module = self.home
+        return super().find_class(module, name)
+
+
+def segment(directory, index):
+    """
+    Path of a segment file.
+
+    Args:
+        directory (str): Checkpoint directory.
+        index (int): Checkpoint number.
+
+    Returns:
+        str: The path.
+    """
+    return os.path.join(directory, f'{index:05d}.ckpt')
+
+
+def indices(directory):
+    """
+    Checkpoints written to a directory itself, not counting the ones of a run it was forked from.
+
+    Args:
+        directory (str): Checkpoint directory.
+
+    Returns:
+        list: Checkpoint numbers in order.
+    """
+    if not os.path.isdir(directory):
+        return []
+    return sorted(int(f[:-5]) for f in os.listdir(directory) if f.endswith('.ckpt'))
+
+
+def chain(directory, index=None):
+    """
+    Segment files that together hold one checkpoint, oldest first.
+
+    Args:
+        directory (str): Checkpoint directory.
+        index (int, optional): Checkpoint number. Defaults to the last one.
+
+    Returns:
+        list: Paths of the segments.
+    """
+    own = indices(directory)
+    base = None
+    if os.path.exists(os.path.join(directory, BASE)):
+        with open(os.path.join(directory, BASE)) as f:
+            base = json.load(f)
+    if index is None:
+        index = own[-1] if own else (base['index'] if base else None)
+    if index is None or (index not in own and (base is None or index > base['index'])):
+        raise ValueError(f'{directory} has no checkpoint {index if index is not None else ""}'.rstrip())
+    if base is not None and index <= base['index']:
+        return chain(base['dir'], index)
+    paths = [segment(directory, i) for i in own if i <= index]
+    return (chain(base['dir'], base['index']) if base else []) + paths
+
+
+def frames(path, last=True):
+    """
+    Reads the compressed frames of a segment.
+
+    Args:
+        path (str): Segment file.
+        last (bool, optional): Also read the state frame, only the checkpoint resumed from needs it. Defaults to True.
+
+    Returns:
+        list: Header, Tx, blocks, changes and state frames as bytes, the state frame None when skipped.
+    """
+    out = []
+    with open(path, 'rb') as f:
+        if f.read(len(MAGIC)) != MAGIC:
+            raise ValueError(f'{path} is not a checkpoint segment')
+        for i in range(5):
+            size, = FRAME.unpack(f.read(FRAME.size))
+            if i == 4 and not last:
+                out.append(None)
+                break
+            out.append(zlib.decompress(f.read(size)))
+    return out
+
+
+class Checkpointer:
+    """
+    Writes checkpoints of a running simulation as a chain of segment files, one per checkpoint.
+    Blocks never change once they enter the block store and a Tx only drops its arrival times when
+    a block carrying it is added, so every Tx and stored block is written once, in the segment of
+    the first checkpoint that sees it, and later ones refer to it by number. The large dicts that
+    keep growing (arrival times of every peer, the store and ledger tables) are written as the
+    entries added, changed or removed since the last checkpoint. Everything else, peers, the event
+    queue, UTX and the random streams, is small next to those and written whole. A checkpoint is
+    restored from its own segment plus the Tx, blocks and dict changes of the ones before.
+
+    Each segment holds five zlib compressed pickle frames: header (checkpoint number, time, number
+    of peers), new Tx, new blocks with the Tx of already written ones (and the static objects in the
+    first segment), dict changes, and the state itself.
+
+    Attributes:
+        directory (str): Where segments are written.
+        txcls (type): Class of the Tx.
+        index (int): Number of the next checkpoint.
+        static (dict): Objects that never change after setup, written once, by name.
+        frozen (dict): References of every block and Tx written so far, by object id.
+        shadow (dict): Copy of every large dict as of the last checkpoint, lists by their length.
+        nblocks (int): Blocks of the store written so far.
+    """
+
+    def __init__(self, directory, txcls, static=None, base=None):
+        """
+        Prepares a checkpoint directory.
+
+        Args:
+            directory (str): Directory for the segments, created if missing.
+            txcls (type): Class of the Tx, they are written once and then referenced.
+            static (dict, optional): Objects that never change after setup, by name. Defaults to None.
+            base (dict, optional): What restore() returned, to continue from that checkpoint. Defaults to None.
+
+        Raises:
+            ValueError: If the directory already holds checkpoints this run does not continue from.
+        """
+        self.directory = directory
+        self.txcls = txcls
+        self.static = dict(static or {})
+        self.frozen = {}
+        self.shadow = {}
+        self.nblocks = 0
+        self.index = 0
+        own = indices(directory)
+        if base is not None:
+            self.index = base['index'] + 1
+            self.static.update(base['static'])
+            self.frozen = {id(obj): key for key, obj in base['frozen'].items()}
+            self.shadow = {name: self.copy(d) for name, d in base['dicts'].items()}
+            self.nblocks = base['nblocks']
+            same = os.path.abspath(directory) == os.path.abspath(base['dir'])
+            if same and own and own[-1] != base['index']:
+                raise ValueError(f'checkpoint {base["index"]} is not the last of {directory}, write the resumed run elsewhere')
+            if not same and own:
+                raise ValueError(f'{directory} already holds checkpoints')
+            os.makedirs(directory, exist_ok=True)
+            if not same:                                        # forked run, earlier segments stay where they are
+                with open(os.path.join(directory, BASE), 'w') as f:
+                    json.dump({'dir': os.path.abspath(base['dir']), 'index': base['index']}, f)
+        else:
+            if own:
+                raise ValueError(f'{directory} already holds checkpoints')
+            os.makedirs(directory, exist_ok=True)
+
+    @staticmethod
+    def copy(d):
+        """
+        Shadow of a dict, the values as they are and lists by their length since they only grow.
+
+        Args:
+            d (dict): Dict to copy.
+
+        Returns:
+            dict: The shadow.
+        """
+        return {k: len(v) if type(v) is list else v for k, v in d.items()}
+
+    def diff(self, name, d):
+        """
+        Entries of a dict added, changed or removed since the last checkpoint, and updates its shadow.
+        Values are compared by identity, every value a handler stores is a new object.
+
+        Args:
+            name (str): Name of the dict.
+            d (dict): The dict now.
+
+        Returns:
+            tuple: Dict of added or changed entries and list of removed keys, None if nothing changed.
+        """
+        old = self.shadow.get(name)
+        if old is None:
+            self.shadow[name] = self.copy(d)
+            return (dict(d), []) if d else None
+        changed = {}
+        for k, v in d.items():
+            if type(v) is list:
+                if old.get(k) != len(v):
+                    changed[k] = v
+                    old[k] = len(v)
+            elif k not in old or old[k] is not v:
+                changed[k] = v
+                old[k] = v
+        removed = []
+        if len(old) > len(d):                                   # only then can a key be gone
+            removed = [k for k in old if k not in d]
+            for k in removed:
+                del old[k]
+        return (changed, removed) if changed or removed else None
+
+    def save(self, time, state, peers, blocks, dicts):
+        """
+        Writes the next checkpoint.
+
+        Args:
+            time (float): Simulated time of the checkpoint.
+            state (dict): Everything needed to go on from here, peers are written as part of it.
+            peers (list): All peers, indexed by ID.
+            blocks (dict): Block store mapping of block IDs to blocks, in the order they were added.
+            dicts (dict): Large dicts of the state written as changes, by name.
+
+        Returns:
+            str: Path of the segment.
+        """
+        live = {id(p): ('peer', p.ID) for p in peers}
+        live.update((id(d), ('dict', name)) for name, d in dicts.items())
+        newblks = list(blocks.values())[self.nblocks:]
+        static = self.static if self.index == 0 else {}
+        patches = [(tx.num, tx.__dict__) for blk in newblks for tx in blk.Txlist if id(tx) in self.frozen]
+        changes = {}
+        for name, d in dicts.items():
+            c = self.diff(name, d)
+            if c is not None:
+                changes[name] = c
+        newtxs = []
+
+        def dump(obj):
+            buf = io.BytesIO()
+            _Pickler(buf, self.frozen, live, self.txcls, newtxs).dump(obj)
+            return zlib.compress(buf.getvalue(), LEVEL)
+
+        header = dump({'index': self.index, 'time': time, 'n': len(peers)})
+        blkframe = dump((static, newblks, patches))
+        for name, obj in static.items():                        # later frames refer to what this one wrote
+            self.frozen[id(obj)] = ('static', name)
+        for blk in newblks:
+            self.frozen[id(blk)] = ('blk', blk.serial)
+        parts = [header, None, blkframe, dump(changes), dump(dict(state, peers=[p.__dict__ for p in peers]))]
+        parts[1] = dump([(type(tx), tx.__dict__) for tx in newtxs])    # the Tx met in the frames above
+        path = segment(self.directory, self.index)
+        with open(path + '.tmp', 'wb') as f:
+            f.write(MAGIC)
+            for data in parts:
+                f.write(FRAME.pack(len(data)))
+                f.write(data)
+        os.replace(path + '.tmp', path)                         # a run killed mid write keeps its last whole checkpoint
+        self.nblocks += len(newblks)
+        self.index += 1
+        return path
+
+    @staticmethod
+    def restore(directory, index=None, peercls=None):
+        """
+        Rebuilds the state of a checkpoint.
+
+        Args:
+            directory (str): Checkpoint directory.
+            index (int, optional): Checkpoint number. Defaults to the last one.
+            peercls (type, optional): Class of the peers, its module is where classes saved from main.py are found. Defaults to None.
+
+        Returns:
+            tuple: The state passed to save() with the peers rebuilt under 'peers', and what a Checkpointer
+            needs as base to go on writing checkpoints after this one.
+        """
+        paths = chain(directory, index)
+        header = pickle.loads(frames(paths[-1], last=False)[0])
+        home = peercls.__module__ if peercls is not None else '__main__'
+        peers = [object.__new__(peercls) for _ in range(header['n'])]   # filled in once the state is read
+        objs = {'peer': peers, 'blk': {}, 'tx': {}, 'static': {}, 'dict': {}}
+
+        def load(data):
+            return _Unpickler(io.BytesIO(data), objs, home).load()
+
+        nblocks = 0
+        for path in paths:
+            _, txframe, blkframe, changeframe, stateframe = frames(path, last=path == paths[-1])
+            for cls, attrs in load(txframe):
+                tx = object.__new__(cls)
+                tx.__dict__.update(attrs)
+                objs['tx'][tx.num] = tx
+            static, new, patches = load(blkframe)
+            objs['static'].update(static)
+            for blk in new:
+                objs['blk'][blk.serial] = blk
+            for num, attrs in patches:
+                objs['tx'][num].__dict__.update(attrs)
+            nblocks += len(new)
+            for name, (changed, removed) in load(changeframe).items():
+                d = objs['dict'].setdefault(name, {})
+                for k in removed:
+                    del d[k]
+                d.update(changed)
+        state = load(stateframe)
+        for peer, attrs in zip(peers, state['peers']):
+            peer.__dict__.update(attrs)
+        state['peers'] = peers
+        frozen = {('static', k): v for k, v in objs['static'].items()}
+        frozen.update((('blk', k), v) for k, v in objs['blk'].items())
+        frozen.update((('tx', k), v) for k, v in objs['tx'].items())
+        base = {'dir': directory, 'index': header['index'], 'static': objs['static'],
+                'frozen': frozen, 'dicts': objs['dict'], 'nblocks': nblocks}
+        return state, base
@@ -0,0 +1,186 @@
+import numpy as np
+
+# Event types
+TX_GEN = 1      # Tx made: peer = sender, obj = Tx number, parent = receiver ID, aux = amount
+TX_RECV = 2     # Tx reached a peer (flooding only): parent = sender ID
+BLK_MINED = 3   # honest block mined and added to the miner's chain: aux = number of Tx
+BLK_RECV = 4    # block added to a peer's chain: aux = depth of the block
+FORK = 5        # block added to a peer's chain without becoming its tip: aux = depth of the block
+PRIVATE = 6     # attacker mined a private block, it has no number yet: obj = -1
+RELEASE = 7     # attacker made a block public: aux = blocks still private
+ETYPES = {TX_GEN: 'tx_gen', TX_RECV: 'tx_recv', BLK_MINED: 'blk_mined', BLK_RECV: 'blk_recv',
+          FORK: 'fork', PRIVATE: 'private', RELEASE: 'release'}
+
+RECORD = np.dtype([
+    ('etype', np.uint8),
+    ('time', np.float64),
+    ('peer', np.int32),
+    ('obj', np.int64),      # block or Tx number
+    ('parent', np.int64),   # parent block number, or the other peer of a Tx
+    ('aux', np.float64),
+])
+MAGIC = b'P2PTRACE\x01\x00\x00\x00'   # file header, records follow
+CHUNK = 1 << 16                       # records buffered before a write
+
+
+class TraceWriter:
+    """
+    Appends fixed width event records to a binary trace file.
+    Records are buffered as tuples and written CHUNK at a time as one structured array,
+    so recording an event costs a list append.
+
+    Attributes:
+        path (str): Trace file.
+        buf (list): Records not written yet.
+        count (int): Records recorded so far.
+    """
+
+    def __init__(self, path, chunk=CHUNK, dtype=RECORD):
+        """
+        Creates the trace file.
+
+        Args:
+            path (str): Trace file, overwritten if it exists.
+            chunk (int, optional): Records buffered before a write. Defaults to CHUNK.
+            dtype (numpy.dtype, optional): Record layout. Defaults to RECORD.
+        """
+        self.path = path
+        self.chunk = chunk
+        self.dtype = dtype
+        self.file = open(path, 'wb')
+        self.file.write(MAGIC)
+        self.buf = []
+        self.count = 0
+
+    def record(self, etype, time, peer, obj, parent=-1, aux=0.0):
+        """
+        Records one event.
+
+        Args:
+            etype (int): Event type.
+            time (float): Simulated time.
+            peer (int): Peer ID.
+            obj (int): Block or Tx number.
+            parent (int, optional): Parent block number or other peer ID. Defaults to -1.
+            aux (float, optional): Extra value of the event type. Defaults to 0.0.
+        """
+        self.buf.append((etype, time, peer, obj, parent, aux))
+        if len(self.buf) >= self.chunk:
+            self.flush()
+
+    def append(self, row):
+        """
+        Records one row of a custom record layout.
+
+        Args:
+            row (tuple): Field values in the order of the layout.
+        """
+        self.buf.append(row)
+        if len(self.buf) >= self.chunk:
+            self.flush()
+
+    def flush(self):
+        """
+        Writes the buffered records.
+        """
+        if self.buf:
+            np.array(self.buf, dtype=self.dtype).tofile(self.file)
+            self.count += len(self.buf)
+            self.buf = []
+        self.file.flush()
+
+    def close(self):
+        """
+        Writes the buffered records and closes the file.
+        """
+        self.flush()
+        self.file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+class TraceReader:
+    """
+    Lazy view of a trace file through a memory map, only the pages that are read are loaded.
+    Columns are read as trace['time'], records as trace[i] or slices.
+
+    Attributes:
+        records (numpy.memmap): All records.
+    """
+
+    def __init__(self, path, dtype=RECORD):
+        """
+        Opens a trace file.
+
+        Args:
+            path (str): Trace file written by TraceWriter.
+            dtype (numpy.dtype, optional): Record layout it was written with. Defaults to RECORD.
+        """
+        with open(path, 'rb') as f:
+            if f.read(len(MAGIC)) != MAGIC:
+                raise ValueError(f'{path} is not a trace file')
+        self.records = np.memmap(path, dtype=dtype, mode='r', offset=len(MAGIC))
+
+    def __len__(self):
+        return len(self.records)
+
+    def __getitem__(self, key):
+        return self.records[key]
+
+    def chunks(self, size=CHUNK):
+        """
+        Iterates over the records in slices.
+
+        Args:
+            size (int, optional): Records per slice. Defaults to CHUNK.
+
+        Yields:
+            numpy.ndarray: Next slice of records.
+        """
+        for s in range(0, len(self.records), size):
+            yield self.records[s:s + size]
+
+    def select(self, etype=None, peer=None, obj=None, size=CHUNK):
+        """
+        Records matching all given fields, read one chunk at a time.
+
+        Args:
+            etype (int, optional): Event type. Defaults to any.
+            peer (int, optional): Peer ID. Defaults to any.
+            obj (int, optional): Block or Tx number. Defaults to any.
+            size (int, optional): Records per chunk read. Defaults to CHUNK.
+
+        Returns:
+            numpy.ndarray: Matching records, in memory.
+        """
+        parts = []
+        for c in self.chunks(size):
+            mask = np.ones(len(c), dtype=bool)
+            if etype is not None:
+                mask &= c['etype'] == etype
+            if peer is not None:
+                mask &= c['peer'] == peer
+            if obj is not None:
+                mask &= c['obj'] == obj
+            parts.append(np.array(c[mask]))
+        return np.concatenate(parts) if parts else np.empty(0, dtype=self.records.dtype)
+
+    def arrivals(self, npeers):
+        """
+        Time every block was added to every peer's chain.
+
+        Args:
+            npeers (int): Number of peers.
+
+        Returns:
+            numpy.ndarray: Arrival times indexed [block number, peer ID], NaN where a block never arrived.
+        """
+        got = np.concatenate([self.select(e) for e in (BLK_RECV, FORK, BLK_MINED, RELEASE)])
+        nblk = int(got['obj'].max()) + 1 if len(got) else 0
+        out = np.full((nblk, npeers), np.nan)
+        out[got['obj'], got['peer']] = got['time']
+        return out
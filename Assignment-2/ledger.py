@@ -0,0 +1,168 @@
+import sys
+
+INITIAL_BAL = 100       # Balance every peer starts with
+SNAPSHOT_INTERVAL = 32  # A full copy of all balances is kept once every these many blocks of depth
+
+
+class Ledger:
+    """
+    Delta based balance ledger for a block tree.
+    Each block stores only the balances of accounts touched by its transactions and coinbase,
+    blocks at every k-th depth store a full snapshot so a lookup walks at most k parents.
+
+    Attributes:
+        k (int): Snapshot interval in blocks.
+        parent (dict): Mapping of block IDs to parent block IDs.
+        bal (dict): Mapping of block IDs to balances changed by that block (full balances for snapshots).
+        full (set): Block IDs whose entry in bal is a full snapshot.
+        naccounts (dict): Mapping of block IDs to number of accounts known after that block.
+    """
+
+    def __init__(self, genesisid, k=SNAPSHOT_INTERVAL):
+        """
+        Initializes a ledger with the genesis block as the first snapshot.
+
+        Args:
+            genesisid (str): Block ID of the genesis block.
+            k (int, optional): Snapshot interval. Defaults to SNAPSHOT_INTERVAL.
+        """
+        self.k = k
+        self.parent = {genesisid: None}
+        self.depth = {genesisid: 1}
+        self.bal = {genesisid: {}}
+        self.full = {genesisid}
+        self.naccounts = {genesisid: 0}
+
+    def __contains__(self, blkid):
+        return blkid in self.bal
+
+    def lookup(self, blkid, acct):
+        """
+        Balance of an account after a block, None if the account never appeared till that block.
+
+        Args:
+            blkid (str): Block ID.
+            acct (int): Peer ID.
+
+        Returns:
+            int: Balance or None.
+        """
+        while True:
+            d = self.bal[blkid]
+            if acct in d:
+                return d[acct]
+            if blkid in self.full:                     # Snapshot holds every known account
+                return None
+            blkid = self.parent[blkid]
+
+    def balance(self, blkid, acct):
+        """
+        Balance of an account after a block.
+
+        Args:
+            blkid (str): Block ID.
+            acct (int): Peer ID.
+
+        Returns:
+            int: Balance, accounts not seen yet have the initial balance.
+        """
+        b = self.lookup(blkid, acct)
+        return INITIAL_BAL if b is None else b
+
+    def view(self, blkid):
+        """
+        Writable view of balances after a block, writes do not touch the ledger.
+
+        Args:
+            blkid (str): Block ID.
+
+        Returns:
+            BalanceView: View on the block.
+        """
+        return BalanceView(self, blkid)
+
+    def materialize(self, blkid):
+        """
+        Builds the full balance dict after a block.
+
+        Args:
+            blkid (str): Block ID.
+
+        Returns:
+            dict: Mapping from peer ID to balance.
+        """
+        path = []
+        while blkid not in self.full:
+            path.append(self.bal[blkid])
+            blkid = self.parent[blkid]
+        bal = self.bal[blkid].copy()
+        for d in reversed(path):                       # Applying deltas from oldest to newest
+            bal.update(d)
+        return bal
+
+    def add(self, blkid, plink, view):
+        """
+        Stores balances of a block from a view on its parent.
+
+        Args:
+            blkid (str): Block ID of the new block.
+            plink (str): Block ID of the parent block.
+            view (BalanceView): View on plink holding the changes made by the block.
+        """
+        self.parent[blkid] = plink
+        depth = self.depth[plink] + 1
+        self.depth[blkid] = depth
+        self.naccounts[blkid] = self.naccounts[plink] + view.new
+        if depth % self.k == 0:                         # Time for a full snapshot
+            bal = self.materialize(plink)
+            bal.update(view.changes)
+            self.bal[blkid] = bal
+            self.full.add(blkid)
+        else:
+            self.bal[blkid] = view.changes
+
+    def entries(self):
+        """
+        Number of balances stored over all blocks.
+
+        Returns:
+            int: Stored entries.
+        """
+        return sum(len(d) for d in self.bal.values())
+
+    def nbytes(self):
+        """
+        Approximate memory held by the stored balance dicts.
+
+        Returns:
+            int: Size in bytes.
+        """
+        return sum(sys.getsizeof(d) for d in self.bal.values())
+
+
+class BalanceView:
+    """
+    Copy-on-write view of balances after a block. Reads fall through to the ledger,
+    writes are kept in a small dict of changes.
+
+    Attributes:
+        changes (dict): Balances changed through this view.
+        new (int): Number of accounts this view added that were unknown at the block.
+    """
+    __slots__ = ('ledger', 'blkid', 'changes', 'new')
+
+    def __init__(self, ledger, blkid):
+        self.ledger = ledger
+        self.blkid = blkid
+        self.changes = {}
+        self.new = 0
+
+    def __getitem__(self, acct):
+        if acct in self.changes:
+            return self.changes[acct]
+        return self.ledger.balance(self.blkid, acct)
+
+    def __setitem__(self, acct, amount):
+        if acct not in self.changes and self.ledger.lookup(self.blkid, acct) is None:
+            self.new += 1
+        self.changes[acct] = amount
@@ -0,0 +1,104 @@
+import numpy as np
+
+TX_BITS = 8000              # size of transaction in bits
+BLK_BITS = 8 * (10 ** 6)    # size of block in bits
+SLOW_LINK = 5 * (10 ** 6)   # link speed if any end is slow
+FAST_LINK = 100 * (10 ** 6) # link speed if both ends are fast
+QUEUE_BITS = 96000          # queuing delay mean is this many bits over the link speed
+
+
+class LinkModel:
+    """
+    Delay tables for every directed edge of the network, built once after the topology.
+    Edges of peer i are indices[indptr[i]:indptr[i+1]], the other arrays hold one value per edge,
+    so a message delay is a table lookup plus one queuing delay sample.
+
+    Attributes:
+        indptr (numpy.ndarray): Start of each peer's edges.
+        indices (numpy.ndarray): Receiving peer of each edge.
+        prop (numpy.ndarray): Propagation delay of each edge.
+        cap (numpy.ndarray): Link speed of each edge.
+        qmean (numpy.ndarray): Mean queuing delay of each edge.
+        txdelay (numpy.ndarray): Propagation plus transmission delay of a Tx on each edge.
+        blkdelay (numpy.ndarray): Propagation plus transmission delay of a block on each edge.
+    """
+
+    def __init__(self, indptr, indices, prop, cap):
+        """
+        Initializes the tables from per-edge propagation delays and link speeds.
+
+        Args:
+            indptr (numpy.ndarray): Start of each peer's edges.
+            indices (numpy.ndarray): Receiving peer of each edge.
+            prop (numpy.ndarray): Propagation delay of each edge.
+            cap (numpy.ndarray): Link speed of each edge.
+        """
+        self.indptr = indptr
+        self.indices = indices
+        self.prop = prop
+        self.cap = cap
+        self.qmean = QUEUE_BITS / cap
+        self.txdelay = prop + TX_BITS / cap
+        self.blkdelay = prop + BLK_BITS / cap
+
+    @classmethod
+    def build(cls, adj, slow, gen):
+        """
+        Draws propagation delays and sets link speeds for a topology.
+
+        Args:
+            adj (list): Neighbor IDs of every peer.
+            slow (numpy.ndarray): True for slow peers.
+            gen (numpy.random.Generator): Generator for the propagation delays.
+
+        Returns:
+            LinkModel: Tables of the network.
+        """
+        deg = np.fromiter((len(a) for a in adj), dtype=np.int64, count=len(adj))
+        indptr = np.zeros(len(adj) + 1, dtype=np.int64)
+        np.cumsum(deg, out=indptr[1:])
+        indices = np.fromiter((j for a in adj for j in a), dtype=np.int64, count=int(indptr[-1]))
+        src = np.repeat(np.arange(len(adj)), deg)
+        prop = gen.uniform(10, 500, size=len(indices))          # one propagation delay per direction of a link
+        fast = ~slow[src] & ~slow[indices]                      # both peers fast
+        cap = np.where(fast, FAST_LINK, SLOW_LINK).astype(np.float64)
+        return cls(indptr, indices, prop, cap)
+
+    def attach(self, peers, local=None):
+        """
+        Gives every peer its neighbors and edge tables as plain lists for fast scalar access.
+
+        Args:
+            peers (list): All peers, indexed by ID.
+            local (list, optional): Only give these peers their tables. Defaults to all peers.
+        """
+        for peer in peers if local is None else local:
+            i = peer.ID
+            s, e = self.indptr[i], self.indptr[i + 1]
+            peer.neighbor = [peers[j] for j in self.indices[s:e]]
+            peer.txlat = self.txdelay[s:e].tolist()
+            peer.blklat = self.blkdelay[s:e].tolist()
+            peer.qmean = self.qmean[s:e].tolist()
+
+    def save(self, path):
+        """
+        Writes the tables to an .npz file for analysis without rerunning the simulation.
+
+        Args:
+            path (str): File name.
+        """
+        np.savez(path, indptr=self.indptr, indices=self.indices, prop=self.prop, cap=self.cap)
+
+    @classmethod
+    def load(cls, path):
+        """
+        Reads tables written by save.
+
+        Args:
+            path (str): File name.
+
+        Returns:
+            LinkModel: Tables of the network.
+        """
+        d = np.load(path)
+        return cls(d['indptr'], d['indices'], d['prop'], d['cap'])
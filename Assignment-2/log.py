@@ -0,0 +1,85 @@
+import sys
+from collections import deque
+
+DEBUG = 10      # every hop of every message
+INFO = 20       # blocks found, forks, attacker moves
+WARNING = 30    # invalid blocks
+LEVELS = {'debug': DEBUG, 'info': INFO, 'warning': WARNING}
+
+# Category and the level its messages are logged at
+CATEGORIES = {
+    'tx': DEBUG,        # new transactions
+    'hop': DEBUG,       # a block sent to or received by a peer
+    'chain': DEBUG,     # blocks added to or already in a local chain
+    'mining': INFO,     # blocks mined
+    'fork': INFO,       # forks seen by peers
+    'attack': INFO,     # selfish mining state changes
+    'invalid': WARNING, # invalid blocks
+}
+
+
+class Logger:
+    """
+    Level gated logger with a switch per category.
+    Every category is a plain bool attribute, so call sites guard with `if log.tx:` and a disabled
+    message costs one attribute lookup. Messages are %-style format strings with their arguments,
+    formatted only when written, and records kept in the ring buffer are formatted only when dumped.
+
+    Attributes:
+        level (int): Lowest level written.
+        stream (file): Where messages are written, None to only keep the ring buffer.
+        ring (collections.deque): Last records as (category, format, args), None when disabled.
+    """
+
+    def __init__(self):
+        """
+        Initializes a logger writing everything to stdout, like the plain prints it replaces.
+        """
+        self.configure(DEBUG)
+
+    def configure(self, level=INFO, categories=None, stream=sys.stdout, ring=0):
+        """
+        Sets which messages are logged and where.
+
+        Args:
+            level (int, optional): Lowest level logged. Defaults to INFO.
+            categories (iterable, optional): Categories logged, None for all. Defaults to None.
+            stream (file, optional): Where messages are written, None to only fill the ring buffer. Defaults to sys.stdout.
+            ring (int, optional): Number of last records kept in memory, 0 to keep none. Defaults to 0.
+        """
+        self.level = level
+        self.stream = stream
+        self.ring = deque(maxlen=ring) if ring else None
+        for cat, catlevel in CATEGORIES.items():
+            on = catlevel >= level and (categories is None or cat in categories)
+            setattr(self, cat, on and (stream is not None or self.ring is not None))
+
+    def __call__(self, cat, fmt, *args):
+        """
+        Logs one message, call only after checking the category flag.
+
+        Args:
+            cat (str): Category of the message.
+            fmt (str): %-style format string.
+            *args: Values for the format string.
+        """
+        if self.ring is not None:
+            self.ring.append((cat, fmt, args))
+        if self.stream is not None:
+            self.stream.write(fmt % args + '\n')
+
+    def dump(self, stream=sys.stderr):
+        """
+        Writes the records in the ring buffer, oldest first.
+
+        Args:
+            stream (file, optional): Where to write. Defaults to sys.stderr.
+        """
+        if self.ring is None:
+            return
+        stream.write(f'--- last {len(self.ring)} log records ---\n')
+        for cat, fmt, args in self.ring:
+            stream.write(f'[{cat}] ' + fmt % args + '\n')
+
+
+log = Logger()
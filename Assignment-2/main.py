@@ -1,5 +1,5 @@
 import argparse
-import random
+import sys
 import time
 import hashlib
 import uuid
@@ -8,64 +8,36 @@ import matplotlib.pyplot as plt
 import numpy as np
 from blockchain import Block
 from blockchain import Blockchain
-import heapq
+from blockchain import BlockStore
 import os
 from Tree import Tree
+from bloom import BloomFilter
+from mempool import Mempool
+from rng import RandomStreams, ExponentialIterator, ReceiverSampler
+from linkmodel import LinkModel
+from topology import generate, TOPOLOGIES
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'common'))    # simulation.py is shared by both assignments
+from simulation import Simulation, SCHEDULERS, NullScheduler
+from simulation import GEN_TX, RECV_TX, START_MINING, SEND_BLK, MINED_BLK, RECV_BLK, MINED_PRIVATE, MINE_RACE
+from race import MiningRace
+from txprop import TxPropagation
+from log import log, LEVELS, CATEGORIES
+from replay import Recorder, Replay
+from checkpoint import Checkpointer
+from metrics import Metrics, ATTACKERS, CONFIRMATIONS
+from profiler import Profiler
+from parallel import ParallelSimulation, RemotePeer
+from evtrace import TraceWriter, TX_GEN, TX_RECV, BLK_MINED, BLK_RECV, FORK, PRIVATE, RELEASE
+
+DRAW_LIMIT = 500  # network.png is drawn only for networks up to this size
+REPLAY_ARGS = ('n', 'Ttx', 'Tk', 'C1', 'C2', 'N', 'seed', 'bloom', 'topology', 'zipf', 'race', 'analytic_tx', 'scheduler')   # arguments a replay must match
+CHECKPOINT_ARGS = ('n', 'C1', 'C2', 'bloom', 'topology', 'zipf', 'race', 'analytic_tx', 'scheduler')   # arguments a resumed run must match, Ttx, Tk and N may change
+CHECKPOINT_BLOCKS = 10  # checkpoints are written every these many mean block intervals unless --checkpoint-every is given
+PROFILED = ('UpdateChain', 'UpdateTx', 'sendblock', 'sendtx', 'generateTx', 'generateblk', 'findvalidTx',
+            'checkValidation', 'checkadd', 'add_block_attacker')  # Peer methods timed by --profile
 
-UTX = []       #Unspent Transaction pool
-glob_time = 0  # a variable to maintain time used for simulation
 
 
-
-def exponential_iterator(mean):
-    """
-    Generator function that yields exponentially distributed random numbers.
-
-    Args:
-        mean (float): Mean of the exponential distribution.
-
-    Yields:
-        float: Random numbers drawn from an exponential distribution with the specified mean.
-    """
-    while True:
-        yield np.random.exponential(scale=mean)
-
-class TimedPriorityQueue:
-    """
-    Priority queue implementation based on timestamps.
-
-    Attributes:
-        heap (list): List representing the priority queue.
-        counter (int): Counter for maintaining the insertion order of elements.
-    """
-    def __init__(self):
-        """
-        Initializes a new TimedPriorityQueue object.
-        """
-        self.heap = []
-        self.counter = 0
-
-    def push(self, variable_list, timestamp):
-        """
-        Pushes a variable list into the priority queue with a specified timestamp.
-
-        Args:
-            variable_list (list): List of variables to be pushed into the queue.
-            timestamp (float): Timestamp associated with the variable list.
-        """
-        heapq.heappush(self.heap, (timestamp, self.counter, variable_list))
-        self.counter += 1
-
-    def pop(self):
-        """
-        Pops the variable list with the smallest timestamp from the priority queue.
-
-        Returns:
-            tuple: A tuple containing the timestamp and the variable list.
-        """
-        ts, _, variable_list = heapq.heappop(self.heap)
-        return ts, variable_list
-
 class Transaction:
     """
     Class for creating Transaction details between 2 parties
@@ -78,14 +50,19 @@ class Transaction:
         amount (int): Amount of Bitcoins involved in this transaction
         size (int): Size of Tx in Bytes
         txcomp (bool): Transaction status (complete or not)
+        num (int): Numeric ID in order of creation within the run
+        born (float): Simulation time the Tx was generated
+        arrival (numpy.ndarray): Delay until the Tx reaches every peer, only with analytic Tx propagation
     """
-    def __init__(self,receiver,sender,amount):
+
+    def __init__(self,receiver,sender,amount,num=0):
         """Initializes a new Transaction object.
 
         Args:
             receiver (str): Recipitent of transaction
             sender (str): Sender of the transaction
             amount (float): Amount of Bitcoins involved in this transaction
+            num (int, optional): Numeric ID in order of creation within the run. Defaults to 0.
         """
         # Generating unique Tx ID using timestamp and UUID
         self.timestamp = time.time()
@@ -99,6 +76,9 @@ class Transaction:
 
         #Status of Tx
         self.txcomp = False
+        self.born = 0
+        self.arrival = None
+        self.num = num
     
     def txlog(self):
         """String representing Tx Details
@@ -109,14 +89,18 @@ class Transaction:
         return f'{self.txid}: {self.sender.ID} pays {self.receiver.ID} {self.amount} coins'
     
 class Peer:
-    def __init__(self, name, id):
+    def __init__(self, name, id, store=None, bloom=None, sim=None):
         """
         Initializes a new Peer object.
 
         Args:
             name (str): Name of the peer.
             id (str): Unique identifier for the peer.
+            store (BlockStore, optional): Block tree shared by all peers. Defaults to a private one.
+            bloom (int, optional): Track seen Tx IDs in a Bloom filter of this capacity instead of a dict. Defaults to None.
+            sim (P2PSimulation, optional): Run the peer belongs to, for the clock, event queue and UTX. Defaults to None.
         """
+        self.sim = sim
         self.simtime = time.time()
         self.name = name
         self.ID = id
@@ -124,47 +108,24 @@ class Peer:
         self.cpuspeed = 1
         self.neighbor = []
         self.lastblkarrivaltime = 0
-        self.localchain = Blockchain()
-        self.txpool = []
-        self.blkqueue = {'00000000000000000000000000000000': self.simtime}
-        self.txqueue = {}
+        self.localchain = Blockchain(store)
+        self.blkqueue = {'00000000000000000000000000000000': self.simtime}    # Earliest arrival time of every block heard of
+        self.txqueue = {} if bloom is None else BloomFilter(bloom)          # Earliest arrival time of every Tx heard of, or a bounded Bloom filter of their IDs
         self.balance = 100
         self.blk_itr = None
         self.txn_itr = None
+        self.rng = None     # Stream for queuing delays
+        self.txlat = []     # Propagation plus transmission delay of a Tx to each neighbor
+        self.blklat = []    # Propagation plus transmission delay of a block to each neighbor
+        self.qmean = []     # Mean queuing delay to each neighbor
         self.is_mining = False
-        self.p = {}     # Dict for Propagation Delay
+        self.mining = None      # Queue handle of the pending mining event
+        self.miningblk = None   # Block of the pending mining event
+        self.race = None        # Network wide MiningRace, None when every peer draws its own mining times
+        self.txprop = None      # TxPropagation when Tx arrival times are computed instead of flooded
         self.tot_mining = 0
         self.state0 = False
 
-    def Delay(self, other, msg):
-        """
-        Calculates the delay in sending a message from this peer to another peer.
-
-        Args:
-            other (Peer): The peer to which the message is being sent.
-            msg: The message being sent.
-
-        Returns:
-            float: The delay in sending the message.
-        """
-        if other.ID not in self.p.keys():
-            self.p[other.ID] = np.random.uniform(10, 500) 
-        size = 0
-        if isinstance(msg, Transaction):                    # checking type of msg whether it is transaction or block
-            size = 8000                                     # size of transaction in bits
-        elif isinstance(msg, Block):
-            size = 8 * (10 ** 6)                            # size of block in bits
-        else:
-            # print("Invalid msg type")
-            return
-        cij = 5 * (10 ** 6)
-        if self.is_slow == False and other.is_slow == False:    #checking if both peers are slow or fast
-            cij = 100 * (10 ** 6)
-        prop = size / cij
-        queue_delay = np.random.exponential((96000 / cij), 1)[0]
-        delay = self.p[other.ID] + prop + queue_delay           #calculating total delay
-        return delay
-    
     def sendtx(self, msg : Transaction):
         """
         Sends a transaction message to neighboring peers.
@@ -172,10 +133,27 @@ class Peer:
         Args:
             msg (Transaction): The transaction message to be sent.
         """
-        for others in self.neighbor:                            #broadcasting to all neighbors
-            if msg not in others.txpool:
-                t = glob_time + self.Delay(others, msg)         # calculating the delay for transaction
-                tpq.push([others, 2, msg], t)
+        if self.sim.replay is not None:                         # arrivals come from the recording
+            return
+        exp = self.rng.exponential
+        push = self.sim.queue.push
+        now = self.sim.now
+        for others, lat, qmean in zip(self.neighbor, self.txlat, self.qmean):   #broadcasting to all neighbors
+            seen = others.txqueue
+            if isinstance(seen, BloomFilter):
+                if msg.txid in seen:                            # peer has heard of this tx (or a false positive)
+                    continue
+                seen.add(msg.txid)
+                push(now + lat + exp(qmean), RECV_TX, others, msg, self)
+                continue
+            first = seen.get(msg.txid)
+            if first is not None and first <= now:              # peer already has this tx
+                continue
+            t = now + lat + exp(qmean)                          # calculating the delay for transaction
+            if first is not None and first <= t:                # an earlier copy is already on its way
+                continue
+            seen[msg.txid] = t
+            push(t, RECV_TX, others, msg, self)     # the sender goes along, for shards of a parallel run
 
     def sendblock(self, msg : Block, arrv_time):
         """
@@ -185,13 +163,19 @@ class Peer:
             msg (Block): The block message to be sent.
             arrv_time (float): Arrival time of the block.
         """
-        if ((self.ID == 0 or self.ID == 1) and not msg.miner.ID == self.ID):
+        if ((self.ID == 0 or self.ID == 1) and not msg.miner.ID == self.ID) or self.sim.replay is not None:
             return
-        for others in self.neighbor:                            #broadcasting to all neighbors
-            if msg not in others.localchain.chain:
-                t = arrv_time + self.Delay(others, msg)
-                others.blkqueue[msg.blkid] = t                      #updating block queue of other peer and putting timestamp
-                tpq.push([others, 6, msg], t)
+        exp = self.rng.exponential
+        push = self.sim.queue.push
+        for others, lat, qmean in zip(self.neighbor, self.blklat, self.qmean):  #broadcasting to all neighbors
+            if others.localchain.has(msg.blkid):
+                continue
+            t = arrv_time + lat + exp(qmean)                    # calculating the delay for block
+            first = others.blkqueue.get(msg.blkid)
+            if first is not None and first <= t:                # an earlier copy is already on its way
+                continue
+            others.blkqueue[msg.blkid] = t                      #updating block queue of other peer and putting timestamp
+            push(t, RECV_BLK, others, msg)
 
     def UpdateChain(self, blk : Block, arrival_time):
         """
@@ -202,37 +186,45 @@ class Peer:
             arrival_time (float): Arrival time of the block.
         """
         validblk = self.checkValidation(blk)                            #checking if block is valid or not depending on transactions in this block
+        if not validblk and not self.localchain.has(blk.plink):
+            self.blkqueue.pop(blk.blkid, None)                          # parent has not arrived yet, so let a later copy through
         if validblk: #We will add the block in the chain if it is a valid block or a fork
-            blen = len(self.localchain.longchain)
+            oldtip = self.localchain.getLastblk()
+            blen = self.localchain.depth(oldtip)
             if self.localchain.AddBlock(blk,arrival_time):              #check weather it is present in chain or not
-                print(f"new block recieved by block by {self.name}")
+                if log.hop:
+                    log('hop', 'new block recieved by block by %s', self.name)
                 self.blkqueue[blk.blkid] = arrival_time                 #updating block queue of this peer and putting timestamp
-                self.ballist = self.localchain.blkbal[self.localchain.getLastblk().blkid].copy()                #updating balance list of this peer
-                if self.ID not in self.ballist.keys():                  # If peer is not in the dict then he has given the initial bal
-                    self.ballist[self.ID] = 100
-                self.balance = self.ballist[self.ID]
-                tpq.push([self,4,blk],arrival_time)                     #broadcasting block to all neighbors
+                self.sim.metrics.propagation.arrived(self, blk, arrival_time)
+                self.balance = self.localchain.ledger.balance(self.localchain.getLastblk().blkid, self.ID)    #updating balance of this peer
+                self.sim.queue.push(arrival_time, SEND_BLK, self, blk)  #broadcasting block to all neighbors
                 self.lastblkarrivaltime = arrival_time
                 if not self.is_mining:                                  #if not mining then start mining
                     self.generateblk()
-                # if blk.blkid != self.localchain.getLastblk().blkid :    #if block is not a fork then mark transactions as completed
-                    print(f'Fork detected at peer ID:{self.ID} for block ID:{blk.blkid}')
-                alen = len(self.localchain.longchain)
+                elif self.ID != 0 and self.ID != 1 and self.localchain.getLastblk() is not oldtip:
+                    self.generateblk()                                  #tip moved so the pending block is stale, mine on the new tip instead
+                if log.fork and blk is not self.localchain.getLastblk():   #block did not extend the longest chain
+                    log('fork', 'Fork detected at peer ID:%s for block ID:%s', self.ID, blk.blkid)
+                if self.sim.trace is not None:
+                    self.traceblk(BLK_RECV if blk is self.localchain.getLastblk() else FORK, blk, arrival_time, self.localchain.depth(blk))
+                alen = self.localchain.depth(self.localchain.getLastblk())
                 if alen == blen:
                     # Long chain not updated, so return
                     return
                 # Long chain got updated so check conditions for attacker
                 if (self.ID == 0 or self.ID == 1) :
                     # length of private chain
-                    temp_height = self.localchain.blkdata[self.localchain.lastplink] + len(self.localchain.private_chain)
+                    temp_height = self.localchain.store.blkdata[self.localchain.lastplink] + len(self.localchain.private_chain)
                     # length of longest visible change
-                    lvc = self.localchain.blkdata[self.localchain.getLastblk().blkid]
+                    lvc = self.localchain.depth(self.localchain.getLastblk())
                     # print(temp_height-lvc," ",self.ID)
                     if temp_height - lvc > 1:
                         # Lead is greater than 2 and new block added in LVC
                         if self.localchain.AddBlock(self.localchain.private_chain[0],arrival_time):
                             # Add one block from private chain into main chain
-                            tpq.push([self,4,self.localchain.private_chain[0]],arrival_time) 
+                            if self.sim.trace is not None:
+                                self.traceblk(RELEASE, self.localchain.private_chain[0], arrival_time, len(self.localchain.private_chain) - 1)
+                            self.sim.queue.push(arrival_time, SEND_BLK, self, self.localchain.private_chain[0])
                             self.localchain.lastplink = self.localchain.private_chain[0].blkid
                             self.localchain.private_chain = self.localchain.private_chain[1:]
                     if temp_height - lvc == 1:
@@ -240,7 +232,9 @@ class Peer:
                         for privateblk in self.localchain.private_chain:
                             # Broadcast all the blocks in private chain
                             if self.localchain.AddBlock(privateblk,arrival_time):
-                                tpq.push([self,4,privateblk],arrival_time) 
+                                if self.sim.trace is not None:
+                                    self.traceblk(RELEASE, privateblk, arrival_time)
+                                self.sim.queue.push(arrival_time, SEND_BLK, self, privateblk)
                         self.localchain.lastplink = self.localchain.private_chain[-1].blkid
                         self.localchain.private_chain = []
                     if temp_height - lvc == 0:
@@ -248,9 +242,12 @@ class Peer:
                         for privateblk in self.localchain.private_chain:
                             # Broadcast all block
                             if self.localchain.AddBlock(privateblk,arrival_time) :
-                                tpq.push([self,4,privateblk],arrival_time)
+                                if self.sim.trace is not None:
+                                    self.traceblk(RELEASE, privateblk, arrival_time)
+                                self.sim.queue.push(arrival_time, SEND_BLK, self, privateblk)
                         # Mine on his block and empty the private chain
-                        print("State 0'",self.ID)
+                        if log.attack:
+                            log('attack', "State 0' %s", self.ID)
                         self.localchain.lastplink = self.localchain.private_chain[-1].blkid
                         self.localchain.private_chain = []
                         # This is state 0' which will go to state 0
@@ -260,10 +257,12 @@ class Peer:
                         # Lead is 0 and new block is added in LVC before attacker
                         # Start the new attack on last block
                         if self.state0:
-                            print("State 0' to 0 without attacker block", self.ID)
+                            if log.attack:
+                                log('attack', "State 0' to 0 without attacker block %s", self.ID)
                         self.state0 = False
                         self.localchain.private_chain = []
                         self.localchain.lastplink = self.localchain.getLastblk().blkid
+                        self.generateblk()                              #pending block was on the old base, mine on the new one
         return
     
 
@@ -275,10 +274,18 @@ class Peer:
             tx (Transaction): The transaction to be added to the pool.
             arrival_time (float): Arrival time of the transaction.
         """
-        global UTX
-        self.txpool.append(tx)                      # Adding the tx in txpool
-        if tx not in UTX:
-            UTX.append(tx)                          # Updating the tx in global txpool
+        if not isinstance(self.txqueue, BloomFilter):
+            if self.sim.replay is None:
+                first = self.txqueue[tx.txid]                       # the earliest copy was noted when sent
+            else:                                                   # nothing is sent in a replay, so copies note themselves
+                first = self.txqueue.get(tx.txid)
+                if first is None or arrival_time < first:           # a checkpoint may hold a later copy still on its way
+                    first = self.txqueue[tx.txid] = arrival_time
+            if first < arrival_time:
+                return                              # a copy that arrived earlier was already handled
+        if self.sim.trace is not None and tx.sender is not self:
+            self.sim.trace.record(TX_RECV, arrival_time, self.ID, tx.num, tx.sender.ID)
+        self.sim.UTX.add(tx)                        # Updating the tx in global txpool
         self.sendtx(tx)                             #broadcasting transaction to all neighbors
         return
 
@@ -290,18 +297,32 @@ class Peer:
             recv (Peer): The recipient peer.
             arrv_time (float): Arrival time of the transaction.
         """
-        global UTX
         sender = self
         if self.balance < 1:        # checking bal
             amount = 0
             return
         else:
-            amount = random.randint(1,self.balance)
+            amount = self.sim.rng.py.randint(1,self.balance)
         # amount = 0
         self.balance = self.balance - amount            #updating balance of sender and receiver after transaction
-        recv.balance = self.balance + amount
-        tx = Transaction(recv,sender,amount)
-        print (f"new txn gen by {self.name} at time {glob_time}")
+        self.sim.setbalance(recv, self.balance + amount)
+        tx = Transaction(recv,sender,amount,self.sim.ntx)
+        self.sim.ntx += 1
+        tx.born = arrv_time
+        if self.sim.replay is not None:
+            self.sim.replay.register(tx)
+        if log.tx:
+            log('tx', 'new txn gen by %s at time %s', self.name, self.sim.now)
+        if self.sim.trace is not None:
+            self.sim.trace.record(TX_GEN, arrv_time, self.ID, tx.num, recv.ID, amount)
+        if self.txprop is not None:
+            tx.arrival = self.txprop.arrivals(self.ID)      # peers pick it up once it has reached them, see findvalidTx
+            self.sim.UTX.add(tx)
+            return
+        if isinstance(self.txqueue, BloomFilter):
+            self.txqueue.add(tx.txid)
+        else:
+            self.txqueue[tx.txid] = arrv_time
         self.UpdateTx(tx,arrv_time)                     #updating transaction pool of sender and broadcasting transaction to all neighbors
         return
 
@@ -317,51 +338,46 @@ class Peer:
             bool: True if the block is valid, False otherwise.
         """
         Txlist = blk.Txlist                             #getting list of transactions in this block
-        if blk.plink not in self.localchain.blkdata.keys():
-            print('Not a valid block')
+        if not self.localchain.has(blk.plink):
+            if log.chain:
+                log('chain', 'Not a valid block')
             return False
-        bal = self.localchain.blkbal[blk.plink].copy()  #getting balance list of all peers from its local longest chain
+        bal = self.localchain.ledger.view(blk.plink)    #getting balance of all peers at the parent, unknown peers start at 100
         for tx in Txlist:
-            if tx.sender.ID not in bal.keys():          #checking if sender and receiver are present in balance list or not
-                bal[tx.sender.ID] = 100                 #give all peers an initial balance of 100
-            if tx.receiver.ID not in bal.keys():
-                bal[tx.receiver.ID] = 100
             bal[tx.receiver.ID] = bal[tx.receiver.ID] + tx.amount
             bal[tx.sender.ID] = bal[tx.sender.ID] - tx.amount
             if (bal[tx.sender.ID] < 0 or bal[tx.receiver.ID] < 0):
-                print("Invalid Block")
+                if log.invalid:
+                    log('invalid', 'Invalid Block %s', blk.blkid)
                 return False
         return True
 
     def findvalidTx(self,blktimestamp):
         """
         Finds valid transactions from the global transaction pool.
+        With analytic Tx propagation only the Tx that have reached this peer by now are considered.
 
         Returns:
             list: List of valid transactions.
         """
-        global UTX
-        txlist = []
-        bal = self.localchain.blkbal[self.localchain.getLastblk().blkid].copy()
-        for i,tx in enumerate(UTX):                               #itterating through all transactions in UTX and getting the valid txns according to the balance criteria
-            if tx.sender.ID not in bal.keys():
-                bal[tx.sender.ID] = 100
-            if tx.receiver.ID not in bal.keys():
-                bal[tx.receiver.ID] = 100
-            bal[tx.receiver.ID] = bal[tx.receiver.ID] + tx.amount #updating balance of sender and receiver
-            bal[tx.sender.ID] = bal[tx.sender.ID] - tx.amount
-            if (bal[tx.sender.ID] < 0 or bal[tx.receiver.ID] < 0):
-                bal[tx.receiver.ID] = bal[tx.receiver.ID] - tx.amount
-                bal[tx.sender.ID] = bal[tx.sender.ID] + tx.amount
-                continue
-            if tx.timestamp <= blktimestamp:
-                txlist.append(tx)
-            if len(txlist) == 999:                                #limiting the number of transactions in a block to 999
-                break
+        bal = self.localchain.ledger.view(self.localchain.getLastblk().blkid)
+        txlist = self.sim.UTX.select(bal, 999, blktimestamp, self.ID, self.sim.now) #getting the valid txns according to the balance criteria, at most 999 in a block
         for tx in txlist:
-            UTX.remove(tx)
+            self.sim.UTX.remove(tx)
         return txlist
 
+    def traceblk(self, etype, blk, t, aux=0.0):
+        """
+        Records a block event in the trace.
+
+        Args:
+            etype (int): Event type, see evtrace.py.
+            blk (Block): Block of the event, already in the shared store.
+            t (float): Simulated time.
+            aux (float, optional): Extra value of the event type. Defaults to 0.0.
+        """
+        self.sim.trace.record(etype, t, self.ID, blk.num, self.localchain.store.blocks[blk.plink].num, aux)
+
     def marktxcomp(self, Txlist):
         """
         Marks transactions as completed.
@@ -372,30 +388,73 @@ class Peer:
         for tx in Txlist:                                         #marking all transactions as completed
             tx.txcomp = True
 
-    def generateblk(self):
+    def stopmining(self):
         """
-        Generates a new block and initiates the mining process.
+        Cancels the pending mining event, if any, and puts the Tx of its block back in UTX.
+        """
+        if self.mining is None:
+            return
+        self.sim.queue.cancel(self.mining)
+        self.sim.UTX.update(self.miningblk.Txlist)
+        self.mining = None
+        self.miningblk = None
+
+    def miningparent(self):
+        """
+        Block ID the next block of this peer goes on.
+
+        Returns:
+            str: Last block of the longest chain for honest peers, end of the private chain for attackers.
+        """
+        if self.ID != 0  and self.ID !=1:
+            return self.localchain.getLastblk().blkid
+        if len(self.localchain.private_chain) != 0:
+            # Private chain is not empty so add plink as last blk in private chain
+            return self.localchain.private_chain[-1].blkid
+        # else add last plink as blk where he wanted to start attack
+        return self.localchain.lastplink
+
+    def newblock(self):
         """
+        Block template on the mining parent, honest peers fill it with valid Tx from UTX.
+
+        Returns:
+            Block: The new block.
+        """
+        newblk = Block([], self, self.miningparent(), self.sim.nblk, self.sim.rng.py) #creating new block with its parent link as last block in local chain
+        self.sim.nblk += 1
+        if self.sim.replay is not None:
+            self.sim.replay.register(newblk)
         if self.ID != 0  and self.ID !=1:
-            # Honest Nodes
-            newblk = Block([], self, self.localchain.getLastblk().blkid) #creating new block with its parent link as last block in local chain
             newblk.Txlist = self.findvalidTx(newblk.timestamp)
-            # print(f'{self.name} started mining...at time {glob_time}')
-            k = glob_time + next(self.blk_itr)                           #waiting for time to mine a block
-            self.is_mining = True
-            tpq.push([self, 5, newblk, []], k)
-        else :
-            # attacker nodes
-            if len(self.localchain.private_chain) != 0:
-                # Private chain is not empty so add plink as last blk in private chain
-                newblk = Block([], self, self.localchain.private_chain[-1].blkid)             
-            else :
-                # else add last plink as blk where he wanted to start attack
-                newblk = Block([], self, self.localchain.lastplink)
-            # newblk.Txlist = []
-            k = glob_time + next(self.blk_itr)                           #waiting for time to mine a block
-            self.is_mining = True
-            tpq.push([self, 7,newblk], k)
+        return newblk
+
+    def generateblk(self):
+        """
+        Generates a new block and initiates the mining process.
+        Any pending mining event of this peer is cancelled first, mining times are exponential
+        so starting over from now does not change their distribution.
+        With a network wide race the peer only joins it, the block is made when the peer wins.
+        """
+        self.is_mining = True
+        if self.race is not None:
+            self.race.join(self, self.miningparent(), 1.0 / self.blk_itr.mean, self.sim.now)
+            return
+        self.stopmining()
+        newblk = self.newblock()
+        # print(f'{self.name} started mining...at time {self.sim.now}')
+        k = self.sim.now + next(self.blk_itr)                            #waiting for time to mine a block
+        self.mining = self.sim.queue.push(k, MINED_BLK if self.ID != 0 and self.ID != 1 else MINED_PRIVATE, self, newblk, [])
+        self.miningblk = newblk
+
+    def winrace(self):
+        """
+        Makes the block this peer just found in the network wide race and hands it on like a mined block.
+        """
+        self.race.leave(self, self.sim.now)
+        newblk = self.newblock()
+        self.mining = self.sim.queue.push(self.sim.now, MINED_BLK if self.ID != 0 and self.ID != 1 else MINED_PRIVATE, self, newblk, [])
+        self.miningblk = newblk
            
             
     def add_block_attacker(self,blk : Block):
@@ -404,11 +463,15 @@ class Peer:
         Args:
             blk (Block): New block to add into private chain
         """
+        self.mining = None
+        self.miningblk = None
         if self.state0 and blk.plink == self.localchain.lastplink:
             # Attacker is in state 0' and he generated new block so he goes to state 0 by broadcasting newly generated block
-            if self.localchain.AddBlock(blk,glob_time):
+            if self.localchain.AddBlock(blk,self.sim.now):
                 self.tot_mining = self.tot_mining + 1
-                tpq.push([self,4,blk],glob_time)
+                if self.sim.trace is not None:
+                    self.traceblk(RELEASE, blk, self.sim.now)
+                self.sim.queue.push(self.sim.now, SEND_BLK, self, blk)
                 # print("State 0' to 0 with attacker block",self.ID)
                 self.state0 = False
                 self.localchain.lastplink = blk.blkid
@@ -416,6 +479,8 @@ class Peer:
             # If private chain is not empty or new attack and not in state 0'
             self.localchain.private_chain.append(blk)
             self.tot_mining = self.tot_mining + 1
+            if self.sim.trace is not None:
+                self.sim.trace.record(PRIVATE, self.sim.now, self.ID, -1, -1, len(self.localchain.private_chain))
         self.generateblk()
             
 
@@ -429,65 +494,88 @@ class Peer:
             newblk (Block): The new block to be added.
             listoftx (list): List of transactions included in the block.
         """
-        global UTX
+        self.mining = None
+        self.miningblk = None
         # # print(f"length of utx is {len(UTX)}")
-        # print(f'Checking Block by {self.name} at time {glob_time}')
+        # print(f'Checking Block by {self.name} at time {self.sim.now}')
         if newblk.plink == self.localchain.getLastblk().blkid:          #checking if parent link of this block is still the last block in local chain
             if self.checkValidation(newblk):                            #checking if block is valid or not according to transactions present in it
                 
-                if self.localchain.AddBlock(newblk,glob_time):          #adding this block to its local chain
-                    print(f'genrated id {newblk.blkid}')
-                    print(f'Generated Block is Valid Block by {self.name} at time {glob_time}')
+                if self.localchain.AddBlock(newblk,self.sim.now):       #adding this block to its local chain
+                    if log.mining:
+                        log('mining', 'genrated id %s', newblk.blkid)
+                        log('mining', 'Generated Block is Valid Block by %s at time %s', self.name, self.sim.now)
+                    if self.sim.trace is not None:
+                        self.traceblk(BLK_MINED, newblk, self.sim.now, len(newblk.Txlist))
                     self.lastblkarrivaltime = newblk.timestamp
-                    self.blkqueue[newblk.blkid] = glob_time
-                    self.ballist = self.localchain.blkbal[self.localchain.getLastblk().blkid].copy()
-                    if self.ID not in self.ballist.keys():
-                        self.ballist[self.ID] = 100
-                    self.balance = self.ballist[self.ID]
+                    self.blkqueue[newblk.blkid] = self.sim.now
+                    self.balance = self.localchain.ledger.balance(self.localchain.getLastblk().blkid, self.ID)
                    
-                    self.sendblock(newblk,glob_time)                    #broadcasting newly genarated block to all neighbors
+                    self.sendblock(newblk,self.sim.now)                 #broadcasting newly genarated block to all neighbors
+                    for tx in newblk.Txlist:
+                        tx.arrival = None                               #the block carries these Tx to everyone now
                     # self.tot_mining = self.tot_mining + 1
-                    if newblk in self.localchain.longchain:
+                    if self.localchain.inLongchain(newblk):
                         self.marktxcomp(listoftx)                       #marking transactions as completed if block is added to local chain
                     self.is_mining = False                              #mining is completed
             else:
                 # print('Generated Block is not Valid Block')
-                UTX = UTX + listoftx
+                self.sim.UTX.update(listoftx)
         else:
             # print(f'longchain is updated before mining completed at node {self.name}')
             self.is_mining = True                                   #again start mining as local chain is updated and and genarated block is not valid to be added to local chain
             self.generateblk()
-            UTX = UTX + listoftx                                    #if block is not added to local chain then add transactions back to UTX
+            self.sim.UTX.update(listoftx)                           #if block is not added to local chain then add transactions back to UTX
         self.is_mining = False
         
         return
 
 
 class Network:
-    def __init__(self, num, Ttx, Tk, C1, C2):
+    def __init__(self, sim, num, Ttx, Tk, C1, C2, bloom=None, seed=None, topology='random', zipf=None, race=False, txprop=False, owned=None):
         """
-        Initializes a network of peers.
+        Initializes a network of peers and schedules their first events.
 
         Args:
+            sim (P2PSimulation): Run the network belongs to.
             num (int): Total number of peers in the network.
             Ttx (float): Mean time between transaction generations.
             Tk (float): Mean time between block generation attempts.
             C1 (float): Mining power of the attacker 1.
             C2 (float): Mining power of the attackers 2.
+            bloom (int, optional): Capacity of per-peer Bloom filters for seen Tx IDs, None keeps exact dicts. Defaults to None.
+            seed (int, optional): Seed for all random streams of the run. Defaults to fresh entropy.
+            topology (str, optional): Network topology, one of topology.TOPOLOGIES. Defaults to 'random'.
+            zipf (float, optional): Zipf exponent for picking Tx receivers, None picks uniformly. Defaults to None.
+            race (bool, optional): Draw block times from one network wide race instead of per peer. Defaults to False.
+            txprop (bool, optional): Compute Tx arrival times along cached shortest path trees instead of flooding. Defaults to False.
+            owned (set, optional): IDs of the only peers run here, the others are parallel.RemotePeer stand-ins. Defaults to all peers.
         """
         self.n = num
-        self.all_peers = [Peer(f'Node_{i}', i) for i in range(self.n)]
+        self.rng = RandomStreams(seed)              # Every random draw of the run comes from these streams
+        self.store = BlockStore(rng=self.rng.py)    # One block tree for the whole network
+        self.receivers = ReceiverSampler(num, self.rng.rcv, zipf)   # Picks Tx receivers in O(1)
+        # Creates graph
+        self.adj = self.createNetwork(topology)
+        if owned is None:
+            self.all_peers = [Peer(f'Node_{i}', i, self.store, bloom, sim) for i in range(self.n)]
+            local = self.all_peers
+        else:
+            near = {j for i in owned for j in self.adj[i]}
+            chain = Blockchain(self.store)
+            self.all_peers = [Peer(f'Node_{i}', i, self.store, bloom, sim) if i in owned else
+                              RemotePeer(f'Node_{i}', i, chain, i in near, bloom) for i in range(self.n)]
+            local = [self.all_peers[i] for i in sorted(owned)]
+        self.race = MiningRace(sim.queue, self.rng.blk) if race else None
         self.all_peers[0].is_slow = False
         self.all_peers[1].is_slow = False
         self.all_peers[0].cpuspeed = C1 
         self.all_peers[1].cpuspeed = C2  
-        # Creates graph
-        self.graph = self.createNetwork()
         num_honest = num - 2
         num_slow = num_honest // 2
         num_fast = num_honest - num_slow
         arrz0 = np.array([False] * num_slow + [True] * num_fast)
-        np.random.shuffle(arrz0)
+        self.rng.net.shuffle(arrz0)
         rem_hashing_power = (100-C1-C2)/(num_honest)
         arrz1 = np.array([rem_hashing_power for _ in range(num_honest)])
         for i in range(2, self.n):
@@ -497,65 +585,286 @@ class Network:
         k = np.sum(arrz1) + C1 + C2
         for i in range(self.n):
             self.all_peers[i].cpuspeed = self.all_peers[i].cpuspeed/k   
-        for i in range(self.n):
-            self.all_peers[i].txn_itr = exponential_iterator(Ttx)       #setting mean time between transaction generations
-            self.all_peers[i].blk_itr = exponential_iterator(Tk / (self.all_peers[i].cpuspeed))
-            # print(Ttx, Tk / (self.all_peers[i].cpuspeed))
-
-    def createNetwork(self):
+        for peer in local:
+            peer.txn_itr = ExponentialIterator(Ttx, self.rng.txn)       #setting mean time between transaction generations
+            peer.blk_itr = ExponentialIterator(Tk / (peer.cpuspeed), self.rng.blk)
+            peer.rng = self.rng.link
+            peer.race = self.race
+            # print(Ttx, Tk / (peer.cpuspeed))
+        # Delay tables of every link, now that the topology and slow peers are known
+        slow = np.array([peer.is_slow for peer in self.all_peers], dtype=bool)
+        self.link = LinkModel.build(self.adj, slow, self.rng.net)
+        self.link.attach(self.all_peers, local)
+        self.txprop = TxPropagation(self.link, self.rng.txprop) if txprop else None
+        for peer in local:
+            peer.txprop = self.txprop
+        for peer in local:
+            k = self.all_peers[self.receivers.pick(peer.ID)]
+            sim.queue.push(0, GEN_TX, peer, k)                      #pushing transaction generation event for each peer
+        for peer in local:
+            sim.queue.push(0, START_MINING, peer)                   #all peers start mining at time 0
+
+    def createNetwork(self, topology='random'):
         """
-        Creates a network graph connecting the peers.
+        Creates the adjacency of peers without retries or recursion, see topology.py.
+
+        Args:
+            topology (str, optional): One of topology.TOPOLOGIES. Defaults to 'random' (3-6 neighbors per peer).
 
         Returns:
-            networkx.Graph: The network graph representing peer connections.
+            list: Sorted neighbor IDs of every peer.
         """
-        G = nx.Graph()
-        G.add_nodes_from(range(self.n))                                     #adding nodes to graph
+        return generate(topology, self.n, self.rng.net)
 
-        num_neighbors_array = [random.randint(3, 6) for _ in range(self.n)] #setting random number between 3-6 of neighbors for each peer
-        curr_list = list(range(self.n))                                     #list of all peers which are not satisfied according to its neighbors according to num_neighbors_array
+    def visualizeNetwork(self):
+        """
+        visulising network formed by peers and their connections using matplotlib
+        """
+        if self.n > DRAW_LIMIT:                                             # layout of big graphs takes too long to be useful
+            return
+        graph = nx.Graph()
+        graph.add_nodes_from(range(self.n))
+        graph.add_edges_from((u, v) for u in range(self.n) for v in self.adj[u])
+        nx.draw(graph, nx.spring_layout(graph), with_labels=True, font_weight='bold')
+        plt.savefig("network.png")
 
-        for node in range(self.n):
-            if node not in curr_list:                                       #found exact number of neighbors for this node
-                continue
-            curr_list.remove(node)
 
-            if len(curr_list) < num_neighbors_array[node]:                  #genrating new list of peers if not enough peers are present in curr_list
-                return self.createNetwork()                                 #again start genrating new network
 
-            neighbors = random.sample(curr_list, max(num_neighbors_array[node], 0)) #selecting random neighbors for this node
+class P2PSimulation(Simulation):
+    """
+    One run of the network. The event queue, clock, UTX pool, network and output hooks of a run
+    are held here instead of in module globals and every peer reaches them through its sim
+    attribute, so several runs can go one after another or side by side in one process.
+
+    Attributes:
+        network (Network): Peers of the run.
+        rng (RandomStreams): Random streams of the run.
+        UTX (Mempool): Unspent Transaction pool.
+        trace (TraceWriter): Records block and Tx events of the run, None when not tracing.
+        replay (Replay): Drives the handlers from a recording, None in a live run.
+        N (int): Number of mining events (START_MINING and MINED_BLK) the run stops after.
+        done (int): Mining events handled so far.
+        at (float): Time of the last checkpoint.
+        ntx (int): Tx made so far.
+        nblk (int): Blocks made so far, counting the genesis block.
+        metrics (Metrics): Counters of forks, reorgs, attacker leads and revenue shares, kept up to date.
+    """
+
+    def __init__(self, num, Ttx, Tk, C1, C2, N, bloom=None, seed=None, topology='random', zipf=None, race=False, txprop=False, queue=None, owned=None):
+        """
+        Builds the network of a run and schedules its first events.
+
+        Args:
+            num (int): Total number of peers in the network.
+            Ttx (float): Mean time between transaction generations.
+            Tk (float): Mean time between block generation attempts.
+            C1 (float): Mining power of the attacker 1.
+            C2 (float): Mining power of the attackers 2.
+            N (int): Number of mining events the run stops after.
+            bloom (int, optional): Capacity of per-peer Bloom filters for seen Tx IDs, None keeps exact dicts. Defaults to None.
+            seed (int, optional): Seed for all random streams of the run. Defaults to fresh entropy.
+            topology (str, optional): Network topology, one of topology.TOPOLOGIES. Defaults to 'random'.
+            zipf (float, optional): Zipf exponent for picking Tx receivers, None picks uniformly. Defaults to None.
+            race (bool, optional): Draw block times from one network wide race instead of per peer. Defaults to False.
+            txprop (bool, optional): Compute Tx arrival times along cached shortest path trees instead of flooding. Defaults to False.
+            queue (Scheduler, optional): Event queue. Defaults to a binary heap.
+            owned (set, optional): IDs of the only peers run here, for a shard of a parallel run. Defaults to all peers.
+        """
+        super().__init__(queue if queue is not None else SCHEDULERS['heap'](), {
+            GEN_TX: self.on_gentx,
+            RECV_TX: self.on_recvtx,
+            START_MINING: self.on_startmining,
+            SEND_BLK: self.on_sendblk,
+            MINED_BLK: self.on_minedblk,
+            RECV_BLK: self.on_recvblk,
+            MINED_PRIVATE: self.on_minedprivate,
+            MINE_RACE: self.on_minerace,
+        })
+        self.UTX = Mempool()
+        self.trace = None
+        self.replay = None
+        self.N = N
+        self.done = 0
+        self.at = 0
+        self.ntx = 0
+        self.nblk = 1
+        self.network = Network(self, num, Ttx, Tk, C1, C2, bloom, seed, topology, zipf, race, txprop, owned)
+        self.rng = self.network.rng
+        self.metrics = Metrics(self)
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state.update(trace=None, replay=None, record=None, clock=None, profiler=None)   # open files and hooks of this process, whoever resumes the run sets its own
+        return state
+
+    def tick(self, ts):
+        """
+        Moves the clock to the time of the event being handled, for event loops other than run().
+
+        Args:
+            ts (float): Event time.
+        """
+        self.now = ts
+        if self.clock is not None:
+            self.clock(ts)
+
+    def on_gentx(self, ts, peer, recv, extra):
+        peer.generateTx(recv, ts)
+        k = self.network.all_peers[self.network.receivers.pick(peer.ID)]
+        self.queue.push(ts + next(peer.txn_itr), GEN_TX, peer, k)  #genrating new txn after some time
+
+    def on_recvtx(self, ts, peer, tx, extra):
+        peer.UpdateTx(tx, ts)                                   #updating transaction pool of sender and broadcasting transaction to all neighbors
+
+    def on_startmining(self, ts, peer, msg, extra):
+        peer.generateblk()                                      #genrating new block
+
+    def on_sendblk(self, ts, peer, blk, extra):
+        if log.hop:
+            log('hop', 'broadcasting block by %s at %s of msg %s to all neighbors', peer.name, ts, blk.blkid)
+        peer.sendblock(blk, ts)                                 #checking if it is already sent and broadcasting block to all neighbors
 
-            for neighbor in neighbors:
-                G.add_edge(node, neighbor)                                  #adding edges to graph
-                G.add_edge(neighbor, node)                                  #adding edges to graph
-                num_neighbors_array[neighbor] -= 1                          #decreasing number of neighbors for this neighbor as it has found this one
-                if num_neighbors_array[neighbor] == 0:
-                    curr_list.remove(neighbor)                              #removing this neighbor from curr_list  as it has found all its neighbors
-            if not curr_list:                                               #if all peers are satisfied with their neighbors then check if it is connected
+    def on_minedblk(self, ts, peer, blk, listoftx):
+        peer.checkadd(blk, listoftx)                            #checking if block is valid and adding it to local chain and broadcasting it to all neighbors
+
+    def on_recvblk(self, ts, peer, blk, extra):
+        peer.UpdateChain(blk, ts)                               #updating local chain of a peer and broadcasting block to all neighbors
+        if log.hop:
+            log('hop', 'block recieved at %s ', peer.name)
+
+    def on_minedprivate(self, ts, peer, blk, extra):
+        peer.add_block_attacker(blk)
+
+    def on_minerace(self, ts, peer, msg, extra):
+        winner = self.network.race.winner()
+        if winner is not None:
+            winner.winrace()                                    #winner makes its block now and handles it like a mined one
+
+    def run(self, until=None, ckpt=None, every=None, args=None):
+        """
+        Runs till N mining events are handled and the blocks sent by then have reached every peer,
+        with a checkpoint every so often. Stopped early at a time, the run goes on with the next call.
+
+        Args:
+            until (float, optional): Stop before the first event later than this time. Defaults to the end of the run.
+            ckpt (Checkpointer, optional): Where checkpoints go, None for none. Defaults to None.
+            every (float, optional): Simulated time between checkpoints. Defaults to None.
+            args (dict, optional): Arguments of the run, saved with each checkpoint. Defaults to None.
+
+        Returns:
+            bool: True once the run is complete.
+        """
+        while self.done < self.N:
+            stop = until
+            due = None
+            if ckpt is not None:
+                due = self.at + every
+                if stop is None or due <= stop:
+                    stop = due
+            self.done += super().run(limit=self.N - self.done, counted=(START_MINING, MINED_BLK), until=stop)   #stopping simulation after genrating certain no of blocks
+            if self.done >= self.N or self.queue.peek() is None:
                 break
+            if stop == due:
+                self.at = due
+                ckpt.save(due, {'sim': self, 'args': args}, self.network.all_peers, self.network.store.blocks, self.checkpointdicts())
+            if stop == until:
+                return False
+        super().run(only=(SEND_BLK, RECV_BLK), until=until, dropped=self.dropmining)     #letting blocks already sent reach everyone
+        return self.queue.peek() is None
 
-        while not nx.is_connected(G):                                   # checking the genrated graph is connected or not
-            G = self.createNetwork()                                    #if not connected then again start genrating new network
-        for node in range(self.n):
-            self.all_peers[node].neighbor = [self.all_peers[p] for p in list(G.neighbors(node))]
-        for i in range(self.n):
-            random_number = random.choice([num for num in range(self.n) if num != i])
-            k = self.all_peers[random_number]   
-            tpq.push([self.all_peers[i], 1, k], 0)                  #pushing transaction generation event for each peer
-        for i in range(self.n):
-            tpq.push([self.all_peers[i], 3],0)                     #all peers start mining at time 0
+    def setbalance(self, peer, balance):
+        """
+        Sets the balance of the receiver of a new Tx. Shards of a parallel run send it to the
+        shard of the receiver instead, see parallel.Shard.setbalance.
 
-        return G
-        
-        
+        Args:
+            peer (Peer): The receiver.
+            balance (int): Its new balance.
+        """
+        peer.balance = balance
 
-    def visualizeNetwork(self):
+    def dropmining(self, entry):
         """
-        visulising network formed by peers and their connections using matplotlib
+        Forgets the mining event of a peer once the final drain has dropped it, so the peer does not
+        hold on to its handle and its block template. Called by Simulation.run for every dropped event.
+
+        Args:
+            entry (tuple): The dropped event, (timestamp, counter, opcode, peer, msg, extra).
         """
-        nx.draw(self.graph, nx.spring_layout(self.graph), with_labels=True, font_weight='bold')
-        plt.savefig("network.png")
+        _, handle, op, peer, _, _ = entry
+        if op in (MINED_BLK, MINED_PRIVATE) and peer.mining == handle:
+            peer.stopmining()                       # the handle is no longer queued, so only the Tx go back
+
+    def checkpointdicts(self):
+        """
+        Dicts of the state that grow with the run, checkpoints write only their changes.
+
+        Returns:
+            dict: The dicts by name.
+        """
+        store = self.network.store
+        ledger = store.ledger
+        dicts = {'blocks': store.blocks, 'blkdata': store.blkdata, 'blkchild': store.blkchild,
+                 'parent': ledger.parent, 'depth': ledger.depth, 'bal': ledger.bal, 'naccounts': ledger.naccounts}
+        for peer in self.network.all_peers:
+            dicts[f'blktime{peer.ID}'] = peer.localchain.blktime
+            dicts[f'blkqueue{peer.ID}'] = peer.blkqueue
+            if not isinstance(peer.txqueue, BloomFilter):
+                dicts[f'txqueue{peer.ID}'] = peer.txqueue
+        return dicts
+
+    def replayfrom(self, replay):
+        """
+        Goes on from a checkpoint of a recorded run by replaying its recording, from the event the
+        checkpoint was taken at (the replay's start, handled). Pending events are dropped since the
+        recording holds them, and every block and Tx the state holds is made known to the replay so
+        later recorded events find them.
+
+        Args:
+            replay (Replay): Replay of the recording.
+        """
+        pending = self.queue
+        self.queue = NullScheduler()
+        self.replay = replay
+        replay.now = self.now
+        blocks = list(self.network.store.blocks.values())
+        txs = list(self.UTX)
+        for peer in self.network.all_peers:
+            blocks.extend(peer.localchain.private_chain)
+        entry = pending.pop()
+        while entry is not None:
+            _, _, op, _, msg, extra = entry
+            if op == RECV_TX:
+                txs.append(msg)
+            elif msg is not None and op != GEN_TX:
+                blocks.append(msg)
+            if type(extra) is list:                             # Tx picked for a block being mined
+                txs.extend(extra)
+            entry = pending.pop()
+        for blk in blocks:
+            replay.register(blk)
+            txs.extend(blk.Txlist)
+        for tx in txs:
+            replay.register(tx)
+
+    def retime(self, Ttx, Tk):
+        """
+        Changes the mean Tx and block intervals of a resumed run. Times are memoryless, so pending
+        mining events are redrawn with the new mean and pending Tx keep theirs.
 
+        Args:
+            Ttx (float): Mean time between transaction generations.
+            Tk (float): Mean time between block generation attempts.
+        """
+        factor = None
+        for peer in self.network.all_peers:
+            factor = peer.blk_itr.mean / (Tk / peer.cpuspeed)
+            peer.txn_itr.mean = Ttx
+            peer.blk_itr.mean = Tk / peer.cpuspeed
+            if peer.race is None and peer.mining is not None:
+                peer.generateblk()
+        if self.network.race is not None:
+            self.network.race.rescale(factor, self.now)
 
 
 if __name__ == "__main__":
@@ -568,6 +877,34 @@ if __name__ == "__main__":
     parser.add_argument('C1',type=float, help='Mining power of attacker1')
     parser.add_argument('C2',type=float, help='Mining power of attacker2')
     parser.add_argument('N',type=int,help='Number of Blocks to create')
+    parser.add_argument('--bloom', type=int, default=None, help='Track seen Tx IDs in Bloom filters of this capacity per peer')
+    parser.add_argument('--seed', type=int, default=None, help='Seed for all random numbers of the run')
+    parser.add_argument('--export-links', default=None, help='Write the link delay tables to this .npz file')
+    parser.add_argument('--topology', default='random', choices=sorted(TOPOLOGIES), help='Network topology')
+    parser.add_argument('--scheduler', default='heap', choices=sorted(SCHEDULERS), help='Event queue backend')
+    parser.add_argument('--race', action='store_true', help='Draw the next block time once for the whole network')
+    parser.add_argument('--analytic-tx', action='store_true', help='Compute Tx arrival times instead of flooding Tx hop by hop')
+    parser.add_argument('--zipf', type=float, default=None, help='Pick Tx receivers with Zipf popularity of this exponent')
+    parser.add_argument('--trace', default=None, help='Record block and Tx events of the run to this binary trace file')
+    parser.add_argument('--record', default=None, help='Record every handled event to this file for --replay')
+    parser.add_argument('--replay', default=None, help='Replay a run recorded with --record instead of simulating it')
+    parser.add_argument('--until', type=float, default=None, help='Stop the replay at this simulated time')
+    parser.add_argument('--checkpoint', default=None, help='Write checkpoints of the run to this directory')
+    parser.add_argument('--checkpoint-every', type=float, default=None, help=f'Simulated time between checkpoints, defaults to {CHECKPOINT_BLOCKS} times Tk')
+    parser.add_argument('--resume', default=None, help='Go on from a checkpoint in this directory instead of starting over, with --replay replay the recording from there')
+    parser.add_argument('--resume-index', type=int, default=None, help='Checkpoint to resume from, defaults to the last one')
+    parser.add_argument('--reseed', type=int, default=None, help='Draw the rest of a resumed run from this seed')
+    parser.add_argument('--metrics', default=None, help='Write a time series of the run metrics to this file')
+    parser.add_argument('--metrics-every', type=float, default=None, help='Simulated time between rows of --metrics, defaults to Tk')
+    parser.add_argument('--confirmations', type=int, default=CONFIRMATIONS, help='Blocks deep a Tx must be for its confirmation latency')
+    parser.add_argument('--profile', action='store_true', help='Time every event type and peer handler and print a report at the end')
+    parser.add_argument('--profile-stacks', default=None, help='With --profile, also write collapsed stacks for flame graphs to this file')
+    parser.add_argument('--profile-every', type=float, default=None, help='Simulated time between samples of the queue size and event rate, defaults to Tk')
+    parser.add_argument('--shards', type=int, default=1, help='Split the peers into this many shards, each run by its own worker process')
+    parser.add_argument('--log-level', default='info', choices=sorted(LEVELS, key=LEVELS.get), help='Lowest level of log messages')
+    parser.add_argument('--log', default=None, help='Comma separated categories to log, out of ' + ','.join(CATEGORIES))
+    parser.add_argument('--log-ring', type=int, default=0, help='Keep the last N log records in memory and dump them on error')
+    parser.add_argument('--quiet', action='store_true', help='Write no log messages, only keep the ring buffer')
     args = parser.parse_args()
     arg1 = args.n   
     arg2 = args.Ttx
@@ -575,78 +912,129 @@ if __name__ == "__main__":
     arg4 = args.C1
     arg5 = args.C2
     N = args.N
-
-    tpq = TimedPriorityQueue()                  #creating a priority queue for maintaining events
-    network = Network(arg1,arg2,arg3,arg4,arg5) #creating a network of peers
-    network.visualizeNetwork()
-    print("Network created")
-
-    #1  ->genrate txn
-    #2  ->send txn
-    #3  ->genrate blk
-    #4  ->send blk
-    #5  ->check blockhash with longest chain before addding block
-    #6  ->updating block chain of a peer
-    #7  ->genrating new block for attacker add_block_attacker
-
-
-
-    count = 0                                   #count to stop simulation after genrating required number of blocks 
-    while tpq.heap:
-        ts, variable_list = tpq.pop()
-        if variable_list[1] == 1:
-            glob_time = ts
-            variable_list[0].generateTx(variable_list[2],glob_time)
-            random_number = random.choice([num for num in range(arg1) if num != variable_list[0].ID])
-            k=network.all_peers[random_number]
-            amount=random.randint(1,100)
-            tpq.push([variable_list[0],1,k,amount],glob_time+next(variable_list[0].txn_itr)) #genrating new txn after some time
-
-            # count +=1
-
-        if variable_list[1] == 2:
-            glob_time = ts
-            variable_list[0].UpdateTx(variable_list[2],glob_time)                            #updating transaction pool of sender and broadcasting transaction to all neighbors
-            # count +=1
-        
-        if variable_list[1] == 3:
-            glob_time = ts
-            variable_list[0].generateblk() #genrating new block
-            count +=1
-
-        if variable_list[1] == 4:
-            glob_time =ts
-            print(f"broadcasting block by {variable_list[0].name} at {glob_time} of msg {variable_list[2].blkid} to all neighbors")
-            variable_list[0].sendblock(variable_list[2],glob_time)                          #checking if it is already sent and broadcasting block to all neighbors
-
-        if variable_list[1] == 5:
-            glob_time = ts
-            variable_list[0].checkadd(variable_list[2],variable_list[3])                    #checking if block is valid and adding it to local chain and broadcasting it to all neighbors
-            count +=1
-        
-        if variable_list[1] == 6:
-            glob_time = ts
-            variable_list[0].UpdateChain(variable_list[2],glob_time)                         #updating local chain of a peer and broadcasting block to all neighbors
-            print(f"block recieved at {variable_list[0].name} ")
-            # count +=1
-        if variable_list[1] == 7:
-            glob_time = ts
-            variable_list[0].add_block_attacker(variable_list[2])
-
-            
-        
-        if count == N:                                             #stopping simulation after genrating certain no of blocks
-            break
-    
-    while tpq.heap:
-        ts, variable_list = tpq.pop()
-        if variable_list[1] == 4:
-            glob_time =ts
-            print(f"broadcasting block by {variable_list[0].name} at {glob_time} of msg {variable_list[2].blkid} to all neighbors")
-            variable_list[0].sendblock(variable_list[2],glob_time)  
-        if variable_list[1] == 6:
-            glob_time = ts
-            variable_list[0].UpdateChain(variable_list[2],glob_time)
+    log.configure(LEVELS[args.log_level], args.log.split(',') if args.log else None,
+                  None if args.quiet else sys.stdout, args.log_ring)
+
+    if args.replay:
+        recorded = Replay.args(args.replay)
+        args.seed = recorded['seed']                                #a run without --seed is replayed with the entropy it drew
+        wrong = [k for k in REPLAY_ARGS if recorded[k] != getattr(args, k)]
+        if wrong:
+            parser.error(f"{args.replay} was recorded with other {', '.join(wrong)}: " + ' '.join(f'{k}={recorded[k]}' for k in wrong))
+    if args.replay and args.checkpoint:
+        parser.error('--checkpoint cannot be combined with --replay')
+    if args.shards > 1 and (args.trace or args.record or args.replay or args.checkpoint or args.resume or args.metrics or args.profile):
+        parser.error('--shards cannot be combined with --trace, --record, --replay, --checkpoint, --resume, --metrics or --profile')
+    if args.profile_stacks and not args.profile:
+        parser.error('--profile-stacks needs --profile')
+    if args.resume:
+        if args.record:
+            parser.error('--resume cannot be combined with --record')
+        if args.replay and args.reseed is not None:
+            parser.error('--reseed cannot be combined with --replay')
+        try:
+            state, base = Checkpointer.restore(args.resume, args.resume_index, Peer)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        saved = state['args']
+        wrong = [k for k in (REPLAY_ARGS if args.replay else CHECKPOINT_ARGS) if saved[k] != getattr(args, k)]
+        if wrong:
+            parser.error(f"{args.resume} was checkpointed with other {', '.join(wrong)}: " + ' '.join(f'{k}={saved[k]}' for k in wrong))
+    if args.resume:
+        sim = state['sim']
+        network = sim.network
+        if args.reseed is not None:
+            sim.rng.reseed(args.reseed)
+        if args.confirmations != sim.metrics.confirmations.k:
+            parser.error(f'{args.resume} was measured with --confirmations {sim.metrics.confirmations.k}')
+        if (args.Ttx, args.Tk) != (saved['Ttx'], saved['Tk']):
+            sim.retime(args.Ttx, args.Tk)
+        sim.N = N
+        print(f"Resumed from checkpoint {base['index']} at time {sim.at} after {sim.done} of {N} mining events (seed {sim.rng.seed})")
+    elif args.shards > 1:
+        sim = ParallelSimulation(P2PSimulation,Transaction,args.shards,arg1,arg2,arg3,arg4,arg5,N,args.bloom,args.seed,args.topology,args.zipf,args.race,args.analytic_tx,args.scheduler)
+        network = sim.network
+        network.visualizeNetwork()
+        if args.export_links:
+            network.link.save(args.export_links)
+        print(f"Network created (seed {network.rng.seed}), {args.shards} shards with lookahead {sim.lookahead:.2f} or more")
+    else:
+        tpq = SCHEDULERS[args.scheduler]() if not args.replay else NullScheduler()    #creating a priority queue for maintaining events
+        sim = P2PSimulation(arg1,arg2,arg3,arg4,arg5,N,args.bloom,args.seed,args.topology,args.zipf,args.race,args.analytic_tx,tpq) #creating a network of peers
+        network = sim.network
+        network.visualizeNetwork()
+        if args.export_links:
+            network.link.save(args.export_links)
+        print(f"Network created (seed {network.rng.seed})")
+    sim.metrics.confirmations.k = args.confirmations
+    ckpt = None
+    if args.checkpoint:
+        try:
+            ckpt = Checkpointer(args.checkpoint, Transaction, {'link': network.link, 'adj': network.adj}, base if args.resume else None)
+        except ValueError as e:
+            parser.error(str(e))
+    if args.trace:
+        sim.trace = TraceWriter(args.trace)
+    if args.metrics:
+        sim.metrics.sample(args.metrics, args.metrics_every or args.Tk, sim.now)
+        sim.clock = sim.metrics.clock
+    profiler = None
+    if args.profile:
+        targets = [(Peer, name) for name in PROFILED] + [(Blockchain, 'AddBlock'), (Mempool, 'select'), (type(sim.queue), 'push'),
+                                                         (type(sim.queue), 'pop'), (TraceWriter, 'flush'), (Checkpointer, 'save')]
+        profiler = Profiler(sim, targets, args.profile_every or args.Tk)
+    recorder = None
+    if args.record:
+        recorder = Recorder(args.record, dict(vars(args), seed=int(network.rng.seed)))
+        sim.record = recorder
+    try:
+        if profiler is not None:
+            profiler.start()
+        if args.replay:
+            handlers = sim.handlers if profiler is None else profiler.handlers(sim.handlers)
+            replay = Replay(args.replay, network.all_peers, dict(enumerate(handlers)), sim.tick, sim.handled)
+            if args.resume:
+                sim.replayfrom(replay)                          #going on from the event the checkpoint was taken at
+            else:
+                sim.replay = replay
+            done = sim.replay.run(until=args.until)
+            print(f"Replayed {done} events up to time {sim.replay.now}")
+        elif args.shards > 1:
+            sim.run()
+            print(f"Parallel run : {sim.rounds} rounds, {sim.messages} message frames ({sim.nbytes / 1e6:.2f} MB) between shards")
+            print(f"Shard CPU    : {sim.cpu:.2f} s in all, {sim.critical:.2f} s on the busiest shard of each round (speedup {sim.cpu / max(sim.critical, 1e-9):.2f}x with a core per shard)")
+        else:
+            every = args.checkpoint_every or CHECKPOINT_BLOCKS * args.Tk
+            sim.run(ckpt=ckpt, every=every, args=dict(vars(args), seed=int(network.rng.seed)))
+    except Exception:
+        log.dump()                                              #last events before the error
+        raise
+    finally:
+        if profiler is not None:
+            profiler.stop()
+        if args.trace:
+            sim.trace.close()
+        if args.metrics:
+            sim.metrics.close(sim.now)
+        if recorder is not None:
+            recorder.close()
+    qs = sim.queuestats() if args.shards > 1 else sim.queue.stats()
+    print(f"Event queue : {qs['live']} live, {qs['dead']} cancelled ({qs['deadfrac']:.1%} dead), {qs['pushed']} pushed and {qs['cancelled']} cancelled in total, peak size {qs['peak']}")
+    # attacker results, counted as the run went
+    m = sim.metrics.snapshot()
+    print(f"Main chain : {m['mainchain']} of {m['blocks']} public blocks ({m['orphan']:.1%} orphaned), {m['forks']} forks, "
+          f"{m['reorgs']} reorgs dropping {m['dropped']} blocks (deepest {m['maxreorg']})")
+    for i in ATTACKERS:
+        if f'main{i}' in m:
+            print(f"Attacker {i + 1} : {m[f'main{i}']} of {m[f'mined{i}']} mined blocks in the main chain, "
+                  f"revenue share {m[f'share{i}']:.3f}, MPU {m[f'mpu{i}']:.3f}, lead {m[f'lead{i}']}")
+    sim.metrics.propagation.report()
+    sim.metrics.confirmations.report(sim.ntx)
+    if profiler is not None:
+        profiler.report()
+        if args.profile_stacks:
+            profiler.collapsed(args.profile_stacks)
+            print(f"Collapsed stacks written to {args.profile_stacks}")
 
     # checks if folder exists or not
     if not os.path.exists('Trees'):
@@ -655,37 +1043,14 @@ if __name__ == "__main__":
     for i in range(network.n):
         tree = Tree(network.all_peers[i].localchain,f'Trees/Node_{i}.txt')
         tree.Print()
+    # memory held by the balance ledger shared by all peers
+    stored = network.store.ledger.entries()
+    fullcopy = sum(network.store.ledger.naccounts[b] for p in network.all_peers for b in p.localchain.blktime)
+    nbytes = network.store.ledger.nbytes()
+    print(f"Ledger balances stored : {stored} ({nbytes / 1e6:.2f} MB), with a full copy per block : {fullcopy}")
     # checks if folder exists or not
     if not os.path.exists('Blockchain_Trees'):
         os.makedirs('Blockchain_Trees')
     # writing blockchain into picture
     for i in range(network.n):                                       #visualizing blockchain of each peer
         network.all_peers[i].localchain.visualize_blockchain(f'Blockchain_Trees/blockchain_{i}')
-
-    # num_attacker_1 = 0
-    # tot_attacker_1 = network.all_peers[0].tot_mining                # Total num of blocks mined by attacker 1
-    # num_attacker_2 = 0
-    # tot_attacker_2 = network.all_peers[1].tot_mining                # Total num of blocks mined by attacker 2
-    # for blk in network.all_peers[3].localchain.longchain[1:]:
-    #     # Finding number of blocks by attackers in main chain
-    #     if blk.miner.ID == 0:
-    #         num_attacker_1 = num_attacker_1 + 1
-    #     elif blk.miner.ID == 1:
-    #         num_attacker_2 = num_attacker_2 + 1
-    # num_overall = len(network.all_peers[0].localchain.longchain)
-    # tot_overall = len(network.all_peers[0].localchain.chain)
-    # print("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
-    # print("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
-    # print("Number of blocks mined by attacker 1 in final public main chain : " + str(num_attacker_1))
-    # print("Total number of blocks mined by attacker 1 overall : " + str(tot_attacker_1))
-    # print("Number of blocks mined by attacker 2 in final public main chain : " + str(num_attacker_2))
-    # print("Total number of blocks mined by attacker 2 overall : " + str(tot_attacker_2))
-    # print("Number of block in the final public main chain : " + str(num_overall))
-    # print("Total number of blocks generated across all the nodes : " + str(tot_overall))
-    # print("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
-    # print("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
-    # print("MPU_node_attacker1 : " + str(num_attacker_1/tot_attacker_1))
-    # print("MPU_node_attacker2 : " + str(num_attacker_2/tot_attacker_2))
-    # print("MPU_node_overall : " + str(num_overall/tot_overall))
-    # print("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
-    # print("xxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxxx")
\ No newline at end of file
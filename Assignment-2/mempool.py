@@ -0,0 +1,155 @@
+import bisect
+import heapq
+from operator import itemgetter
+
+BYTIME = itemgetter(1)     # timestamp of a (amount, timestamp, Tx ID, Tx) entry
+SPARSE = 8                 # sort the Tx a sender can pay when they are fewer than 1 in this many of its Tx
+
+
+class Mempool:
+    """
+    Pool of unspent transactions shared by all peers.
+    Transactions are indexed by Tx ID for O(1) insert and remove, and by sender so a block
+    template only looks at the transactions of senders that can still pay. Each sender's
+    transactions are kept in timestamp order and also sorted by amount, so a block template
+    can tell how many of them the sender can pay without looking at them.
+
+    Attributes:
+        txs (dict): Mapping of Tx IDs to transactions.
+        bysender (dict): Mapping of sender IDs to their transactions keyed by Tx ID, in timestamp order.
+        byamount (dict): Mapping of sender IDs to their transactions as a list of (amount, timestamp, Tx ID, Tx), sorted.
+        unsorted (set): Senders whose bysender entry lost timestamp order, sorted again when next used.
+    """
+
+    def __init__(self):
+        """
+        Initializes an empty pool.
+        """
+        self.txs = {}
+        self.bysender = {}
+        self.byamount = {}
+        self.unsorted = set()
+
+    def __len__(self):
+        return len(self.txs)
+
+    def __contains__(self, tx):
+        return tx.txid in self.txs
+
+    def __iter__(self):
+        return iter(self.txs.values())
+
+    def add(self, tx):
+        """
+        Adds a transaction if it is not already in the pool.
+
+        Args:
+            tx (Transaction): Transaction to add.
+
+        Returns:
+            bool: True if the transaction was added.
+        """
+        if tx.txid in self.txs:
+            return False
+        self.txs[tx.txid] = tx
+        sender = tx.sender.ID
+        sent = self.bysender.get(sender)
+        if sent is None:
+            sent = self.bysender[sender] = {}
+            self.byamount[sender] = []
+        elif sender not in self.unsorted and tx.timestamp < sent[next(reversed(sent))].timestamp:
+            self.unsorted.add(sender)                   # put back after newer ones, e.g. from a dropped block
+        sent[tx.txid] = tx
+        bisect.insort(self.byamount[sender], (tx.amount, tx.timestamp, tx.txid, tx))
+        return True
+
+    def update(self, txlist):
+        """
+        Adds a list of transactions, e.g. the ones of a block that was not added to the chain.
+
+        Args:
+            txlist (list): Transactions to add.
+        """
+        for tx in txlist:
+            self.add(tx)
+
+    def remove(self, tx):
+        """
+        Removes a transaction from the pool.
+
+        Args:
+            tx (Transaction): Transaction to remove.
+        """
+        if self.txs.pop(tx.txid, None) is None:
+            return
+        sender = tx.sender.ID
+        sent = self.bysender[sender]
+        del sent[tx.txid]
+        if not sent:
+            del self.bysender[sender], self.byamount[sender]
+            self.unsorted.discard(sender)
+            return
+        amounts = self.byamount[sender]
+        del amounts[bisect.bisect_left(amounts, (tx.amount, tx.timestamp, tx.txid))]
+
+    def intime(self, sender):
+        """
+        Transactions of a sender in timestamp order.
+
+        Args:
+            sender (int): Sender ID.
+
+        Returns:
+            dict: Its transactions keyed by Tx ID.
+        """
+        if sender in self.unsorted:
+            self.unsorted.remove(sender)
+            sent = self.bysender[sender]
+            self.bysender[sender] = dict(sorted(sent.items(), key=lambda kv: kv[1].timestamp))
+        return self.bysender[sender]
+
+    def select(self, bal, limit, blktimestamp, peer=None, now=None):
+        """
+        Picks up to limit transactions that can all go in one block, oldest first.
+        Each sender's transactions are taken in timestamp order while the sender's balance covers them.
+        Senders who cannot pay their smallest transaction are skipped without looking at them, and
+        when only a few of a sender's transactions are within its balance just those are sorted and
+        looked at, so transactions no one can pay cost nothing however many of them pile up.
+        Coins received inside the same block are not spent, so any order of the result is valid.
+        Transactions with arrival times (analytic propagation) are skipped until they reach the peer.
+
+        Args:
+            bal: Balances at the parent block, indexable by peer ID (e.g. a BalanceView).
+            limit (int): Maximum number of transactions.
+            blktimestamp (float): Only transactions created before this time are picked.
+            peer (int, optional): ID of the peer building the block. Defaults to None.
+            now (float, optional): Current simulation time. Defaults to None.
+
+        Returns:
+            list: Selected transactions sorted by timestamp.
+        """
+        picked = []
+        for sender, amounts in self.byamount.items():
+            left = bal[sender]
+            least = amounts[0][0]
+            if left < least:                            # cannot pay even the smallest one
+                continue
+            fits = bisect.bisect_right(amounts, (left, float('inf')))
+            if fits * SPARSE < len(amounts):            # larger Tx never fit, left only goes down
+                order = map(itemgetter(3), sorted(amounts[:fits], key=BYTIME))
+            else:
+                order = self.intime(sender).values()
+            taken = 0
+            for tx in order:
+                if tx.amount <= left and tx.timestamp <= blktimestamp:
+                    if tx.arrival is not None and tx.born + tx.arrival[peer] > now:     # not at this peer yet
+                        continue
+                    picked.append(tx)
+                    left -= tx.amount
+                    taken += 1
+                    if left < least or taken == limit:
+                        break
+        if len(picked) > limit:
+            return heapq.nsmallest(limit, picked, key=lambda tx: tx.timestamp)
+        picked.sort(key=lambda tx: tx.timestamp)
+        return picked
@@ -0,0 +1,535 @@
+import math
+import sys
+import numpy as np
+from evtrace import TraceWriter
+
+ATTACKERS = (0, 1)      # IDs of the selfish miners
+OBSERVER = 2            # first honest peer, the main chain is the one it sees
+LOWEST = 1e-3           # upper edge of the first histogram bucket, everything below falls in it
+GROWTH = 2 ** 0.125     # ratio of consecutive bucket edges, quantiles are within 9% of the true value
+NBUCKETS = 256          # buckets of a histogram, the last one ends at LOWEST * GROWTH ** 255, about 4e6
+LEVELS = (0.5, 0.9, 1.0)    # fractions of the peers a block's propagation time is measured to
+SIZES = ((1, '1KB'), (10, '<=10KB'), (100, '<=100KB'), (1000, '<=1MB'))  # block size classes, upper bound in KB and label
+CONFIRMATIONS = 6       # a Tx is confirmed once its block and the ones after it in the main chain number this many
+# Row of the time series, one per sample time
+SAMPLE = np.dtype([
+    ('time', np.float64),
+    ('blocks', np.int32),       # blocks made public so far, genesis not counted
+    ('mainchain', np.int32),    # blocks in the observer's main chain, genesis not counted
+    ('forks', np.int32),        # public blocks whose parent already had a child
+    ('orphan', np.float32),     # fraction of public blocks off the main chain
+    ('reorgs', np.int32),       # tip switches to another branch, summed over all peers
+    ('maxreorg', np.int32),     # most blocks a peer dropped from its main chain at once
+    ('lead0', np.int32),        # blocks attacker 1 holds back
+    ('lead1', np.int32),
+    ('share0', np.float32),     # attacker 1 fraction of main chain blocks
+    ('share1', np.float32),
+])
+
+
+def ratio(a, b):
+    return a / b if b else float('nan')
+
+
+def sizeclass(blk):
+    size = len(blk.Txlist) + 1                          # KB, a Tx takes 1KB and so does the empty block
+    return next((i for i, (kb, _) in enumerate(SIZES) if size <= kb), len(SIZES) - 1)
+
+
+class Histogram:
+    """
+    Distribution of positive values in fixed, geometrically growing buckets, so it takes the same
+    memory however many values are added and two histograms merge by adding their counts.
+
+    Attributes:
+        counts (list): Values in every bucket.
+        n (int): Values added.
+        total (float): Sum of the values.
+        lo (float): Smallest value added.
+        hi (float): Largest value added.
+    """
+
+    def __init__(self):
+        self.counts = [0] * NBUCKETS
+        self.n = 0
+        self.total = 0.0
+        self.lo = math.inf
+        self.hi = -math.inf
+
+    def add(self, x):
+        """
+        Adds one value.
+
+        Args:
+            x (float): The value.
+        """
+        self.n += 1
+        self.total += x
+        if x < self.lo:
+            self.lo = x
+        if x > self.hi:
+            self.hi = x
+        i = 0 if x <= LOWEST else min(math.ceil(math.log(x / LOWEST, GROWTH)), NBUCKETS - 1)
+        self.counts[i] += 1
+
+    def remove(self, x):
+        """
+        Takes back a value added before. lo and hi stay as they were, they are bounds from then on.
+
+        Args:
+            x (float): The value, exactly as it was added.
+        """
+        self.n -= 1
+        self.total -= x
+        i = 0 if x <= LOWEST else min(math.ceil(math.log(x / LOWEST, GROWTH)), NBUCKETS - 1)
+        self.counts[i] -= 1
+
+    def merge(self, other):
+        """
+        Adds the values of another histogram.
+
+        Args:
+            other (Histogram): The other histogram.
+        """
+        self.counts = [a + b for a, b in zip(self.counts, other.counts)]
+        self.n += other.n
+        self.total += other.total
+        self.lo = min(self.lo, other.lo)
+        self.hi = max(self.hi, other.hi)
+
+    def quantile(self, q):
+        """
+        Value below which a fraction q of the values lie, the upper edge of its bucket.
+
+        Args:
+            q (float): Fraction, 0 to 1.
+
+        Returns:
+            float: The quantile, NaN when the histogram is empty.
+        """
+        if not self.n:
+            return float('nan')
+        rank = max(1, math.ceil(q * self.n))
+        seen = 0
+        for i, c in enumerate(self.counts):
+            seen += c
+            if seen >= rank:
+                return min(max(LOWEST * GROWTH ** i, self.lo), self.hi)
+        return self.hi
+
+    def mean(self):
+        return ratio(self.total, self.n)
+
+
+class Propagation:
+    """
+    Time blocks take to reach 50%, 90% and all of the peers, over all peers, fast and slow peers
+    apart, and by block size. A block is followed from the time it becomes public by counting the
+    peers that add it. Each time a count reaches a level its delay goes into the histogram of that
+    level, and once every peer has the block it is forgotten. Only blocks still on their way take
+    memory of their own, the histograms are fixed in size.
+
+    Attributes:
+        n (list): Number of peers in all, fast and slow.
+        need (list): Peers a block must reach for every level, in all, fast and slow.
+        pending (dict): Blocks on their way, by block ID, as [time made public, size class, peers reached in all, fast and slow].
+        hists (dict): Histograms of the delay to every level, by group ('all', 'fast', 'slow' and the size labels).
+        complete (int): Blocks that reached every peer.
+    """
+
+    def __init__(self, peers):
+        """
+        Starts with no blocks.
+
+        Args:
+            peers (list): All peers, their is_slow attribute sets their group.
+        """
+        slow = sum(1 for p in peers if p.is_slow)
+        self.n = [len(peers), len(peers) - slow, slow]
+        self.need = [[max(1, math.ceil(level * m)) if m else None for level in LEVELS] for m in self.n]
+        self.pending = {}
+        self.hists = {g: [Histogram() for _ in LEVELS] for g in ('all', 'fast', 'slow') + tuple(l for _, l in SIZES)}
+        self.complete = 0
+
+    def made(self, blk, t):
+        """
+        Starts following a block that just became public, its miner has it at once.
+
+        Args:
+            blk (Block): The block, already added to the chain of its miner.
+            t (float): Time it became public.
+        """
+        self.pending[blk.blkid] = [t, sizeclass(blk), 0, 0, 0]
+        self.arrived(blk.miner, blk, t)
+
+    def arrived(self, peer, blk, t):
+        """
+        Counts a peer adding a block to its chain.
+
+        Args:
+            peer (Peer): The peer.
+            blk (Block): The block.
+            t (float): Time it was added.
+        """
+        p = self.pending.get(blk.blkid)
+        if p is None:
+            return
+        d = t - p[0]
+        self.count(p, 0, d, self.hists['all'], self.hists[SIZES[p[1]][1]])
+        g = 2 if peer.is_slow else 1
+        self.count(p, g, d, self.hists['slow' if g == 2 else 'fast'], None)
+        if p[2] == self.n[0]:
+            del self.pending[blk.blkid]
+            self.complete += 1
+
+    def count(self, p, g, d, hists, sized):
+        p[2 + g] += 1
+        c = p[2 + g]
+        for i, k in enumerate(self.need[g]):
+            if c == k:
+                hists[i].add(d)
+                if sized is not None:
+                    sized[i].add(d)
+
+    def rebuild(self, peers, blocks):
+        """
+        Follows every block again from the arrival times of all peers, for chains that were filled in
+        without reporting arrivals, e.g. merged from the shards of a parallel run.
+
+        Args:
+            peers (list): All peers.
+            blocks (dict): Every public block, genesis first.
+        """
+        self.__init__(peers)
+        for blk in list(blocks.values())[1:]:
+            got = sorted((p.localchain.blktime[blk.blkid], p.ID) for p in peers if blk.blkid in p.localchain.blktime)
+            if not got:
+                continue
+            self.pending[blk.blkid] = [got[0][0], sizeclass(blk), 0, 0, 0]
+            for t, pid in got:
+                self.arrived(peers[pid], blk, t)
+
+    def report(self, out=sys.stdout):
+        """
+        Writes the median and 90th percentile over blocks of the time to reach every level, for every group.
+
+        Args:
+            out (file, optional): Where to write. Defaults to sys.stdout.
+        """
+        out.write('Block propagation : time to reach ' + ' / '.join(f'{level:.0%}' for level in LEVELS)
+                  + ' of the peers, median (90th percentile) over blocks\n')
+        for g, hs in self.hists.items():
+            if not hs[0].n:
+                continue
+            out.write(f'  {g:<8} {hs[0].n:>6} blocks' + ''.join(f'  {h.quantile(0.5):>9.2f} ({h.quantile(0.9):.2f})' for h in hs) + '\n')
+        if self.pending:
+            out.write(f'  {len(self.pending)} blocks have not reached every peer\n')
+
+
+class Confirmations:
+    """
+    Latency of Tx from creation to inclusion, the block holding them joining the observer's main
+    chain, and to confirmation, that block being k deep. Both are measured when the block gets k
+    deep, once an inclusion is unlikely to be undone, and go into fixed size histograms. A reorg
+    that drops a block already k deep takes its Tx back out of the histograms, they are measured
+    again when a block holding them gets k deep on the new branch. Only main chain blocks are kept,
+    nothing per Tx, so millions of Tx cost no more memory than a few.
+
+    Attributes:
+        k (int): Blocks from the one holding a Tx to the tip, both counted, for the Tx to be confirmed.
+        chain (list): [block, time it joined the main chain, time it got k deep or None] of every
+            main chain block, by depth, genesis first.
+        included (Histogram): Time from creation to inclusion of the confirmed Tx.
+        confirmed (Histogram): Time from creation to confirmation.
+        undone (int): Confirmations a reorg took back.
+    """
+
+    def __init__(self, genesis, k=CONFIRMATIONS):
+        """
+        Starts with a main chain of only the genesis block.
+
+        Args:
+            genesis (Block): The genesis block.
+            k (int, optional): Confirmation depth. Defaults to CONFIRMATIONS.
+        """
+        self.k = k
+        self.chain = [[genesis, 0.0, 0.0]]
+        self.included = Histogram()
+        self.confirmed = Histogram()
+        self.undone = 0
+
+    def extend(self, blk, t):
+        """
+        Appends a block to the main chain, the block k deep from the new tip gets confirmed.
+
+        Args:
+            blk (Block): Child of the tip.
+            t (float): Time it joined the main chain.
+        """
+        self.chain.append([blk, t, None])
+        i = len(self.chain) - self.k
+        if i >= 1 and self.chain[i][2] is None:         # a reorg may bring back a depth whose block is confirmed
+            entry = self.chain[i]
+            entry[2] = t
+            for tx in entry[0].Txlist:
+                self.included.add(entry[1] - tx.born)
+                self.confirmed.add(t - tx.born)
+
+    def reorg(self, fork, gained, t):
+        """
+        Switches the main chain to another branch.
+
+        Args:
+            fork (int): Depth of the last block both branches share.
+            gained (list): Blocks of the new branch after it, in chain order.
+            t (float): Time of the switch.
+        """
+        for blk, joined, deep in self.chain[fork:]:
+            if deep is None:
+                continue
+            for tx in blk.Txlist:
+                self.included.remove(joined - tx.born)
+                self.confirmed.remove(deep - tx.born)
+            self.undone += len(blk.Txlist)
+        del self.chain[fork:]
+        for blk in gained:
+            self.extend(blk, t)
+
+    def rebuild(self, chain):
+        """
+        Follows the main chain again from the observer's arrival times, for a chain that was filled
+        in without reporting its tip moves, e.g. merged from the shards of a parallel run. A block is
+        taken to have joined the main chain when it arrived, which is exact for a run without reorgs.
+
+        Args:
+            chain (Blockchain): Chain of the observer.
+        """
+        self.__init__(chain.genesisblk, self.k)
+        t = 0.0
+        for blk in chain.longchain[1:]:
+            t = max(t, chain.blktime[blk.blkid])
+            self.extend(blk, t)
+
+    def report(self, ntx, out=sys.stdout):
+        """
+        Writes the median and 90th percentile of both latencies.
+
+        Args:
+            ntx (int): Tx made in the run.
+            out (file, optional): Where to write. Defaults to sys.stdout.
+        """
+        inc, conf = self.included, self.confirmed
+        out.write(f'Tx confirmation : {conf.n} of {ntx} Tx {self.k} deep, from creation to inclusion '
+                  f'{inc.quantile(0.5):.2f} ({inc.quantile(0.9):.2f}), to {self.k} deep {conf.quantile(0.5):.2f} '
+                  f'({conf.quantile(0.9):.2f}), median (90th percentile)' + (f', {self.undone} undone by reorgs' if self.undone else '') + '\n')
+
+
+class Metrics:
+    """
+    Run metrics kept up to date as blocks enter the network and tips move, so they can be read
+    at any simulated time without walking the block tree. The store reports every block that
+    becomes public and every chain reports its tip moves: extending the tip costs a counter update,
+    a reorg walks only the blocks it drops and adds. Block propagation is followed by a Propagation,
+    told of new blocks here and of arrivals by Peer.UpdateChain, and Tx confirmation latency by
+    a Confirmations, told of the observer's tip moves here.
+    Optionally writes a time series of the counters every so often to a file in the layout of
+    SAMPLE, read back with evtrace.TraceReader(path, dtype=SAMPLE).
+
+    Attributes:
+        sim (P2PSimulation): The run measured, for its clock.
+        network (Network): The network measured.
+        observer (Peer): Peer whose main chain the revenue shares are counted on.
+        blocks (int): Blocks made public so far, genesis not counted.
+        forks (int): Public blocks whose parent already had a child.
+        public (list): Public blocks of every peer, by ID.
+        main (list): Blocks of every peer in the observer's main chain, by ID.
+        reorgs (int): Tip switches to another branch, summed over all peers.
+        dropped (int): Blocks dropped from main chains by all reorgs.
+        depths (dict): Number of reorgs by the blocks they dropped.
+        propagation (Propagation): Time blocks take to reach the peers.
+        confirmations (Confirmations): Time Tx take to be included and confirmed in the observer's main chain.
+        every (float): Simulated time between samples, None for no time series.
+        next (float): Time of the next sample.
+        writer (TraceWriter): Time series file.
+    """
+
+    def __init__(self, sim, observer=OBSERVER):
+        """
+        Starts counting on a network that holds only the genesis block.
+
+        Args:
+            sim (P2PSimulation): The run to measure, its network already built.
+            observer (int, optional): ID of the peer whose main chain is counted, the last peer if there are fewer. Defaults to OBSERVER.
+        """
+        self.sim = sim
+        self.network = network = sim.network
+        self.observer = network.all_peers[min(observer, network.n - 1)]
+        self.blocks = 0
+        self.forks = 0
+        self.public = [0] * network.n
+        self.main = [0] * network.n
+        self.reorgs = 0
+        self.dropped = 0
+        self.depths = {}
+        self.propagation = Propagation(network.all_peers)
+        self.confirmations = Confirmations(network.store.genesisblk)
+        self.every = None
+        self.next = None
+        self.writer = None
+        network.store.watch = self.added
+        for peer in network.all_peers:
+            peer.localchain.watch = self.moved
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        state['writer'] = None                              # open file of this process, whoever resumes the run sets its own
+        return state
+
+    def added(self, blk):
+        """
+        Counts a block that just became public.
+
+        Args:
+            blk (Block): Block added to the store.
+        """
+        self.blocks += 1
+        self.public[blk.miner.ID] += 1
+        if len(self.network.store.blkchild[blk.plink]) > 1:
+            self.forks += 1
+        self.propagation.made(blk, self.sim.now)
+
+    def moved(self, chain, old, new):
+        """
+        Counts a tip move of a peer, a reorg if the new tip is not a child of the old one.
+
+        Args:
+            chain (Blockchain): Chain of the peer.
+            old (Block): Old tip.
+            new (Block): New tip.
+        """
+        observed = chain is self.observer.localchain
+        if new.plink == old.blkid:
+            if observed:
+                self.main[new.miner.ID] += 1
+                self.confirmations.extend(new, self.sim.now)
+            return
+        blocks = chain.store.blocks
+        depth = chain.store.blkdata
+        a, b = old, new
+        gained = []
+        while depth[b.blkid] > depth[a.blkid]:              # the new tip is never shallower than the old one
+            gained.append(b)
+            b = blocks[b.plink]
+        lost = []
+        while a is not b:                                   # same depth now, walk both up to the fork point
+            lost.append(a)
+            gained.append(b)
+            a = blocks[a.plink]
+            b = blocks[b.plink]
+        self.reorgs += 1
+        self.dropped += len(lost)
+        self.depths[len(lost)] = self.depths.get(len(lost), 0) + 1
+        if observed:
+            for blk in lost:
+                self.main[blk.miner.ID] -= 1
+            for blk in gained:
+                self.main[blk.miner.ID] += 1
+            gained.reverse()
+            self.confirmations.reorg(depth[a.blkid], gained, self.sim.now)
+
+    def resync(self):
+        """
+        Counts the observer's main chain again from its tip and follows its Tx confirmations again,
+        after chains were replaced without reporting their moves, e.g. merged from the shards of a parallel run.
+        """
+        self.main = [0] * self.network.n
+        for blk in self.observer.localchain.longchain[1:]:
+            self.main[blk.miner.ID] += 1
+        self.confirmations.rebuild(self.observer.localchain)
+
+    def lead(self, peer):
+        """
+        Blocks an attacker holds back over the longest chain it sees.
+
+        Args:
+            peer (Peer): The attacker.
+
+        Returns:
+            int: Length of its private chain past the longest visible one, 0 when it has none.
+        """
+        lc = peer.localchain
+        depth = lc.store.blkdata
+        return max(0, depth[lc.lastplink] + len(lc.private_chain) - depth[lc.tip.blkid])
+
+    def mainchain(self):
+        return self.observer.localchain.store.blkdata[self.observer.localchain.tip.blkid] - 1
+
+    def snapshot(self):
+        """
+        All counters as of now.
+
+        Returns:
+            dict: Public blocks, main chain length, forks, orphan rate, reorgs with the blocks they dropped
+            and the deepest one, Tx confirmed and confirmations undone, and per attacker its lead, blocks mined, blocks in the main chain,
+            revenue share and fraction of its blocks in the main chain.
+        """
+        main = self.mainchain()
+        snap = {'blocks': self.blocks, 'mainchain': main, 'forks': self.forks,
+                'orphan': ratio(self.blocks - main, self.blocks), 'reorgs': self.reorgs,
+                'dropped': self.dropped, 'maxreorg': max(self.depths, default=0),
+                'confirmed': self.confirmations.confirmed.n, 'undone': self.confirmations.undone}
+        for i in ATTACKERS:
+            if i >= self.network.n:
+                continue
+            peer = self.network.all_peers[i]
+            snap.update({f'lead{i}': self.lead(peer), f'mined{i}': peer.tot_mining, f'main{i}': self.main[i],
+                         f'share{i}': ratio(self.main[i], main), f'mpu{i}': ratio(self.main[i], peer.tot_mining)})
+        return snap
+
+    def sample(self, path, every, start=0.0):
+        """
+        Starts writing the time series, one row every so often.
+        Rows are written by clock(), which the simulation calls before every event.
+
+        Args:
+            path (str): Time series file, overwritten if it exists.
+            every (float): Simulated time between rows.
+            start (float, optional): Time of the first row. Defaults to 0.0.
+        """
+        self.writer = TraceWriter(path, dtype=SAMPLE)
+        self.every = every
+        self.next = start
+
+    def clock(self, ts):
+        """
+        Writes the rows due before an event at ts, the counters have not changed since the last event.
+
+        Args:
+            ts (float): Time of the event about to be handled.
+        """
+        while ts > self.next:
+            self.row(self.next)
+            self.next += self.every
+
+    def row(self, t):
+        main = self.mainchain()
+        peers = self.network.all_peers
+        leads = [self.lead(peers[i]) if i < len(peers) else 0 for i in ATTACKERS]
+        shares = [ratio(self.main[i], main) if i < len(peers) else 0.0 for i in ATTACKERS]
+        self.writer.append((t, self.blocks, main, self.forks, ratio(self.blocks - main, self.blocks), self.reorgs,
+                            max(self.depths, default=0), leads[0], leads[1], shares[0], shares[1]))
+
+    def close(self, now):
+        """
+        Writes the rows due up to the end of the run and closes the time series.
+
+        Args:
+            now (float): Time the run ended at.
+        """
+        if self.writer is None:
+            return
+        while self.next <= now:
+            self.row(self.next)
+            self.next += self.every
+        self.writer.close()
+        self.writer = None
@@ -0,0 +1,824 @@
+import heapq
+import io
+import math
+import pickle
+import time
+import traceback
+import zlib
+import multiprocessing as mp
+from collections import deque
+import numpy as np
+from blockchain import Block
+from bloom import BloomFilter
+from mempool import Mempool
+from simulation import Simulation, SCHEDULERS, GEN_TX, RECV_TX, START_MINING, SEND_BLK, MINED_BLK, RECV_BLK
+
+SET_BALANCE = 0     # not an event: new balance of the receiver of a Tx made in another shard
+COMPRESSION = 1     # zlib level of the frames between shards, the fastest takes about a third off
+
+
+def partition(adj, k):
+    """
+    Splits the peers into k shards of equal size along a breadth first order of the graph,
+    so neighbors mostly end up in the same shard.
+
+    Args:
+        adj (list): Neighbor IDs of every peer.
+        k (int): Number of shards.
+
+    Returns:
+        list: Shard of every peer, indexed by ID.
+    """
+    n = len(adj)
+    order = []
+    seen = [False] * n
+    for start in range(n):                                  # every component, in case the graph is not connected
+        if seen[start]:
+            continue
+        seen[start] = True
+        todo = deque([start])
+        while todo:
+            u = todo.popleft()
+            order.append(u)
+            for v in adj[u]:
+                if not seen[v]:
+                    seen[v] = True
+                    todo.append(v)
+    owner = [0] * n
+    for i, u in enumerate(order):
+        owner[u] = i * k // n
+    return owner
+
+
+def backward(indptr, src, weight, dist):
+    """
+    Dijkstra against the direction of the edges, from every peer with a finite start at once.
+
+    Args:
+        indptr (list): Start of the incoming edges of each peer.
+        src (list): Sending peer of each incoming edge.
+        weight (list): Delay of each incoming edge.
+        dist (list): Start of every peer, inf for none. Lowered in place.
+
+    Returns:
+        list: dist, for every peer the least delay of a path to a peer that had a start plus that start.
+    """
+    heap = [(d, v) for v, d in enumerate(dist) if d < math.inf]
+    heapq.heapify(heap)
+    while heap:
+        d, v = heapq.heappop(heap)
+        if d > dist[v]:
+            continue
+        for e in range(indptr[v], indptr[v + 1]):
+            u = src[e]
+            nd = d + weight[e]
+            if nd < dist[u]:
+                dist[u] = nd
+                heapq.heappush(heap, (nd, u))
+    return dist
+
+
+def reach(link, owner, k):
+    """
+    Shortest time in which an event at a peer can cause one in each shard: the fastest path of Tx
+    delays, the smallest message, from the peer to a peer of the shard, or for a peer of the shard
+    itself the fastest way out of it and back. Every message takes at least the Tx delay of its
+    link and queuing delays only add to it, so nothing that starts at a peer at time t reaches
+    the shard before t plus this. It is the lookahead of the peer, which for peers deep inside
+    a shard is many links long.
+
+    Args:
+        link (LinkModel): Delay tables of the network.
+        owner (list): Shard of every peer.
+        k (int): Number of shards.
+
+    Returns:
+        numpy.ndarray: k by n times, row s for shard s, inf where no path leads.
+    """
+    n = len(owner)
+    src = np.repeat(np.arange(n), np.diff(link.indptr))
+    order = np.argsort(link.indices, kind='stable')         # edges by receiving peer, to walk them backwards
+    indptr = np.zeros(n + 1, dtype=np.int64)
+    np.cumsum(np.bincount(link.indices, minlength=n), out=indptr[1:])
+    indptr = indptr.tolist()
+    src = src[order].tolist()
+    weight = link.txdelay[order].tolist()
+    out = np.empty((k, n))
+    for s in range(k):
+        into = backward(indptr, src, weight, [0.0 if o == s else math.inf for o in owner])
+        out[s] = backward(indptr, src, weight, [math.inf if o == s else d for o, d in zip(owner, into)])   # out first, then back in
+    return out
+
+
+class ShardQueue:
+    """
+    Event queue of one shard. Events of peers owned by other shards are not queued but kept in
+    outbox, to be sent to their shard at the end of the round. Everything else goes to the backend.
+
+    Attributes:
+        queue (Scheduler): Queue of the events of this shard.
+        owner (list): Shard of every peer.
+        shard (int): This shard.
+        outbox (list): Messages for other shards as (timestamp, opcode, peer ID, msg, sending peer ID or -1).
+    """
+
+    def __init__(self, queue, owner, shard, outbox):
+        """
+        Wraps a queue.
+
+        Args:
+            queue (Scheduler): Queue of the events of this shard.
+            owner (list): Shard of every peer.
+            shard (int): This shard.
+            outbox (list): Where messages for other shards are put.
+        """
+        self.queue = queue
+        self.owner = owner
+        self.shard = shard
+        self.outbox = outbox
+        self.pop = queue.pop                                # the event loop calls these straight on the backend
+        self.peek = queue.peek
+        self.cancel = queue.cancel
+        self.stats = queue.stats
+
+    def __len__(self):
+        return len(self.queue)
+
+    def push(self, timestamp, op, peer, msg=None, extra=None):
+        if peer is not None and self.owner[peer.ID] != self.shard:
+            self.outbox.append((timestamp, op, peer.ID, msg, extra.ID if op == RECV_TX else -1))
+            return None                                     # only Tx and blocks are sent to other peers, they are never cancelled
+        return self.queue.push(timestamp, op, peer, msg, extra)
+
+
+class ShardMempool(Mempool):
+    """
+    Tx pool of one shard. With analytic Tx propagation a new Tx reaches peers of every shard
+    without being sent, so Tx made here are also collected in fresh to be handed to the other shards.
+    A Tx comes back to the pool whenever the block a peer was mining it in goes stale, so the IDs
+    of the Tx already handed on, or made elsewhere, are kept to hand on each Tx once.
+
+    Attributes:
+        fresh (list): Tx with arrival times made since the end of the last round.
+        handed (set): IDs of the Tx the other shards have.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.fresh = []
+        self.handed = set()
+
+    def add(self, tx):
+        if not super().add(tx):
+            return False
+        if tx.arrival is not None and tx.txid not in self.handed:
+            self.handed.add(tx.txid)
+            self.fresh.append(tx)
+        return True
+
+    def adopt(self, tx):
+        """
+        Adds a Tx made in another shard, without handing it on again.
+
+        Args:
+            tx (Transaction): The Tx.
+        """
+        self.handed.add(tx.txid)
+        Mempool.add(self, tx)
+
+
+class RemotePeer:
+    """
+    Stand-in for a peer run by another shard. Tx and blocks only need its ID, so most stand-ins
+    hold nothing else. One next to a peer of this shard also notes the Tx and blocks sent its way,
+    as senders check before sending, and shares a chain that never grows past the genesis block.
+
+    Attributes:
+        name (str): Name of the peer.
+        ID (int): ID of the peer.
+        is_slow (bool): Slow peer, for the link speeds and the propagation metrics.
+        cpuspeed (float): Share of the mining power.
+        localchain (Blockchain): Chain holding only the genesis block, shared by all stand-ins.
+        blkqueue (dict): Earliest arrival time of every block sent its way, None away from this shard.
+        txqueue (dict): Earliest arrival time of every Tx sent its way or a Bloom filter of their IDs, None away from this shard.
+    """
+    __slots__ = ('name', 'ID', 'is_slow', 'cpuspeed', 'localchain', 'blkqueue', 'txqueue')
+
+    def __init__(self, name, id, chain, near=False, bloom=None):
+        """
+        Initializes a stand-in.
+
+        Args:
+            name (str): Name of the peer.
+            id (int): ID of the peer.
+            chain (Blockchain): Chain shared by all stand-ins.
+            near (bool, optional): Neighbor of a peer of this shard. Defaults to False.
+            bloom (int, optional): Capacity of the Bloom filter for seen Tx IDs, None keeps an exact dict. Defaults to None.
+        """
+        self.name = name
+        self.ID = id
+        self.is_slow = False
+        self.cpuspeed = 1
+        self.localchain = chain
+        self.blkqueue = {} if near else None
+        self.txqueue = None if not near else {} if bloom is None else BloomFilter(bloom)
+
+
+class _PeerPickler(pickle.Pickler):
+    """
+    Pickler writing peers as their ID, every process has its own peer objects.
+    """
+
+    def __init__(self, file, peercls):
+        super().__init__(file, pickle.HIGHEST_PROTOCOL)
+        self.peercls = peercls
+
+    def persistent_id(self, obj):
+        if type(obj) is self.peercls or type(obj) is RemotePeer:
+            return ('peer', obj.ID)
+        return None
+
+
+class _Unpickler(pickle.Unpickler):
+    """
+    Unpickler resolving peers written as IDs against the peers of this process.
+    """
+
+    def __init__(self, file, peers):
+        super().__init__(file)
+        self.peers = peers
+
+    def persistent_load(self, key):
+        return self.peers[key[1]]
+
+
+class Shard:
+    """
+    One shard of a parallel run, the part that runs in a worker process. The worker builds the
+    network from the same seed as every other shard, so all agree on topology, links and mining
+    power, but makes full peers only of the ones it owns and handles only their events. Peers of
+    other shards are RemotePeer stand-ins, their Tx and blocks arrive as messages between rounds.
+
+    Senders check the receiver's seen Tx and blocks before sending, but a stand-in never sees
+    anything, so those checks are done again here when a message arrives, against the real peer.
+
+    Messages carry Tx and blocks as integer keys, their number within the shard that made them
+    times the number of shards plus that shard, negated and less one for blocks. A Tx or block goes by value, as plain fields, only
+    the first time a shard is sent it, and a block only lists the keys of its Tx.
+
+    Attributes:
+        sim (P2PSimulation): Simulation of the owned peers, with stand-ins for the rest.
+        shard (int): This shard.
+        owner (list): Shard of every peer.
+        reach (numpy.ndarray): Lookahead of every peer towards every shard, from reach().
+        nshards (int): Number of shards.
+        outbox (list): Messages for other shards from the current round.
+        known (dict): Keys of the Tx and blocks every other shard is known to have, by shard.
+        txs (dict): Every Tx sent to or received from another shard, by key.
+        blocks (dict): Every block sent to or received from another shard, by key.
+    """
+
+    def __init__(self, sim, shard, owner, reach, txcls, seed):
+        """
+        Turns a freshly built simulation of the owned peers into one shard of the run.
+
+        Args:
+            sim (P2PSimulation): Simulation built with the same arguments in every shard and the peers of this shard as owned.
+            shard (int): This shard.
+            owner (list): Shard of every peer.
+            reach (numpy.ndarray): Lookahead of every peer towards every shard, from reach().
+            txcls (type): Class of the Tx.
+            seed (int): Seed of the run, every shard draws from its own streams derived from it.
+        """
+        self.sim = sim
+        self.shard = shard
+        self.owner = owner
+        self.reach = reach
+        self.anywhere = reach[:, [i for i, o in enumerate(owner) if o == shard]].min(axis=1)     # for events of no one peer, a mining race
+        self.txcls = txcls
+        self.peers = sim.network.all_peers
+        self.peercls = type(self.peers[owner.index(shard)])
+        self.nshards = max(owner) + 1
+        self.outbox = []
+        self.known = {d: set() for d in range(self.nshards) if d != shard}
+        self.txs = {}
+        self.blocks = {}
+        sim.queue = ShardQueue(sim.queue, owner, shard, self.outbox)    # only the owned peers have first events
+        if sim.network.race is not None:
+            sim.network.race.queue = sim.queue
+        sim.UTX = ShardMempool()
+        sim.setbalance = self.setbalance
+        sim.rng.reseed([seed, shard])
+
+    def setbalance(self, peer, balance):
+        """
+        Sets the balance of the receiver of a new Tx, through a message when another shard owns it.
+        That shard sets it when the message arrives, at the start of its next round.
+
+        Args:
+            peer (Peer): The receiver.
+            balance (int): Its new balance.
+        """
+        if self.owner[peer.ID] == self.shard:
+            peer.balance = balance
+        else:
+            self.outbox.append((self.sim.now, SET_BALANCE, peer.ID, balance, -1))
+
+    def txkey(self, tx):
+        return tx.num * self.nshards + self.owner[tx.sender.ID]
+
+    def blockkey(self, blk):
+        return -1 - blk.serial * self.nshards - self.owner[blk.miner.ID]
+
+    def encode(self, msgs, known):
+        """
+        Writes messages for one shard, Tx and blocks it does not have yet by value and the rest as keys.
+
+        Args:
+            msgs (list): Messages as (timestamp, opcode, peer ID, msg, sending peer ID or -1).
+            known (set): Keys the shard has, the ones sent by value are added.
+
+        Returns:
+            bytes: The frame.
+        """
+        txs = []
+        blocks = []
+
+        def txref(tx):
+            key = self.txkey(tx)
+            if key not in known:
+                known.add(key)
+                self.txs.setdefault(key, tx)
+                txs.append((key, bytes.fromhex(tx.txid), tx.sender.ID, tx.receiver.ID, tx.amount, tx.num, tx.timestamp,
+                            tx.born, None if tx.arrival is None else tx.arrival.tobytes()))
+            return key
+
+        def blockref(blk):
+            key = self.blockkey(blk)
+            if key not in known:
+                known.add(key)
+                self.blocks.setdefault(key, blk)
+                txkeys = [txref(tx) for tx in blk.Txlist]
+                blocks.append((key, blk.blkid, blk.plink, blk.miner.ID, blk.serial, blk.timestamp, txkeys))
+            return key
+
+        events = []
+        for ts, op, pid, msg, src in msgs:
+            if op == RECV_BLK:
+                msg = blockref(msg)
+            elif op != SET_BALANCE:
+                msg = txref(msg)
+            events.append((ts, op, pid, msg, src))
+        return zlib.compress(pickle.dumps((txs, blocks, events), pickle.HIGHEST_PROTOCOL), COMPRESSION)
+
+    def adopttx(self, fields, known):
+        """
+        Makes the object of this process for a Tx received by value, unless it already has one.
+
+        Args:
+            fields (tuple): The Tx as written by encode().
+            known (set): Keys the sending shard has.
+        """
+        key, txid, sender, receiver, amount, num, timestamp, born, arrival = fields
+        known.add(key)
+        if key in self.txs:
+            return
+        tx = self.txcls(self.peers[receiver], self.peers[sender], amount, num)
+        tx.txid = txid.hex()
+        tx.timestamp = timestamp
+        tx.born = born
+        tx.arrival = None if arrival is None else np.frombuffer(arrival, dtype=np.float32)
+        self.txs[key] = tx
+
+    def adoptblock(self, fields, known):
+        """
+        Makes the object of this process for a block received by value, unless it already has one.
+        A block new to this shard has its Tx taken out of the pool, as the pool shared by all peers
+        of a sequential run loses them when the block is mined.
+
+        Args:
+            fields (tuple): The block as written by encode().
+            known (set): Keys the sending shard has.
+        """
+        key, blkid, plink, miner, serial, timestamp, txkeys = fields
+        known.add(key)
+        if key in self.blocks:
+            return
+        blk = Block([self.txs[k] for k in txkeys], self.peers[miner], plink, serial)
+        blk.blkid = blkid
+        blk.timestamp = timestamp
+        self.blocks[key] = blk
+        for tx in blk.Txlist:
+            self.sim.UTX.remove(tx)
+
+    def inject(self, src, data):
+        """
+        Queues the messages another shard sent in its last round.
+
+        Args:
+            src (int): Sending shard.
+            data (bytes): Messages as written by encode().
+        """
+        known = self.known[src]
+        txs, blocks, events = pickle.loads(zlib.decompress(data))
+        for fields in txs:
+            self.adopttx(fields, known)
+        for fields in blocks:
+            self.adoptblock(fields, known)
+        push = self.sim.queue.push
+        for ts, op, pid, key, src in events:
+            if op == SET_BALANCE:
+                self.peers[pid].balance = key
+                continue
+            known.add(key)
+            if op == RECV_BLK:
+                msg = self.blocks[key]
+                peer = self.peers[pid]
+                if peer.localchain.has(msg.blkid):
+                    continue
+                first = peer.blkqueue.get(msg.blkid)
+                if first is not None and first <= ts:       # an earlier copy is already on its way
+                    continue
+                peer.blkqueue[msg.blkid] = ts
+                push(ts, op, peer, msg)
+                continue
+            msg = self.txs[key]
+            if op == GEN_TX:                                # Tx made in another shard with analytic propagation
+                self.sim.UTX.adopt(msg)
+                continue
+            self.heard(self.peers[src], msg, ts)
+            peer = self.peers[pid]
+            if self.heard(peer, msg, ts):                   # already there or on its way
+                continue
+            push(ts, op, peer, msg, self.peers[src])
+
+    @staticmethod
+    def heard(peer, tx, ts):
+        """
+        Notes that a peer has a Tx by some time, as sendtx does for a receiver.
+        The sender of a Tx from another shard had it before the Tx arrived here, so noting it on
+        its stand-in keeps the peers here from sending the Tx straight back.
+
+        Args:
+            peer (Peer): The peer.
+            tx (Transaction): The Tx.
+            ts (float): Time the peer has the Tx by.
+
+        Returns:
+            bool: True if the peer already had the Tx by then.
+        """
+        seen = peer.txqueue
+        if isinstance(seen, BloomFilter):
+            if tx.txid in seen:
+                return True
+            seen.add(tx.txid)
+            return False
+        first = seen.get(tx.txid)
+        if first is not None and first <= ts:
+            return True
+        seen[tx.txid] = ts
+        return False
+
+    def step(self, until, limit=None, drain=False):
+        """
+        Handles the events of this shard up to a time.
+
+        Args:
+            until (float): Last time handled.
+            limit (int, optional): Stop after these many mining events, the ones the whole run has left. Defaults to None.
+            drain (bool, optional): Only let blocks already sent reach their peers, like the end of a sequential run. Defaults to False.
+
+        Returns:
+            int: Mining events handled.
+        """
+        if drain:
+            Simulation.run(self.sim, only=(SEND_BLK, RECV_BLK), until=until, dropped=self.sim.dropmining)
+            return 0
+        return Simulation.run(self.sim, limit, counted=(START_MINING, MINED_BLK), until=until)
+
+    def earliest(self, times, ids):
+        """
+        Earliest time events at some peers can cause one in every shard.
+
+        Args:
+            times (list): Time of every event.
+            ids (list): ID of the peer of every event.
+
+        Returns:
+            numpy.ndarray: Time for every shard, inf for none.
+        """
+        if not times:
+            return np.full(self.nshards, math.inf)
+        return (self.reach[:, ids] + np.array(times)).min(axis=1)
+
+    def bounds(self):
+        """
+        Earliest time the events queued here can cause one in every shard, in this one by going out and back.
+
+        Returns:
+            numpy.ndarray: Time for every shard, inf for none.
+        """
+        times = []
+        ids = []
+        first = math.inf
+        for ts, _, _, peer, _, _ in self.sim.queue.queue.events():
+            if peer is None:
+                first = min(first, ts)
+            else:
+                times.append(ts)
+                ids.append(peer.ID)
+        return np.minimum(self.earliest(times, ids), self.anywhere + first)
+
+    def outgoing(self):
+        """
+        Messages of the last round for every other shard.
+
+        Returns:
+            dict: Mapping of shards to their messages as bytes, the earliest message time, None if none is an event,
+            and the earliest time the messages can cause an event in every shard, from earliest().
+        """
+        bydest = {}
+        for m in self.outbox:
+            bydest.setdefault(self.owner[m[2]], []).append(m)
+            if m[1] == RECV_BLK:                            # the real peer drops a block whose parent it lacks and waits for a later copy,
+                self.peers[m[2]].blkqueue.pop(m[3].blkid, None)     # which this stand-in must not hold back, see Peer.UpdateChain
+        fresh = self.sim.UTX.fresh
+        if fresh:
+            for d in self.known:
+                bydest.setdefault(d, []).extend((tx.born, GEN_TX, -1, tx, -1) for tx in fresh)
+            self.sim.UTX.fresh = []
+        del self.outbox[:]                                  # the queue holds this list
+        out = {}
+        for d, msgs in bydest.items():
+            events = [m for m in msgs if m[1] != GEN_TX and m[1] != SET_BALANCE]
+            times = [m[0] for m in events]
+            out[d] = (self.encode(msgs, self.known[d]), min(times) if times else None, self.earliest(times, [m[2] for m in events]))
+        return out
+
+    def finish(self):
+        """
+        End state of the owned peers and every block this shard has, for the coordinator to merge.
+
+        Returns:
+            bytes: Blocks in the order they entered the shard, state of every owned peer, reorgs of the owned peers, Tx made, queue stats and end time.
+        """
+        peers = {}
+        for peer in self.peers:
+            if self.owner[peer.ID] != self.shard:
+                continue
+            lc = peer.localchain
+            peers[peer.ID] = {'blktime': lc.blktime, 'tip': lc.tip.blkid, 'private': lc.private_chain,
+                              'lastplink': lc.lastplink, 'tot_mining': peer.tot_mining, 'balance': peer.balance,
+                              'state0': peer.state0, 'lastblkarrivaltime': peer.lastblkarrivaltime}
+        m = self.sim.metrics                                # only owned peers move their tips, so shards count disjoint reorgs
+        buf = io.BytesIO()
+        _PeerPickler(buf, self.peercls).dump({'blocks': list(self.sim.network.store.blocks.values())[1:],
+                                              'peers': peers, 'reorgs': (m.reorgs, m.dropped, m.depths), 'ntx': self.sim.ntx,
+                                              'stats': self.sim.queue.stats(), 'now': self.sim.now})
+        return buf.getvalue()
+
+
+def worker(conn, shard, owner, reach, simcls, txcls, args, scheduler):
+    """
+    Main loop of a worker process: builds its shard, then handles rounds till told to finish.
+
+    Args:
+        conn (multiprocessing.connection.Connection): Pipe to the coordinator.
+        shard (int): Shard of this worker.
+        owner (list): Shard of every peer.
+        reach (numpy.ndarray): Lookahead of every peer towards every shard, from reach().
+        simcls (type): Simulation class.
+        txcls (type): Tx class.
+        args (tuple): Arguments of the simulation class, the seed among them.
+        scheduler (str): Event queue backend, one of SCHEDULERS.
+    """
+    try:
+        owned = {i for i, s in enumerate(owner) if s == shard}
+        sim = simcls(*args, queue=SCHEDULERS[scheduler](), owned=owned)
+        sh = Shard(sim, shard, owner, reach, txcls, args[7])
+        conn.send(('ok', (sim.queue.peek(), sh.bounds())))
+        while True:
+            cmd = conn.recv()
+            if cmd[0] == 'finish':
+                conn.send(('ok', sh.finish()))
+                return
+            _, horizon, limit, drain, inbox = cmd
+            start = time.process_time()
+            for src, data in inbox:
+                sh.inject(src, data)
+            n = sh.step(math.nextafter(horizon, -math.inf), limit, drain)    # messages yet to come arrive at the horizon or later
+            out = sh.outgoing()
+            conn.send(('ok', (n, sim.queue.peek(), sh.bounds(), out, time.process_time() - start)))
+    except Exception:
+        conn.send(('error', traceback.format_exc()))
+
+
+class ParallelSimulation:
+    """
+    Runs a simulation on several processes with conservative synchronization. The peers are split
+    into shards along the graph and every shard runs in its own worker, which builds only the
+    peers it owns. Every peer has a lookahead towards every shard, the fastest path of Tx delays
+    from it to the shard (see reach()), so an event pending at a peer at time t cannot cause
+    anything in that shard before t plus the lookahead, and neither can a message on its way.
+    A shard's horizon is the earliest such time over the events pending in all shards and the
+    messages between them, and the coordinator runs rounds in which every shard with events
+    before its horizon handles them, handing on the messages in between, till N mining events
+    are handled. It then lets the blocks already sent reach everyone, as the sequential run does.
+    A peer deep inside a shard is many links from the next shard, so a shard only waits for the
+    events near its border and mostly runs far ahead of a window shared by all shards.
+
+    The speedup is not linear. A block keeps some peer near every border busy most of the time,
+    so the horizons are often only a few links ahead, and a round then holds few events. A shard
+    also pays for what a sequential run never does: every Tx crosses into every shard by value
+    and messages between shards are pickled, piped and checked again on arrival. The events of a
+    round grow with the number of peers, the cost of a round with the number of shards, so the
+    speedup grows with the network and falls off with more shards. bench_parallel.py measures it:
+    with 1000 peers and Tx arrival times computed, the busiest shard of each round takes about as
+    long as the sequential run on 2 and 4 shards (0.97x and 1.02x) and longer on 8 (0.78x), and
+    with 250 peers 0.5x to 0.7x. Near linear speedup is out of reach with this design.
+
+    Runs are statistically equivalent to sequential ones, not equal: each shard draws from its own
+    random streams, Tx and block numbers are only unique within a shard, a Tx mined in one shard
+    leaves the pools of the others when its block arrives there rather than at once, and the run
+    stops at the end of the round in which the N-th mining event happened. A receiver in another
+    shard gets the balance a new Tx gives it when its shard next starts a round, not at once.
+
+    Attributes:
+        network (Network): The network, with every peer's chain merged in from its shard after run().
+        metrics (Metrics): Run metrics, merged from the shards after run().
+        ntx (int): Tx made in all shards, after run().
+        owner (list): Shard of every peer.
+        reach (numpy.ndarray): Lookahead of every peer towards every shard, from reach().
+        lookahead (float): Shortest lookahead of all, the Tx delay of the fastest link between two shards.
+        rounds (int): Rounds run.
+        messages (int): Message frames sent between shards.
+        nbytes (int): Bytes sent between shards.
+        cpu (float): CPU seconds the shards spent on rounds, summed over the shards.
+        critical (float): CPU seconds of the busiest shard of every round, summed over the rounds.
+            The shards of a round run side by side, so with a core per shard the rounds take
+            about this long and cpu / critical is the speedup over running them one after another.
+    """
+
+    def __init__(self, simcls, txcls, shards, num, Ttx, Tk, C1, C2, N, bloom=None, seed=None, topology='random', zipf=None, race=False, txprop=False, scheduler='heap'):
+        """
+        Builds the network and splits it into shards, the workers start with run().
+
+        Args:
+            simcls (type): Simulation class, P2PSimulation.
+            txcls (type): Tx class, written by value between shards.
+            shards (int): Number of shards and worker processes.
+            num (int): Total number of peers in the network.
+            Ttx (float): Mean time between transaction generations.
+            Tk (float): Mean time between block generation attempts.
+            C1 (float): Mining power of the attacker 1.
+            C2 (float): Mining power of the attackers 2.
+            N (int): Number of mining events the run stops after.
+            bloom (int, optional): Capacity of per-peer Bloom filters for seen Tx IDs, None keeps exact dicts. Defaults to None.
+            seed (int, optional): Seed of the run. Defaults to fresh entropy.
+            topology (str, optional): Network topology, one of topology.TOPOLOGIES. Defaults to 'random'.
+            zipf (float, optional): Zipf exponent for picking Tx receivers, None picks uniformly. Defaults to None.
+            race (bool, optional): One mining race per shard instead of per peer mining events. Defaults to False.
+            txprop (bool, optional): Compute Tx arrival times instead of flooding. Defaults to False.
+            scheduler (str, optional): Event queue backend of every shard, one of SCHEDULERS. Defaults to 'heap'.
+        """
+        self.sim = simcls(num, Ttx, Tk, C1, C2, N, bloom, seed, topology, zipf, race, txprop)
+        self.network = self.sim.network
+        self.metrics = self.sim.metrics
+        self.N = N
+        self.shards = shards
+        self.simcls = simcls
+        self.txcls = txcls
+        self.scheduler = scheduler
+        self.args = (num, Ttx, Tk, C1, C2, N, bloom, int(self.network.rng.seed), topology, zipf, race, txprop)
+        self.owner = partition(self.network.adj, shards)
+        self.reach = reach(self.network.link, self.owner, shards)
+        owner = np.asarray(self.owner)
+        self.lookahead = min(float(self.reach[s][owner != s].min(initial=math.inf)) for s in range(shards))
+        self.done = 0
+        self.rounds = 0
+        self.messages = 0
+        self.nbytes = 0
+        self.cpu = 0.0
+        self.critical = 0.0
+        self.ntx = 0
+        self.stats = []
+
+    @staticmethod
+    def recv(conn):
+        status, value = conn.recv()
+        if status == 'error':
+            raise RuntimeError('shard failed:\n' + value)
+        return value
+
+    def run(self):
+        """
+        Runs the simulation on the workers and merges their peers into network.
+        """
+        procs = []
+        conns = []
+        try:
+            for i in range(self.shards):
+                parent, child = mp.Pipe()
+                p = mp.Process(target=worker, args=(child, i, self.owner, self.reach, self.simcls, self.txcls, self.args, self.scheduler), daemon=True)
+                p.start()
+                procs.append(p)
+                conns.append(parent)
+            nexts, causes = zip(*[self.recv(c) for c in conns])
+            nexts = list(nexts)
+            causes = np.array(causes)                           # row j: earliest time the events pending in shard j can cause one in every shard
+            inbox = [[] for _ in conns]
+            arriving = [math.inf] * self.shards                 # earliest event among the messages waiting for each shard
+            inflight = np.full(self.shards, math.inf)           # earliest time those messages can cause an event in every shard
+            drain = False
+            while True:
+                pending = [min(a, math.inf if t is None else t) for a, t in zip(arriving, nexts)]
+                if min(pending) == math.inf:
+                    break
+                horizon = np.minimum(causes.min(axis=0), inflight)
+                ran = [i for i in range(self.shards) if inbox[i] or pending[i] < horizon[i]]
+                limit = None if drain else -(-(self.N - self.done) // len(ran))    # a share of the mining events left, so the shards together stop near N
+                for i in ran:
+                    conns[i].send(('run', float(horizon[i]), limit, drain, inbox[i]))
+                    inbox[i] = []
+                    arriving[i] = math.inf
+                inflight[:] = math.inf
+                busiest = 0.0
+                for i in ran:
+                    n, nexts[i], causes[i], out, cpu = self.recv(conns[i])
+                    self.cpu += cpu
+                    busiest = max(busiest, cpu)
+                    self.done += n
+                    for d, (data, first, bound) in out.items():
+                        inbox[d].append((i, data))
+                        self.messages += 1
+                        self.nbytes += len(data)
+                        if first is not None:
+                            arriving[d] = min(arriving[d], first)
+                            np.minimum(inflight, bound, out=inflight)
+                self.critical += busiest
+                self.rounds += 1
+                if self.done >= self.N:
+                    drain = True
+            for c in conns:
+                c.send(('finish',))
+            ends = [self.recv(c) for c in conns]
+            for p in procs:
+                p.join()
+        finally:
+            for p in procs:
+                if p.is_alive():
+                    p.terminate()
+        self.merge(ends)
+
+    def merge(self, ends):
+        """
+        Puts the blocks of every shard into the store of network and the chain of every peer into its peer.
+
+        Args:
+            ends (list): What every shard's finish() returned.
+        """
+        store = self.network.store
+        peers = self.network.all_peers
+        ends = [_Unpickler(io.BytesIO(data), peers).load() for data in ends]
+        todo = [blk for end in ends for blk in end['blocks']]
+        while todo:                                         # each shard lists parents first, across shards a parent may come later
+            left = []
+            for blk in todo:
+                if blk.blkid in store.blocks:
+                    continue
+                if blk.plink in store.blocks:
+                    store.add(blk)
+                else:
+                    left.append(blk)
+            if len(left) == len(todo):
+                break
+            todo = left
+        for end in ends:
+            for pid, state in end['peers'].items():
+                peer = peers[pid]
+                private = [store.blocks.get(blk.blkid, blk) for blk in state.pop('private')]
+                peer.localchain.load(state.pop('blktime'), store.blocks[state.pop('tip')], private, state.pop('lastplink'))
+                peer.__dict__.update(state)
+        for end in ends:
+            reorgs, dropped, depths = end['reorgs']
+            self.metrics.reorgs += reorgs
+            self.metrics.dropped += dropped
+            for k, v in depths.items():
+                self.metrics.depths[k] = self.metrics.depths.get(k, 0) + v
+        self.metrics.resync()                               # chains were loaded whole, without reporting tip moves or arrivals
+        self.metrics.propagation.rebuild(peers, store.blocks)
+        self.ntx = sum(end['ntx'] for end in ends)          # Tx are made only by the shard of their sender
+        self.stats = [end['stats'] for end in ends]
+        self.sim.now = max(end['now'] for end in ends)
+
+    def queuestats(self):
+        """
+        Event queue stats summed over the shards, like Scheduler.stats().
+
+        Returns:
+            dict: live and dead events queued, fraction of dead ones, events pushed and cancelled in total and the largest peak of a shard.
+        """
+        total = {k: sum(s[k] for s in self.stats) for k in ('live', 'dead', 'pushed', 'cancelled')}
+        size = total['live'] + total['dead']
+        total.update(deadfrac=total['dead'] / size if size else 0.0, peak=max(s['peak'] for s in self.stats))
+        return total
@@ -5,6 +5,7 @@ import numpy as np
 from block import Block
 from block import BlockChain
 import time
+from log import log
 
 class Connection(object):
     def __init__(self, env, sender, receiver):
@@ -15,42 +16,52 @@ class Connection(object):
     def __repr__(self):
         return '<Connection %r -> %r>' % (self.sender, self.receiver)
 
+class PeerContext(object):
+    """
+    State shared by all peers of one network. It used to live in Peer class attributes, so every
+    network made in a process shared one UTXO pool and one chain.
+    """
+
+    def __init__(self, mean_Tk=3000, txn_interval_mean=10):
+        self.UTXO = [] #unspent txn pool
+        self.sim_time = time.time() #this is the global time in seconds
+        self.pij = np.random.uniform(10,500) #fixed prop delay, choosen from uniform dist.
+        self.dij = 96*1000 #bits
+        self.genesisBlock = Block([],None) #initialize a genesis block for the nw
+        self.genesisBlock.blkid = '00000000000000000000000000000000'
+        self.globalChain = BlockChain(self.genesisBlock) #initialize a blockchain with genesis block
+        self.all_peers = [] #list of all the peers in nw
+        self.txn_interval_mean = txn_interval_mean #avg. time bw two txns in ms
+        self.mean_Tk = mean_Tk #from my observation of 3 sec avg. prop delay on nw
+        self.AVG_BLK_ARR_TIME = len(self.all_peers)*mean_Tk #no. of peers*max_delay, taken before any peer joins as it always was
+
 class Peer(object):
 
-    UTXO = [] #unspent txn pool 
-    sim_time = time.time() #this is the global time in seconds 
-    pij = np.random.uniform(10,500) #fixed prop delay, choosen from uniform dist.
-    dij = 96*1000 #bits
-    genesisBlock = Block([],None) #initialize a genesis block for the nw
-    genesisBlock.blkid = '00000000000000000000000000000000'
-    globalChain = BlockChain(genesisBlock) #initialize a blockchain with genesis block
-    all_peers = [] #list of all the peers in nw
-    txn_interval_mean = 10 #avg. time bw two txns in ms
-    mean_Tk = 3000 #from my observation of 3 sec avg. prop delay on nw
-    AVG_BLK_ARR_TIME = len(all_peers)*mean_Tk #no. of peers*max_delay
-   
-    def __init__(self, name, peer_type, env):
+    def __init__(self, name, peer_type, env, ctx):
         self.name = name
         self.type = peer_type
+        self.ctx = ctx
+        ctx.all_peers.append(self)
         self.unspentTransactions = []
         self.balance = 100
-        self.lasttransactiontime = self.sim_time
-        self.listofBlocks = [self.genesisBlock]
-        self.lastBlockHeard = self.genesisBlock #default time of genesis block
-        self.lastBlockArrTime = self.sim_time
-        self.localChain = self.globalChain
-        self.Tk_mean = float(np.random.poisson(self.AVG_BLK_ARR_TIME,1)[0]) #average arrival time of a block proportion to cpu power
+        self.lasttransactiontime = ctx.sim_time
+        self.listofBlocks = [ctx.genesisBlock]
+        self.lastBlockHeard = ctx.genesisBlock #default time of genesis block
+        self.lastBlockArrTime = ctx.sim_time
+        self.localChain = ctx.globalChain
+        self.Tk_mean = float(np.random.poisson(ctx.AVG_BLK_ARR_TIME,1)[0]) #average arrival time of a block proportion to cpu power
         self.env = env
         self.connections = dict()
         self.txn_queue = {}    
-        self.blk_queue = {'00000000000000000000000000000000':self.sim_time}    
+        self.blk_queue = {'00000000000000000000000000000000':ctx.sim_time}    
       
     def __repr__(self):
         return '<%s %s>' % (self.__class__.__name__, self.name)
     
     def connect(self, other):
         if not self.is_connected(other):
-            print ("%r connecting to %r" % (self, other))
+            if log.hop:
+                log('hop', '%r connecting to %r', self, other)
             self.connections[other] = Connection(self.env, self, other)
             if not other.is_connected(self):
                 other.connect(self)
@@ -63,14 +74,14 @@ class Peer(object):
         if isinstance(msg,Block):
             size = 8*pow(10,6) #bits
 
-        delay = self.pij
+        delay = self.ctx.pij
         cij = 5*pow(10,3) #link speed bits per ms
 
         if self.type == other.type == 'fast':
             cij = 100*pow(10,3)
 
         prop = float(size)/cij
-        queing = np.random.exponential((float(self.dij)/cij),1)[0]
+        queing = np.random.exponential((float(self.ctx.dij)/cij),1)[0]
 
         delay += prop + queing #in ms
         return float(delay)/1000 
@@ -95,7 +106,8 @@ class Peer(object):
                 if not(other == self):
                     if msg.blkid not in other.blk_queue.keys():
                         #adding any block heard by a peer
-                        print ("sending block.. " + str(msg.blkid) + " to " + str(other) + str(other.blk_queue.keys()))
+                        if log.hop:
+                            log('hop', 'sending block.. %s to %s', msg.blkid, other)
                         arrival_time = delay + self.computeDelay(other,msg)
                         other.blk_queue[msg.blkid] = arrival_time
                           
@@ -105,20 +117,22 @@ class Peer(object):
                             other.updateChain(msg,arrival_time)
                             other.broadcast(msg, arrival_time)
                         
-                        if other.name == 'p1':
-                            print ("Block heard by p1")
-                            print (other.blk_queue)
-                            print ("----------Local Chain for p1--------")
+                        if log.chain and other.name == 'p1':
+                            log('chain', 'Block heard by p1')
+                            log('chain', '%s', other.blk_queue)
+                            log('chain', '----------Local Chain for p1--------')
                             #print other.unspentTransactions
                             other.localChain.displayChain()
         return
 
     def detectFork(self, msg, arrival_time):
-        print ("Two new blocks received...detecting fork..")
+        if log.fork:
+            log('fork', 'Two new blocks received...detecting fork..')
         #same parentlink with different arrival times, different block, resolve fork with latest
             
         if (msg.parentlink == self.localChain.getLast().parentlink) and (msg.blkid != self.localChain.getLast().blkid):
-            print ("Fork detected....at peer: " + str(self.name))
+            if log.fork:
+                log('fork', 'Fork detected....at peer: %s', self.name)
          
             if arrival_time > self.lastBlockArrTime:
                 self.listofBlocks.append(msg) #select the chain with first arrived block
@@ -159,7 +173,8 @@ class Peer(object):
         sender=self.name
        
         if self.balance < 1:
-            print ("insufficient balance")
+            if log.tx:
+                log('tx', 'insufficient balance')
             return
 
         coins = random.randint(1,self.balance)
@@ -168,7 +183,7 @@ class Peer(object):
         tx = Transaction(self.name, receiver, coins)
         self.lasttransactiontime = time.time()
         #add the new transaction to the unspent pool 
-        self.UTXO.append(tx)
+        self.ctx.UTXO.append(tx)
         self.unspentTransactions.append(tx)
           
         self.broadcast(tx, tx.timestamp)
@@ -186,7 +201,7 @@ class Peer(object):
 
         if len(self.unspentTransactions) == 0:
             #check in the UTXO
-            self.unspentTransactions.extend(self.UTXO)
+            self.unspentTransactions.extend(self.ctx.UTXO)
             if len(self.unspentTransactions) == 0:
                 #print 'There are no unspent transactions'
                 return 
@@ -203,13 +218,15 @@ class Peer(object):
                 #print "mining a block already present"
                 return
 
-        print (str(self) + " is mining....")
+        if log.mining:
+            log('mining', '%s is mining....', self)
         self.listofBlocks.append(newBlock)
         self.blk_queue[newBlock.blkid] = newBlock.timestamp
         self.localChain.addBlock(newBlock)
         self.lastBlockArrTime = newBlock.timestamp
-        print ("block successfully created by " + str(self) + " "+ str(newBlock))
-        print ("linked to " + str(newBlock.parentlink))
+        if log.mining:
+            log('mining', 'block successfully created by %s %s', self, newBlock)
+            log('mining', 'linked to %s', newBlock.parentlink)
         self.broadcast(newBlock, newBlock.timestamp)
 
         return 
@@ -0,0 +1,208 @@
+import sys
+import time
+from simulation import OPNAMES
+
+ROOT = 'run'    # bottom frame of every stack, its own time is the event loop itself
+
+
+class Profiler:
+    """
+    Built in profiler of a run: wall time and calls of every event opcode and of chosen methods
+    (peer handlers, event queue, file output) as they nest in each other, plus the size of the
+    event queue and the event rate over simulated time. Nothing is timed before start() and stop()
+    takes every hook out again, so a run that is not profiled runs exactly the code it always did.
+    Methods are timed by replacing them on their class, so objects pickled by a checkpoint
+    carry no trace of the profiler.
+
+    Times are kept per call stack, the opcode of the event at the bottom, and can be written as
+    collapsed stacks, one line per stack with its own time in microseconds, the input of
+    flamegraph.pl and speedscope.
+
+    Attributes:
+        sim (Simulation): The run profiled.
+        targets (list): Methods timed, as (class, method name).
+        every (float): Simulated time between samples of the queue size and event rate.
+        stats (dict): [calls, total time, own time] of every call stack, a tuple of frame names.
+        samples (list): (simulated time, live events, queued events with cancelled ones, events per second) every so often.
+        events (int): Events handled.
+        wall (float): Seconds the run was profiled for.
+    """
+
+    def __init__(self, sim, targets, every):
+        """
+        Prepares a profiler, it times nothing till start().
+
+        Args:
+            sim (Simulation): The run to profile.
+            targets (list): Methods to time, as (class, method name).
+            every (float): Simulated time between samples of the queue size and event rate.
+        """
+        self.sim = sim
+        self.targets = targets
+        self.every = every
+        self.stats = {}
+        self.stack = [[(ROOT,), 0.0]]
+        self.samples = []
+        self.events = 0
+        self.wall = 0.0
+        self.next = every
+        self.saved = []
+        self.started = None
+        self.mark = (0, None)
+
+    def timed(self, name, fn):
+        """
+        Wraps a function so every call is timed in the call stack it was made from.
+
+        Args:
+            name (str): Frame name.
+            fn (callable): The function.
+
+        Returns:
+            callable: The wrapper.
+        """
+        stats = self.stats
+        stack = self.stack
+        clock = time.perf_counter
+
+        def timed(*args, **kwargs):
+            parent = stack[-1]
+            frame = [parent[0] + (name,), 0.0]
+            stack.append(frame)
+            start = clock()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                dt = clock() - start
+                stack.pop()
+                parent[1] += dt
+                s = stats.get(frame[0])
+                if s is None:
+                    s = stats[frame[0]] = [0, 0.0, 0.0]
+                s[0] += 1
+                s[1] += dt
+                s[2] += dt - frame[1]                   # own time, without the timed calls it made
+        return timed
+
+    def handlers(self, handlers):
+        """
+        Timed copies of the handlers of a run, called by Simulation.run while profiling.
+
+        Args:
+            handlers (list): Handler of every opcode, None where there is none.
+
+        Returns:
+            list: The handlers, each timed under its opcode name and counting events.
+        """
+        return [self.event(op, h) if h is not None else None for op, h in enumerate(handlers)]
+
+    def event(self, op, fn):
+        timed = self.timed(OPNAMES.get(op, str(op)), fn)
+
+        def handler(ts, peer, msg, extra):
+            if ts >= self.next:
+                self.sample(ts)
+            self.events += 1
+            timed(ts, peer, msg, extra)
+        return handler
+
+    def sample(self, ts):
+        """
+        Records the queue size and the event rate since the last sample.
+
+        Args:
+            ts (float): Time of the event about to be handled.
+        """
+        now = time.perf_counter()
+        events, last = self.mark
+        if last is not None:
+            rate = (self.events - events) / (now - last) if now > last else float('nan')
+            self.samples.append((self.next, len(self.sim.queue), self.sim.queue.size, rate))
+        self.mark = (self.events, now)
+        while self.next <= ts:
+            self.next += self.every
+
+    def start(self):
+        """
+        Starts timing, replacing the target methods on their classes.
+        """
+        for cls, name in self.targets:
+            own = cls.__dict__.get(name)                # None when inherited, then stop() only removes the wrapper
+            self.saved.append((cls, name, own))
+            setattr(cls, name, self.timed(f'{cls.__name__}.{name}', getattr(cls, name)))
+        self.sim.profiler = self
+        self.started = time.perf_counter()
+        self.mark = (self.events, self.started)
+
+    def stop(self):
+        """
+        Stops timing and puts the target methods back.
+        """
+        if self.started is None:
+            return
+        self.wall += time.perf_counter() - self.started
+        self.started = None
+        for cls, name, own in reversed(self.saved):
+            if own is None:
+                delattr(cls, name)
+            else:
+                setattr(cls, name, own)
+        self.saved = []
+        self.sim.profiler = None
+
+    def totals(self):
+        """
+        Calls, total and own time of every frame name, over all the stacks it is in.
+
+        Returns:
+            dict: [calls, total time, own time] by frame name.
+        """
+        out = {}
+        for path, (calls, total, own) in self.stats.items():
+            t = out.setdefault(path[-1], [0, 0.0, 0.0])
+            t[0] += calls
+            if path[-1] not in path[:-1]:               # a frame inside itself is already in the total of the outer one
+                t[1] += total
+            t[2] += own
+        return out
+
+    def report(self, out=sys.stdout, rows=8):
+        """
+        Writes the time of every opcode and method, and the queue size and event rate over simulated time.
+
+        Args:
+            out (file, optional): Where to write. Defaults to sys.stdout.
+            rows (int, optional): Samples shown, evenly spread over the run. Defaults to 8.
+        """
+        wall = self.wall or float('nan')
+        totals = self.totals()
+        ops = set(OPNAMES.values())
+        out.write(f'Profile : {self.events} events in {self.wall:.2f}s, {self.events / wall:,.0f} events/s\n')
+        out.write(f"  {'':<28} {'calls':>9} {'total s':>8} {'own s':>8} {'own %':>6} {'us/call':>8}\n")
+        for group in (sorted(n for n in totals if n in ops), sorted((n for n in totals if n not in ops), key=lambda n: -totals[n][1])):
+            for name in group:
+                calls, total, own = totals[name]
+                out.write(f'  {name:<28} {calls:>9} {total:>8.3f} {own:>8.3f} {own / wall:>6.1%} {total / calls * 1e6:>8.1f}\n')
+        out.write(f"  {'event loop':<28} {'':>9} {'':>8} {self.loop():>8.3f} {self.loop() / wall:>6.1%}\n")
+        if self.samples:
+            step = max(1, len(self.samples) // rows)
+            out.write(f"  {'sim time':>12} {'live':>8} {'queued':>8} {'events/s':>10}\n")
+            for t, live, queued, rate in self.samples[::step]:
+                out.write(f'  {t:>12.1f} {live:>8} {queued:>8} {rate:>10,.0f}\n')
+
+    def loop(self):
+        return self.wall - sum(total for path, (_, total, _) in self.stats.items() if len(path) == 2)
+
+    def collapsed(self, path):
+        """
+        Writes the collapsed stacks, one line per call stack with its own time in microseconds.
+
+        Args:
+            path (str): Output file.
+        """
+        with open(path, 'w') as f:
+            f.write(f'{ROOT} {round(self.loop() * 1e6)}\n')
+            for stack, (_, _, own) in sorted(self.stats.items()):
+                us = round(own * 1e6)
+                if us > 0:
+                    f.write(';'.join(stack) + f' {us}\n')
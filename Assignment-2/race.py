@@ -0,0 +1,148 @@
+from simulation import MINE_RACE
+
+
+class MiningRace:
+    """
+    One mining race for the whole network instead of one pending mining event per peer.
+    The first of independent exponential mining times is exponential with the summed rate and is
+    won by each peer with probability proportional to its rate, so a single event drawn from the
+    total rate replaces all per-peer events. Mining times are memoryless, so the pending event is
+    redrawn whenever a peer starts or stops mining. Moving to another tip only moves a peer
+    between groups, which leaves the total rate and the pending event untouched.
+
+    Attributes:
+        queue (Scheduler): Event queue the race event goes in.
+        stream (RandomStream): Stream for race times and winners.
+        rate (dict): Mining rate of every mining peer.
+        tip (dict): Block ID every mining peer is mining on.
+        groups (dict): Mapping of block IDs to the rates of the peers mining on them.
+        grouprate (dict): Total rate of every group.
+        total (float): Total rate of all mining peers.
+        pending (int): Queue handle of the race event, None when nobody mines.
+    """
+
+    def __init__(self, queue, stream):
+        """
+        Initializes a race with no miners.
+
+        Args:
+            queue (Scheduler): Event queue the race event goes in.
+            stream (RandomStream): Stream for race times and winners.
+        """
+        self.queue = queue
+        self.stream = stream
+        self.rate = {}
+        self.tip = {}
+        self.groups = {}
+        self.grouprate = {}
+        self.total = 0.0
+        self.pending = None
+
+    def __len__(self):
+        return len(self.rate)
+
+    def join(self, peer, plink, rate, now):
+        """
+        Adds a peer to the race or moves it to another tip.
+
+        Args:
+            peer (Peer): Mining peer.
+            plink (str): Block ID it mines on.
+            rate (float): Blocks per unit time it finds on its own.
+            now (float): Current time.
+        """
+        old = self.tip.get(peer)
+        if old == plink:
+            return
+        if old is not None:
+            self.ungroup(peer, old)
+        self.tip[peer] = plink
+        self.groups.setdefault(plink, {})[peer] = rate
+        self.grouprate[plink] = self.grouprate.get(plink, 0.0) + rate
+        if old is None:
+            self.rate[peer] = rate
+            self.total += rate
+            self.redraw(now)
+
+    def leave(self, peer, now):
+        """
+        Removes a peer from the race.
+
+        Args:
+            peer (Peer): Peer that stops mining.
+            now (float): Current time.
+        """
+        plink = self.tip.pop(peer, None)
+        if plink is None:
+            return
+        self.ungroup(peer, plink)
+        del self.rate[peer]
+        self.total = sum(self.grouprate.values())           # resummed so rounding does not pile up
+        self.redraw(now)
+
+    def ungroup(self, peer, plink):
+        """
+        Removes a peer from the group of a tip, dropping the group once empty.
+
+        Args:
+            peer (Peer): Peer to remove.
+            plink (str): Block ID of the group.
+        """
+        group = self.groups[plink]
+        rate = group.pop(peer)
+        if group:
+            self.grouprate[plink] -= rate
+        else:
+            del self.groups[plink]
+            del self.grouprate[plink]
+
+    def rescale(self, factor, now):
+        """
+        Multiplies the mining rate of every peer, e.g. when a resumed run changes the block interval.
+
+        Args:
+            factor (float): Rate multiplier.
+            now (float): Current time.
+        """
+        for peer in self.rate:
+            self.rate[peer] *= factor
+            self.groups[self.tip[peer]][peer] *= factor
+        for plink in self.grouprate:
+            self.grouprate[plink] *= factor
+        self.total = sum(self.grouprate.values())
+        self.redraw(now)
+
+    def redraw(self, now):
+        """
+        Replaces the pending race event with a fresh draw from the current total rate.
+
+        Args:
+            now (float): Current time.
+        """
+        if self.pending is not None:
+            self.queue.cancel(self.pending)
+            self.pending = None
+        if self.total > 0:
+            self.pending = self.queue.push(now + self.stream.exponential(1.0 / self.total), MINE_RACE, None)
+
+    def winner(self):
+        """
+        Picks the peer that found the block, first its tip by group rate, then the peer by its rate.
+        Called when the race event fires.
+
+        Returns:
+            Peer: The winner, None if nobody mines.
+        """
+        self.pending = None
+        if not self.rate:
+            return None
+        u = self.stream.random() * sum(self.grouprate.values())
+        for plink, grate in self.grouprate.items():
+            if u < grate:
+                break
+            u -= grate
+        for peer, rate in self.groups[plink].items():
+            if u < rate:
+                return peer
+            u -= rate
+        return peer                                         # rounding left u just past the last peer
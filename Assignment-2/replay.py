@@ -0,0 +1,163 @@
+import json
+import numpy as np
+from evtrace import TraceWriter, TraceReader, CHUNK
+from simulation import GEN_TX, RECV_TX, NUM_OPCODES
+
+# One handled event of a run
+EVENT = np.dtype([
+    ('time', np.float64),
+    ('op', np.uint8),
+    ('peer', np.int32),     # peer handling the event, -1 for none
+    ('key', np.int64),      # Block.serial, Transaction.num or receiver ID of the message, -1 for none
+])
+
+
+def msgkey(op, msg):
+    """
+    Key a message is recorded under.
+
+    Args:
+        op (int): Event opcode.
+        msg: Message of the event.
+
+    Returns:
+        int: Receiver ID for GEN_TX, Tx number for RECV_TX, block serial otherwise, -1 without a message.
+    """
+    if msg is None:
+        return -1
+    if op == GEN_TX:
+        return msg.ID
+    if op == RECV_TX:
+        return msg.num
+    return msg.serial
+
+
+class Recorder:
+    """
+    Writes every handled event of a live run, to be replayed later, together with the run's
+    arguments next to it so a replay can check it rebuilds the same network.
+
+    Attributes:
+        writer (TraceWriter): Event file.
+    """
+
+    def __init__(self, path, args):
+        """
+        Creates the event file and FILE.json with the arguments.
+
+        Args:
+            path (str): Event file.
+            args (dict): Arguments of the run.
+        """
+        self.writer = TraceWriter(path, dtype=EVENT)
+        with open(path + '.json', 'w') as f:
+            json.dump(args, f)
+
+    def __call__(self, ts, op, peer, msg):
+        self.writer.append((ts, op, peer.ID if peer is not None else -1, msgkey(op, msg)))
+
+    def close(self):
+        self.writer.close()
+
+
+class Replay:
+    """
+    Drives the handlers of a freshly built network with the events recorded from a run.
+    No event is scheduled and no delay or mining time is sampled: handlers run on a NullScheduler,
+    peers skip flooding, and the outcome of every scheduling decision is read from the recording.
+    Everything else the handlers do draws from the same seeded streams in the same order as the
+    recorded run, so blocks and Tx come out the same and are matched to the recording by creation order.
+
+    Attributes:
+        events (TraceReader): Recorded events.
+        pos (int): Index of the next event to replay.
+        peers (list): All peers, indexed by ID.
+        handlers (list): Handler for every opcode.
+        blocks (dict): Blocks made so far, by serial.
+        txs (dict): Tx made so far, by number.
+        now (float): Time of the last replayed event.
+    """
+
+    def __init__(self, path, peers, handlers, clock=None, start=0):
+        """
+        Opens a recording.
+
+        Args:
+            path (str): Event file written by Recorder.
+            peers (list): All peers, indexed by ID.
+            handlers (dict): Mapping of opcodes to handlers.
+            clock (callable, optional): Called with the timestamp of every event. Defaults to None.
+            start (int, optional): Index of the first event, for a network restored at that point. Defaults to 0.
+        """
+        self.events = TraceReader(path, dtype=EVENT)
+        self.pos = start
+        self.peers = peers
+        self.handlers = [handlers.get(op) for op in range(NUM_OPCODES)]
+        self.clock = clock
+        self.blocks = {}
+        self.txs = {}
+        self.now = 0
+
+    @staticmethod
+    def args(path):
+        """
+        Arguments of the recorded run.
+
+        Args:
+            path (str): Event file written by Recorder.
+
+        Returns:
+            dict: The arguments.
+        """
+        with open(path + '.json') as f:
+            return json.load(f)
+
+    def register(self, obj):
+        """
+        Makes a new block or Tx known to the replay, called where they are made.
+
+        Args:
+            obj (Block or Transaction): The new object.
+        """
+        if hasattr(obj, 'serial'):
+            self.blocks[obj.serial] = obj
+        else:
+            self.txs[obj.num] = obj
+
+    def run(self, until=None, limit=None):
+        """
+        Replays recorded events in order.
+
+        Args:
+            until (float, optional): Stop before the first event later than this time. Defaults to the end.
+            limit (int, optional): Stop after these many events. Defaults to no limit.
+
+        Returns:
+            int: Number of events replayed.
+        """
+        handlers = self.handlers
+        peers = self.peers
+        blocks = self.blocks
+        txs = self.txs
+        clock = self.clock
+        n = 0
+        events = self.events
+        while self.pos < len(events):
+            for ts, op, pid, key in events[self.pos:self.pos + CHUNK].tolist():
+                if (until is not None and ts > until) or n == limit:
+                    return n
+                if key < 0:
+                    msg = None
+                elif op == GEN_TX:
+                    msg = peers[key]
+                elif op == RECV_TX:
+                    msg = txs[key]
+                else:
+                    msg = blocks[key]
+                self.now = ts
+                if clock is not None:
+                    clock(ts)
+                handlers[op](ts, peers[pid] if pid >= 0 else None, msg, [])
+                self.pos += 1
+                n += 1
+        return n
@@ -0,0 +1,282 @@
+import random
+import numpy as np
+
+BUFFER_SIZE = 4096  # Samples drawn per vectorized refill
+
+
+class RandomStream:
+    """
+    Buffered random numbers from one numpy Generator.
+    Samples are drawn BUFFER_SIZE at a time in one vectorized call and handed out one by one,
+    so a single draw costs a list index instead of a full numpy call.
+    Exponentials of any mean are scaled standard exponentials, so one buffer serves every mean.
+    Pickled streams leave their buffers out and draw them again from the generator state they
+    were filled from, so a checkpoint holds a few numbers instead of two full buffers.
+
+    Attributes:
+        gen (numpy.random.Generator): Generator the buffers are filled from.
+        size (int): Samples per refill.
+        expstate (dict): Generator state the exponential buffer was filled from, None before the first fill.
+        unistate (dict): Generator state the uniform buffer was filled from, None before the first fill.
+    """
+
+    def __init__(self, gen, size=BUFFER_SIZE):
+        """
+        Initializes a stream with empty buffers.
+
+        Args:
+            gen (numpy.random.Generator): Generator for this stream.
+            size (int, optional): Samples per refill. Defaults to BUFFER_SIZE.
+        """
+        self.gen = gen
+        self.size = size
+        self.expbuf = []
+        self.expi = 0
+        self.unibuf = []
+        self.unii = 0
+        self.expstate = None
+        self.unistate = None
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state['expbuf'], state['unibuf']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.expbuf = self.fill(self.expstate).standard_exponential(self.size).tolist() if self.expstate else []
+        self.unibuf = self.fill(self.unistate).random(self.size).tolist() if self.unistate else []
+
+    @staticmethod
+    def fill(state):
+        """
+        Generator at a saved state, to draw a buffer again.
+
+        Args:
+            state (dict): Bit generator state.
+
+        Returns:
+            numpy.random.Generator: The generator.
+        """
+        bitgen = np.random.PCG64()
+        bitgen.state = state
+        return np.random.Generator(bitgen)
+
+    def exponential(self, scale=1.0):
+        """
+        One exponentially distributed sample.
+
+        Args:
+            scale (float, optional): Mean of the distribution. Defaults to 1.0.
+
+        Returns:
+            float: Sample.
+        """
+        if self.expi == len(self.expbuf):
+            self.expstate = self.gen.bit_generator.state
+            self.expbuf = self.gen.standard_exponential(self.size).tolist()
+            self.expi = 0
+        x = self.expbuf[self.expi]
+        self.expi += 1
+        return x * scale
+
+    def random(self):
+        """
+        One uniform sample from [0, 1).
+
+        Returns:
+            float: Sample.
+        """
+        if self.unii == len(self.unibuf):
+            self.unistate = self.gen.bit_generator.state
+            self.unibuf = self.gen.random(self.size).tolist()
+            self.unii = 0
+        x = self.unibuf[self.unii]
+        self.unii += 1
+        return x
+
+    def uniform(self, low, high):
+        """
+        One uniform sample from [low, high).
+
+        Args:
+            low (float): Lower bound.
+            high (float): Upper bound.
+
+        Returns:
+            float: Sample.
+        """
+        return low + (high - low) * self.random()
+
+    def reseed(self, seq):
+        """
+        Restarts the stream from a new seed, dropping buffered samples. The Generator object stays
+        the same, so everything holding it draws from the new seed too.
+
+        Args:
+            seq (numpy.random.SeedSequence): New seed.
+        """
+        self.gen.bit_generator.state = np.random.PCG64(seq).state
+        self.expbuf = []
+        self.expi = 0
+        self.unibuf = []
+        self.unii = 0
+        self.expstate = None
+        self.unistate = None
+
+
+class ExponentialIterator:
+    """
+    Iterator of exponentially distributed times with a fixed mean, drawn from a shared stream.
+
+    Attributes:
+        mean (float): Mean of the exponential distribution.
+        stream (RandomStream): Stream the samples come from.
+    """
+
+    def __init__(self, mean, stream):
+        """
+        Initializes the iterator.
+
+        Args:
+            mean (float): Mean of the exponential distribution.
+            stream (RandomStream): Stream the samples come from.
+        """
+        self.mean = mean
+        self.stream = stream
+
+    def __iter__(self):
+        return self
+
+    def __next__(self):
+        return self.stream.exponential(self.mean)
+
+
+class ReceiverSampler:
+    """
+    Picks the receiver of a new Tx among all peers except the sender in O(1).
+    Uniform picks map one buffered uniform onto the n-1 other peers. With a Zipf exponent,
+    peers get hot-account weights 1/rank^s over a random ranking and are picked through an
+    alias table, redrawing when the sender itself comes up.
+
+    Attributes:
+        n (int): Number of peers.
+        stream (RandomStream): Stream the picks come from.
+        prob (list): Alias table acceptance probabilities, None for uniform picks.
+        alias (list): Alias table fallbacks, None for uniform picks.
+    """
+
+    def __init__(self, n, stream, zipf=None):
+        """
+        Initializes the sampler.
+
+        Args:
+            n (int): Number of peers.
+            stream (RandomStream): Stream the picks come from.
+            zipf (float, optional): Zipf exponent of receiver popularity, None for uniform. Defaults to None.
+        """
+        self.n = n
+        self.stream = stream
+        self.prob = None
+        self.alias = None
+        if zipf is not None:
+            ranks = stream.gen.permutation(n) + 1          # random ranking of hot accounts
+            w = 1.0 / ranks.astype(np.float64) ** zipf
+            self.prob, self.alias = alias_table(w / w.sum())
+
+    def pick(self, sender):
+        """
+        Receiver for a Tx.
+
+        Args:
+            sender (int): ID of the sender.
+
+        Returns:
+            int: ID of the receiver, never the sender.
+        """
+        if self.prob is None:
+            r = int(self.stream.random() * (self.n - 1))
+            return r + 1 if r >= sender else r
+        while True:
+            u = self.stream.random() * self.n
+            i = int(u)
+            r = i if u - i < self.prob[i] else self.alias[i]
+            if r != sender:
+                return r
+
+
+def alias_table(p):
+    """
+    Walker alias table for sampling from a discrete distribution in O(1).
+
+    Args:
+        p (numpy.ndarray): Probabilities summing to 1.
+
+    Returns:
+        tuple: Acceptance probabilities and alias indices, as lists.
+    """
+    n = len(p)
+    prob = (p * n).tolist()
+    alias = list(range(n))
+    small = [i for i in range(n) if prob[i] < 1.0]
+    large = [i for i in range(n) if prob[i] >= 1.0]
+    while small and large:
+        s = small.pop()
+        l = large.pop()
+        alias[s] = l
+        prob[l] = prob[l] + prob[s] - 1.0
+        (small if prob[l] < 1.0 else large).append(l)
+    for i in small + large:
+        prob[i] = 1.0
+    return prob, alias
+
+
+class RandomStreams:
+    """
+    All random streams of one simulation, derived from a single seed.
+    Every stream gets its own child of the seed so adding draws to one leaves the others unchanged.
+
+    Attributes:
+        seed (int): Seed the streams were derived from.
+        txn (RandomStream): Tx interarrival times.
+        blk (RandomStream): Block mining times.
+        link (RandomStream): Propagation and queuing delays of links.
+        net (numpy.random.Generator): Network setup (slow peers, topology).
+        rcv (RandomStream): Receivers of new Tx.
+        py (random.Random): Tx amounts and block IDs.
+        txprop (numpy.random.Generator): Queuing delays of analytic Tx propagation.
+    """
+
+    def __init__(self, seed=None):
+        """
+        Initializes all streams from one seed.
+
+        Args:
+            seed (int, optional): Simulation seed. Defaults to fresh entropy.
+        """
+        ss = np.random.SeedSequence(seed)
+        self.seed = ss.entropy
+        txn, blk, link, net, py, rcv, txprop = ss.spawn(7)
+        self.txn = RandomStream(np.random.Generator(np.random.PCG64(txn)))
+        self.blk = RandomStream(np.random.Generator(np.random.PCG64(blk)))
+        self.link = RandomStream(np.random.Generator(np.random.PCG64(link)))
+        self.net = np.random.Generator(np.random.PCG64(net))
+        self.rcv = RandomStream(np.random.Generator(np.random.PCG64(rcv)))
+        self.py = random.Random(int(py.generate_state(1)[0]))
+        self.txprop = np.random.Generator(np.random.PCG64(txprop))
+
+    def reseed(self, seed=None):
+        """
+        Restarts every stream from a new seed, e.g. for several different futures of one checkpoint.
+
+        Args:
+            seed (int, optional): New seed. Defaults to fresh entropy.
+        """
+        ss = np.random.SeedSequence(seed)
+        self.seed = ss.entropy
+        txn, blk, link, net, py, rcv, txprop = ss.spawn(7)
+        for stream, seq in ((self.txn, txn), (self.blk, blk), (self.link, link), (self.rcv, rcv)):
+            stream.reseed(seq)
+        self.net.bit_generator.state = np.random.PCG64(net).state
+        self.txprop.bit_generator.state = np.random.PCG64(txprop).state
+        self.py.seed(int(py.generate_state(1)[0]))
@@ -0,0 +1,227 @@
+import argparse
+import csv
+import itertools
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import numpy as np
+from log import log
+from main import P2PSimulation
+from simulation import SCHEDULERS
+from topology import TOPOLOGIES
+
+# Arguments of a run and how they are read back from the results table, a run is identified by all of them
+KEYS = [('n', int), ('Ttx', float), ('Tk', float), ('C1', float), ('C2', float), ('N', int), ('seed', int),
+        ('topology', str), ('zipf', lambda v: float(v) if v else None), ('race', lambda v: v == 'True'),
+        ('analytic_tx', lambda v: v == 'True'), ('bloom', lambda v: int(v) if v else None)]
+GRID = ('n', 'Ttx', 'Tk', 'C1', 'C2', 'N')  # arguments swept over, the rest are the same for every run
+# Summary of a run, as seen by the first honest peer at the end, see metrics.py
+METRICS = ['time',          # simulated time the run ended at
+           'blocks',        # blocks made by all peers
+           'mainchain',     # blocks in the main chain, without genesis
+           'a1_main',       # blocks of attacker 1 in the main chain
+           'a1_mined',      # blocks mined by attacker 1
+           'a2_main',
+           'a2_mined',
+           'share1',        # attacker 1 fraction of main chain blocks, its revenue share
+           'share2',
+           'mpu1',          # attacker 1 blocks in the main chain out of the ones it mined
+           'mpu2',
+           'mpu_overall',   # main chain blocks out of all blocks
+           'events',        # events scheduled
+           'wall']          # seconds the run took
+
+
+def ratio(a, b):
+    return a / b if b else float('nan')
+
+
+def runpoint(point):
+    """
+    Runs one simulation to the end and sums it up, called in a worker process.
+
+    Args:
+        point (dict): Arguments of the run, by the names in KEYS, plus the scheduler.
+
+    Returns:
+        dict: The arguments and the METRICS of the run.
+    """
+    start = time.perf_counter()
+    sim = P2PSimulation(point['n'], point['Ttx'], point['Tk'], point['C1'], point['C2'], point['N'], point['bloom'],
+                        point['seed'], point['topology'], point['zipf'], point['race'], point['analytic_tx'],
+                        SCHEDULERS[point['scheduler']]())
+    sim.run()
+    m = sim.metrics.snapshot()
+    row = {k: point[k] for k, _ in KEYS}
+    row.update(time=sim.now, blocks=m['blocks'], mainchain=m['mainchain'],
+               a1_main=m['main0'], a1_mined=m['mined0'], a2_main=m['main1'], a2_mined=m['mined1'],
+               share1=m['share0'], share2=m['share1'], mpu1=m['mpu0'], mpu2=m['mpu1'],
+               mpu_overall=ratio(m['mainchain'], m['blocks']), events=sim.queue.stats()['pushed'],
+               wall=time.perf_counter() - start)
+    return row
+
+
+def runkey(point):
+    return tuple(point[k] for k, _ in KEYS)
+
+
+def quiet():
+    log.configure(stream=None)              # workers write nothing, the parent reports progress
+
+
+class Results:
+    """
+    Results table of a sweep as a CSV file, one row per finished run, flushed as each run finishes.
+    Rows already in the file are runs a resumed sweep skips.
+
+    Attributes:
+        path (str): CSV file.
+        rows (dict): Rows read back or written so far, by runkey().
+    """
+
+    def __init__(self, path):
+        """
+        Opens a results table, reading the rows of an earlier sweep when the file exists.
+        A row cut short by a killed sweep is dropped, that run is done again.
+
+        Args:
+            path (str): CSV file, created if missing.
+        """
+        self.path = path
+        self.rows = {}
+        fields = [k for k, _ in KEYS] + METRICS
+        if os.path.exists(path):
+            with open(path, newline='') as f:
+                text = f.read()
+            if text and not text.endswith('\n'):
+                text = text[:text.rfind('\n') + 1]
+                with open(path, 'w', newline='') as f:
+                    f.write(text)
+            reader = csv.DictReader(text.splitlines())
+            if reader.fieldnames is not None and reader.fieldnames != fields:
+                raise ValueError(f'{path} has other columns than a results table of this version')
+            for row in reader:
+                point = {k: conv(row[k]) for k, conv in KEYS}
+                row.update(point)
+                for m in METRICS:
+                    row[m] = float(row[m])
+                self.rows[runkey(point)] = row
+        self.file = open(path, 'a', newline='')
+        self.writer = csv.DictWriter(self.file, fields)
+        if self.file.tell() == 0:
+            self.writer.writeheader()
+            self.file.flush()
+
+    def __contains__(self, point):
+        return runkey(point) in self.rows
+
+    def add(self, row):
+        """
+        Writes the row of a finished run.
+
+        Args:
+            row (dict): Arguments and METRICS of the run.
+        """
+        self.rows[runkey(row)] = row
+        self.writer.writerow({k: '' if v is None else v for k, v in row.items()})
+        self.file.flush()
+
+    def close(self):
+        self.file.close()
+
+
+def grid(values, seeds, fixed):
+    """
+    Every run of a sweep, the seeds of one grid point inner most.
+
+    Args:
+        values (dict): Values of every GRID argument.
+        seeds (list): Seeds run at every grid point.
+        fixed (dict): Arguments that are the same for every run.
+
+    Returns:
+        list: Arguments of every run.
+    """
+    points = []
+    for combo in itertools.product(*(values[k] for k in GRID)):
+        for seed in seeds:
+            points.append(dict(zip(GRID, combo), seed=seed, **fixed))
+    return points
+
+
+def summary(rows, out=sys.stdout):
+    """
+    Writes the mean and standard deviation over the seeds of every grid point.
+
+    Args:
+        rows (list): Rows of the runs to sum up.
+        out (file, optional): Where to write. Defaults to sys.stdout.
+    """
+    groups = {}
+    for row in rows:
+        groups.setdefault(tuple(row[k] for k in GRID), []).append(row)
+    out.write(' '.join(f'{k:>7}' for k in GRID) + f" {'runs':>5} {'share1':>15} {'share2':>15} {'mpu1':>6} {'mpu2':>6} {'stale':>6}\n")
+    for key in sorted(groups):
+        rs = groups[key]
+        cols = {m: np.array([r[m] for r in rs], dtype=float) for m in ('share1', 'share2', 'mpu1', 'mpu2', 'mpu_overall')}
+        out.write(' '.join(f'{v:>7g}' for v in key) + f' {len(rs):>5}'
+                  + ''.join(f' {np.nanmean(cols[m]):>7.3f}±{np.nanstd(cols[m]):<7.3f}' for m in ('share1', 'share2'))
+                  + ''.join(f' {np.nanmean(cols[m]):>6.3f}' for m in ('mpu1', 'mpu2'))
+                  + f' {1 - np.nanmean(cols["mpu_overall"]):>6.3f}\n')
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Run main.py simulations over a parameter grid in parallel')
+    parser.add_argument('--n', type=int, nargs='+', default=[10], help='Numbers of peers')
+    parser.add_argument('--Ttx', type=float, nargs='+', default=[100.0], help='Mean times between Tx')
+    parser.add_argument('--Tk', type=float, nargs='+', default=[600.0], help='Mean times between blocks')
+    parser.add_argument('--C1', type=float, nargs='+', default=[30.0], help='Mining powers of attacker 1')
+    parser.add_argument('--C2', type=float, nargs='+', default=[30.0], help='Mining powers of attacker 2')
+    parser.add_argument('--N', type=int, nargs='+', default=[100], help='Numbers of mining events per run')
+    parser.add_argument('--seeds', type=int, default=5, help='Runs per grid point')
+    parser.add_argument('--seed-base', type=int, default=0, help='Seed of the first run of every grid point, the others follow')
+    parser.add_argument('--bloom', type=int, default=None, help='Track seen Tx IDs in Bloom filters of this capacity per peer')
+    parser.add_argument('--topology', default='random', choices=sorted(TOPOLOGIES), help='Network topology')
+    parser.add_argument('--zipf', type=float, default=None, help='Pick Tx receivers with Zipf popularity of this exponent')
+    parser.add_argument('--race', action='store_true', help='Draw the next block time once for the whole network')
+    parser.add_argument('--analytic-tx', action='store_true', help='Compute Tx arrival times instead of flooding Tx hop by hop')
+    parser.add_argument('--scheduler', default='heap', choices=sorted(SCHEDULERS), help='Event queue backend')
+    parser.add_argument('--out', default='sweep.csv', help='Results table, runs already in it are skipped')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count(), help='Worker processes')
+    args = parser.parse_args()
+
+    fixed = {'topology': args.topology, 'zipf': args.zipf, 'race': args.race, 'analytic_tx': args.analytic_tx,
+             'bloom': args.bloom, 'scheduler': args.scheduler}
+    seeds = list(range(args.seed_base, args.seed_base + args.seeds))
+    points = grid({k: getattr(args, k) for k in GRID}, seeds, fixed)
+    try:
+        results = Results(args.out)
+    except ValueError as e:
+        parser.error(str(e))
+    todo = [p for p in points if p not in results]
+    print(f'{len(points)} runs, {len(points) - len(todo)} already in {args.out}, {len(todo)} to go on {args.jobs} workers')
+    quiet()
+    failed = 0
+    start = time.perf_counter()
+    try:
+        with ProcessPoolExecutor(args.jobs, initializer=quiet) as pool:
+            futures = {pool.submit(runpoint, p): p for p in todo}
+            for i, fut in enumerate(as_completed(futures), 1):
+                p = futures[fut]
+                name = ' '.join(f'{k}={p[k]}' for k in GRID + ('seed',))
+                try:
+                    row = fut.result()
+                except Exception as e:                          # the run is not in the table and is tried again on resume
+                    failed += 1
+                    print(f'[{i}/{len(todo)}] {name} failed: {e!r}', file=sys.stderr)
+                    continue
+                results.add(row)
+                print(f"[{i}/{len(todo)}] {name}: share1 {row['share1']:.3f} share2 {row['share2']:.3f} in {row['wall']:.1f}s")
+    except KeyboardInterrupt:
+        print(f'Interrupted, rerun the same command to go on from {args.out}', file=sys.stderr)
+        sys.exit(1)
+    finally:
+        results.close()
+    print(f'{len(todo) - failed} runs in {time.perf_counter() - start:.1f}s' + (f', {failed} failed' if failed else ''))
+    summary([results.rows[runkey(p)] for p in points if p in results])
@@ -0,0 +1,100 @@
+import json
+import os
+
+import pytest
+
+from checkpoint import BASE, Checkpointer, chain, indices, segment
+from main import P2PSimulation, Peer, Transaction
+
+ARGS = (20, 50, 400, 25, 20, 40)
+EVERY = 800
+
+
+def ending(sim):
+    """
+    End state of a run by numeric IDs: every peer's chain, balance and tip, Tx made and the pool.
+    """
+    blocks = sim.network.store.blocks
+    num = lambda blkid: blocks[blkid].num if blkid in blocks else None
+    chains = [(sorted((num(b), num(blocks[b].plink), t, [tx.num for tx in blocks[b].Txlist]) for b, t in peer.localchain.blktime.items()),
+               peer.balance, num(peer.localchain.lastplink)) for peer in sim.network.all_peers]
+    return chains, sim.ntx, sorted(tx.num for tx in sim.UTX)
+
+
+def checkpointer(directory, sim, base=None):
+    return Checkpointer(directory, Transaction, {'link': sim.network.link, 'adj': sim.network.adj}, base)
+
+
+@pytest.fixture(scope='module')
+def run(tmp_path_factory):
+    directory = str(tmp_path_factory.mktemp('ckpt'))
+    sim = P2PSimulation(*ARGS, seed=3)
+    sim.run(ckpt=checkpointer(directory, sim), every=EVERY, args={})
+    return directory, ending(sim)
+
+
+def test_diff_sends_only_changes():
+    ckpt = Checkpointer.__new__(Checkpointer)
+    ckpt.shadow = {}
+    a, b, c = object(), object(), object()
+    d = {'a': a, 'b': b, 'l': [1]}
+    assert ckpt.diff('d', d) == ({'a': a, 'b': b, 'l': [1]}, [])
+    assert ckpt.diff('d', d) is None
+    d['b'] = c                                              # changed
+    d['l'].append(2)                                        # grew
+    del d['a']                                              # removed
+    d['n'] = a                                              # added
+    assert ckpt.diff('d', d) == ({'b': c, 'l': [1, 2], 'n': a}, ['a'])
+    del d['n'], d['l']
+    changed, removed = ckpt.diff('d', d)
+    assert changed == {} and sorted(removed) == ['l', 'n']
+    assert ckpt.diff('d', d) is None
+    assert ckpt.diff('empty', {}) is None
+
+
+@pytest.mark.parametrize('k', [1, 3])
+def test_resume_ends_like_the_uninterrupted_run(run, k):
+    directory, expected = run
+    state, _ = Checkpointer.restore(directory, k, Peer)
+    sim = state['sim']
+    assert sim.at == (k + 1) * EVERY
+    sim.run()
+    assert ending(sim) == expected
+
+
+def test_segments_are_incremental(run, tmp_path):
+    directory, _ = run
+    own = indices(directory)
+    assert own == list(range(len(own))) and len(own) > 3
+    last = own[-1]
+    state, _ = Checkpointer.restore(directory, last, Peer)
+    sim = state['sim']
+    whole = checkpointer(str(tmp_path), sim).save(sim.at, {'sim': sim, 'args': {}}, sim.network.all_peers,
+                                                   sim.network.store.blocks, sim.checkpointdicts())
+    assert os.path.getsize(segment(directory, last)) * 2 < os.path.getsize(whole)   # only what changed since the one before
+    again, _ = Checkpointer.restore(str(tmp_path), 0, Peer)
+    again['sim'].run()
+    resumed, _ = Checkpointer.restore(directory, last, Peer)
+    resumed['sim'].run()
+    assert ending(again['sim']) == ending(resumed['sim'])
+
+
+def test_fork_reads_the_segments_of_its_parent(run, tmp_path):
+    directory, expected = run
+    fork = str(tmp_path / 'fork')
+    state, base = Checkpointer.restore(directory, 1, Peer)
+    sim = state['sim']
+    sim.run(ckpt=checkpointer(fork, sim, base), every=EVERY, args={})
+    assert ending(sim) == expected
+    with open(os.path.join(fork, BASE)) as f:
+        assert json.load(f) == {'dir': os.path.abspath(directory), 'index': 1}
+    own = indices(fork)
+    assert own[0] == 2
+    assert chain(fork, own[0]) == [segment(directory, 0), segment(directory, 1), segment(fork, 2)]
+    assert chain(fork, 1) == [segment(directory, 0), segment(directory, 1)]
+    for k in (1, own[0]):
+        state, _ = Checkpointer.restore(fork, k, Peer)
+        state['sim'].run()
+        assert ending(state['sim']) == expected
+    with pytest.raises(ValueError):
+        checkpointer(fork, sim)                             # already holds checkpoints
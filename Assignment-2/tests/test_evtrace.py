@@ -0,0 +1,24 @@
+import numpy as np
+
+from evtrace import TraceReader, TraceWriter, BLK_RECV, TX_GEN
+
+LAYOUT = np.dtype([('etype', np.uint8), ('peer', np.int32), ('obj', np.int64), ('extra', np.float32)])
+
+
+def test_select(tmp_path):
+    path = str(tmp_path / 'trace')
+    with TraceWriter(path, chunk=3) as w:
+        for i in range(10):
+            w.record(TX_GEN if i % 2 else BLK_RECV, float(i), i % 3, i)
+    trace = TraceReader(path)
+    assert len(trace) == 10
+    got = trace.select(TX_GEN, peer=1, size=4)
+    assert list(got['obj']) == [1, 7]
+    assert len(trace.select(obj=99)) == 0
+
+
+def test_empty_select_keeps_the_layout(tmp_path):
+    path = str(tmp_path / 'trace')
+    TraceWriter(path, dtype=LAYOUT).close()
+    trace = TraceReader(path, dtype=LAYOUT)
+    assert trace.select(etype=1).dtype == LAYOUT
@@ -0,0 +1,91 @@
+import random
+
+from ledger import INITIAL_BAL, Ledger
+
+GENESIS = 'genesis'
+
+
+def fullcopy(parent, txs, miner):
+    """
+    Balances after a block the way Blockchain.getbal kept them before the ledger, a full dict per block.
+    """
+    bal = parent.copy()
+    for sender, receiver, amount in txs:
+        bal.setdefault(receiver, INITIAL_BAL)
+        bal.setdefault(sender, INITIAL_BAL)
+        bal[receiver] += amount
+        bal[sender] -= amount
+    bal.setdefault(miner, INITIAL_BAL)
+    bal[miner] += 50
+    return bal
+
+
+def grow(ledger, blkid, plink, txs, miner):
+    view = ledger.view(plink)
+    for sender, receiver, amount in txs:
+        view[receiver] = view[receiver] + amount
+        view[sender] = view[sender] - amount
+    view[miner] = view[miner] + 50
+    ledger.add(blkid, plink, view)
+
+
+def test_matches_full_copies_on_a_forked_tree():
+    rng = random.Random(7)
+    k = 8
+    ledger = Ledger(GENESIS, k)
+    full = {GENESIS: {}}
+    blocks = [GENESIS]
+    for i in range(300):
+        plink = blocks[-1] if rng.random() < 0.7 else rng.choice(blocks)  # mostly a chain, with forks off older blocks
+        txs = [(rng.randrange(40), rng.randrange(40), rng.randint(1, 20)) for _ in range(rng.randrange(6))]
+        miner = rng.randrange(40)
+        blkid = f'b{i}'
+        grow(ledger, blkid, plink, txs, miner)
+        full[blkid] = fullcopy(full[plink], txs, miner)
+        blocks.append(blkid)
+    assert max(ledger.depth.values()) > 3 * k              # several snapshots deep
+    assert len(ledger.full) > 3
+    for blkid in blocks:
+        assert ledger.materialize(blkid) == full[blkid]
+        assert ledger.naccounts[blkid] == len(full[blkid])
+        for acct in range(41):
+            assert ledger.lookup(blkid, acct) == full[blkid].get(acct)
+            assert ledger.balance(blkid, acct) == full[blkid].get(acct, INITIAL_BAL)
+    assert ledger.entries() < sum(map(len, full.values()))
+
+
+def test_snapshot_boundary():
+    ledger = Ledger(GENESIS)
+    plink = GENESIS
+    for i in range(1, 2 * ledger.k + 2):
+        grow(ledger, i, plink, [(0, i % 5 + 1, 1)], 0)
+        plink = i
+    snaps = sorted(b for b in ledger.full if b != GENESIS)
+    assert snaps == [ledger.k - 1, 2 * ledger.k - 1]           # genesis is at depth 1
+    before, at, after = snaps[0] - 1, snaps[0], snaps[0] + 1
+    assert len(ledger.bal[before]) <= 2 and len(ledger.bal[after]) <= 2
+    for blkid in (before, at, after):
+        expected = {0: INITIAL_BAL - blkid + 50 * blkid}
+        for i in range(1, blkid + 1):
+            expected[i % 5 + 1] = expected.get(i % 5 + 1, INITIAL_BAL) + 1
+        assert ledger.materialize(blkid) == expected
+        assert ledger.balance(blkid, 0) == expected[0]
+
+
+def test_view_is_copy_on_write():
+    ledger = Ledger(GENESIS)
+    grow(ledger, 'a', GENESIS, [(1, 2, 30)], 3)
+    view = ledger.view('a')
+    assert (view[1], view[2], view[3], view[4]) == (70, 130, 150, INITIAL_BAL)
+    view[1] = 0
+    view[4] = 5                                             # unknown at 'a'
+    view[4] = 6
+    assert (view[1], view[4]) == (0, 6)
+    assert view.new == 1
+    assert ledger.balance('a', 1) == 70 and ledger.lookup('a', 4) is None
+    other = ledger.view('a')
+    assert other[1] == 70                                   # views on one block do not share writes
+    ledger.add('b', 'a', view)
+    assert ledger.materialize('b') == {1: 0, 2: 130, 3: 150, 4: 6}
+    assert ledger.naccounts['b'] == 4
+    assert ledger.materialize('a') == {1: 70, 2: 130, 3: 150}
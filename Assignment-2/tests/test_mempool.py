@@ -0,0 +1,64 @@
+from types import SimpleNamespace
+
+from mempool import Mempool
+
+
+class Tx:
+    """
+    Stand-in for main.Transaction that counts how often select looks at it.
+    """
+    looked = 0
+
+    def __init__(self, num, sender, amount, timestamp=None):
+        self.txid = f'tx{num}'
+        self.num = num
+        self.sender = SimpleNamespace(ID=sender)
+        self.amount = amount
+        self.timestamp = num if timestamp is None else timestamp
+        self.born = 0.0
+        self._arrival = None
+
+    @property
+    def arrival(self):
+        Tx.looked += 1
+        return self._arrival
+
+
+def test_mostly_unspendable_pool():
+    pool = Mempool()
+    num = 0
+    for sender in range(10):
+        for _ in range(1000):
+            pool.add(Tx(num, sender, 50))               # more than any sender has
+            num += 1
+    small = [Tx(num + i, i % 10, 3) for i in range(20)]
+    pool.update(small)
+    Tx.looked = 0
+    picked = pool.select([10] * 10, 999, float('inf'))
+    assert picked == small                              # each sender pays two Tx of 3 coins out of 10
+    assert Tx.looked == len(small)
+
+
+def test_oldest_first_after_readd():
+    pool = Mempool()
+    old = Tx(0, 0, 4)
+    new = Tx(1, 0, 4)
+    pool.add(old)
+    pool.add(new)
+    pool.remove(old)                                    # picked for a block that was then dropped
+    pool.update([old])
+    assert pool.select([5], 999, float('inf')) == [old]
+    assert pool.select([8], 1, float('inf')) == [old]
+
+
+def test_remove_and_limits():
+    pool = Mempool()
+    txs = [Tx(i, i % 3, 1 + i % 4) for i in range(30)]
+    pool.update(txs)
+    for tx in txs[::2]:
+        pool.remove(tx)
+    assert len(pool) == 15
+    assert all(tx not in pool for tx in txs[::2])
+    picked = pool.select([100] * 3, 4, 20)
+    assert picked == [tx for tx in txs[1:21:2]][:4]
+    assert pool.select([0] * 3, 999, float('inf')) == []
@@ -0,0 +1,79 @@
+from types import SimpleNamespace
+
+import pytest
+
+from blockchain import Block, Blockchain, BlockStore
+from metrics import Metrics
+
+
+def network(n=3):
+    """
+    Network of n peers sharing one block store, with the sim clock Metrics reads.
+    """
+    store = BlockStore()
+    peers = [SimpleNamespace(ID=i, is_slow=False, localchain=Blockchain(store)) for i in range(n)]
+    sim = SimpleNamespace(now=0.0, network=SimpleNamespace(n=n, all_peers=peers, store=store))
+    return sim, Metrics(sim)
+
+
+def block(name, parent, miner, txs=()):
+    blk = Block(list(txs), miner, parent.blkid)
+    blk.blkid = name                                    # readable and never colliding
+    return blk
+
+
+def test_reorg_takes_back_and_measures_again():
+    sim, metrics = network()
+    conf = metrics.confirmations
+    conf.k = 2
+    observer = metrics.observer
+    chain = observer.localchain
+    alice, bob = sim.network.all_peers[:2]
+    tx = SimpleNamespace(born=0.0, sender=alice, receiver=bob, amount=5)
+
+    def arrive(blk, t):
+        sim.now = t
+        assert chain.AddBlock(blk, t)
+
+    a1 = block('a1', chain.genesisblk, alice, [tx])
+    a2 = block('a2', a1, alice)
+    arrive(a1, 10.0)
+    assert conf.confirmed.n == 0                        # only one block deep
+    arrive(a2, 20.0)
+    assert (conf.included.n, conf.confirmed.n) == (1, 1)
+    assert conf.included.quantile(1.0) == pytest.approx(10.0, rel=0.1)
+    assert conf.confirmed.quantile(1.0) == pytest.approx(20.0, rel=0.1)
+    assert conf.chain[1] == [a1, 10.0, 20.0]
+
+    b1 = block('b1', chain.genesisblk, bob, [tx])       # the same Tx on a fork
+    b2 = block('b2', b1, bob)
+    b3 = block('b3', b2, bob)
+    arrive(b1, 25.0)
+    arrive(b2, 30.0)                                    # as long as the main chain, which arrived first
+    assert chain.tip is a2 and metrics.reorgs == 0
+    arrive(b3, 40.0)
+    assert chain.tip is b3 and metrics.reorgs == 1 and metrics.dropped == 2
+    assert conf.undone == 1
+    assert [entry[0] for entry in conf.chain] == [chain.genesisblk, b1, b2, b3]
+    assert conf.chain[1] == [b1, 40.0, 40.0]            # joined and got 2 deep when the branch took over
+    assert conf.chain[3] == [b3, 40.0, None]
+    assert (conf.included.n, conf.confirmed.n) == (1, 1)    # the Tx measured again, not twice
+    assert conf.included.quantile(1.0) == pytest.approx(40.0, rel=0.1)
+    assert conf.confirmed.quantile(1.0) == pytest.approx(40.0, rel=0.1)
+
+
+def test_reorg_before_k_deep_undoes_nothing():
+    sim, metrics = network()
+    conf = metrics.confirmations
+    conf.k = 3
+    chain = metrics.observer.localchain
+    miner = sim.network.all_peers[0]
+    a1 = block('a1', chain.genesisblk, miner)
+    b1 = block('b1', chain.genesisblk, miner)
+    b2 = block('b2', b1, miner)
+    for t, blk in enumerate((a1, b1, b2), 1):
+        sim.now = float(t)
+        chain.AddBlock(blk, float(t))
+    assert chain.tip is b2 and metrics.reorgs == 1
+    assert conf.undone == 0 and conf.confirmed.n == 0
+    assert [entry[0] for entry in conf.chain] == [chain.genesisblk, b1, b2]
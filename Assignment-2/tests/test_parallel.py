@@ -0,0 +1,14 @@
+from main import P2PSimulation, Transaction
+from parallel import ParallelSimulation
+
+ARGS = (20, 50, 400, 25, 20, 80)
+
+
+def test_shards_make_as_many_tx(monkeypatch, tmp_path):
+    monkeypatch.chdir(tmp_path)
+    seq = P2PSimulation(*ARGS, seed=1)
+    seq.run()
+    par = ParallelSimulation(P2PSimulation, Transaction, 2, *ARGS, seed=1)
+    par.run()
+    assert abs(par.ntx - seq.ntx) < 0.1 * seq.ntx      # receivers in other shards get their balance too
+    assert par.messages and par.critical <= par.cpu
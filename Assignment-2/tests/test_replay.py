@@ -0,0 +1,65 @@
+import numpy as np
+import pytest
+
+from checkpoint import Checkpointer, indices
+from main import P2PSimulation, Peer, Transaction
+from replay import Recorder, Replay
+from simulation import NullScheduler
+
+ARGS = (20, 50, 400, 25, 20, 40)
+
+
+def trees(sim):
+    """
+    Block tree of every peer as (block, parent, arrival time, Tx), with numeric IDs since hashes differ between runs.
+    """
+    blocks = sim.network.store.blocks
+    num = lambda blkid: blocks[blkid].num if blkid in blocks else None
+    return [sorted((num(b), num(blocks[b].plink), t, [tx.num for tx in blocks[b].Txlist]) for b, t in peer.localchain.blktime.items())
+            for peer in sim.network.all_peers]
+
+
+@pytest.mark.parametrize('analytic', [False, True])
+def test_replay_rebuilds_the_trees(tmp_path, analytic):
+    path = str(tmp_path / 'events')
+    live = P2PSimulation(*ARGS, seed=3, txprop=analytic)
+    live.record = Recorder(path, {})
+    live.run()
+    live.record.close()
+    sim = P2PSimulation(*ARGS, seed=3, txprop=analytic, queue=NullScheduler())
+    sim.replay = Replay(path, sim.network.all_peers, dict(enumerate(sim.handlers)), sim.tick)
+    sim.replay.run()
+    assert sim.ntx == live.ntx
+    assert trees(sim) == trees(live)
+    if analytic:                                        # same arrival times, so later blocks pick the same Tx
+        txs = {tx.num: tx for tx in live.UTX}
+        txs.update((tx.num, tx) for blk in live.network.store.blocks.values() for tx in blk.Txlist)
+        assert all(np.array_equal(sim.replay.txs[num].arrival, tx.arrival) for num, tx in txs.items())
+
+
+@pytest.mark.parametrize('analytic', [False, True])
+def test_replay_resumed_from_a_checkpoint(tmp_path, analytic):
+    path = str(tmp_path / 'events')
+    directory = str(tmp_path / 'ckpt')
+    live = P2PSimulation(*ARGS, seed=3, txprop=analytic)
+    live.record = Recorder(path, {})
+    live.run(ckpt=Checkpointer(directory, Transaction, {'link': live.network.link, 'adj': live.network.adj}), every=800, args={})
+    live.record.close()
+    full = P2PSimulation(*ARGS, seed=3, txprop=analytic, queue=NullScheduler())
+    full.replay = Replay(path, full.network.all_peers, dict(enumerate(full.handlers)), full.tick)
+    full.replay.run()
+    saved = indices(directory)
+    assert len(saved) > 2
+    for k in (saved[1], saved[-1]):
+        state, _ = Checkpointer.restore(directory, k, Peer)
+        sim = state['sim']
+        assert 0 < sim.handled < len(full.replay.events)
+        sim.replayfrom(Replay(path, sim.network.all_peers, dict(enumerate(sim.handlers)), sim.tick, sim.handled))
+        sim.replay.run()
+        assert sim.replay.now == full.replay.now
+        assert sim.ntx == full.ntx
+        assert trees(sim) == trees(full)
+        assert sorted(tx.num for tx in sim.UTX) == sorted(tx.num for tx in full.UTX)
+        assert [p.balance for p in sim.network.all_peers] == [p.balance for p in full.network.all_peers]
+        if analytic:
+            assert all(np.array_equal(tx.arrival, full.replay.txs[num].arrival) for num, tx in sim.replay.txs.items())
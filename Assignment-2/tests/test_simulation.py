@@ -0,0 +1,40 @@
+import pytest
+
+from main import P2PSimulation
+from simulation import SCHEDULERS
+
+
+@pytest.mark.parametrize('kind', sorted(SCHEDULERS))
+def test_cancel_after_pop_is_ignored(kind):
+    queue = SCHEDULERS[kind]()
+    first = queue.push(1.0, 0, None)
+    second = queue.push(2.0, 0, None)
+    assert queue.pop()[1] == first
+    queue.cancel(first)                                 # already handled
+    assert len(queue) == 1
+    queue.cancel(second)
+    queue.cancel(second)                                # already cancelled
+    assert len(queue) == 0
+    assert queue.pop() is None
+    stats = queue.stats()
+    assert (stats['live'], stats['dead'], stats['cancelled']) == (0, 0, 1)
+
+
+@pytest.mark.parametrize('kind', sorted(SCHEDULERS))
+def test_cancelled_events_are_skipped(kind):
+    queue = SCHEDULERS[kind]()
+    handles = [queue.push(float(i), 0, None) for i in range(100)]
+    for h in handles[::3]:
+        queue.cancel(h)
+    popped = []
+    while len(queue):
+        popped.append(queue.pop()[1])
+    assert popped == [h for h in handles if h % 3]
+
+
+@pytest.mark.parametrize('kind', sorted(SCHEDULERS))
+def test_drain_forgets_dropped_mining(kind):
+    sim = P2PSimulation(20, 50, 400, 25, 20, 40, seed=1, queue=SCHEDULERS[kind]())
+    assert sim.run()
+    assert sim.queue.stats()['live'] == 0
+    assert all(peer.mining is None for peer in sim.network.all_peers)
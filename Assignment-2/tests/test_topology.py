@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from topology import generate, MIN_DEGREE, MAX_DEGREE
+
+
+def connected(adj):
+    seen = {0}
+    todo = [0]
+    while todo:
+        for v in adj[todo.pop()]:
+            if v not in seen:
+                seen.add(v)
+                todo.append(v)
+    return len(seen) == len(adj)
+
+
+@pytest.mark.parametrize('n', range(2, 13))
+def test_random_degrees_small_n(n):
+    for seed in range(300):
+        adj = generate('random', n, np.random.default_rng(seed))
+        deg = [len(a) for a in adj]
+        assert min(deg) >= min(MIN_DEGREE, n - 1), (seed, deg)
+        assert max(deg) <= min(MAX_DEGREE, n - 1), (seed, deg)
+        assert all(u not in adj[u] and all(u in adj[v] for v in adj[u]) for u in range(n))
+        assert connected(adj)
+
+
+def test_three_peers_is_a_triangle():
+    assert generate('random', 3, np.random.default_rng(193)) == [[1, 2], [0, 2], [0, 1]]
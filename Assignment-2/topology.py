@@ -0,0 +1,231 @@
+import numpy as np
+
+MIN_DEGREE = 3  # every peer connects to at least these many peers
+MAX_DEGREE = 6  # and at most these many
+
+
+def bounded_random(n, gen, dmin=MIN_DEGREE, dmax=MAX_DEGREE):
+    """
+    Random graph with degrees drawn uniformly from [dmin, dmax] using the configuration model.
+    Stubs are paired at random, self loops and repeated edges are dropped, peers left below dmin
+    are topped up with peers that still have room, and finally components are joined.
+    When n - 1 <= dmin the only such graph is the complete one.
+
+    Args:
+        n (int): Number of peers.
+        gen (numpy.random.Generator): Random generator.
+        dmin (int, optional): Minimum degree. Defaults to MIN_DEGREE.
+        dmax (int, optional): Maximum degree. Defaults to MAX_DEGREE.
+
+    Returns:
+        list: Set of neighbor IDs of every peer.
+    """
+    dmax = min(dmax, n - 1)
+    dmin = min(dmin, dmax)
+    if dmin == n - 1:
+        return [set(range(n)) - {u} for u in range(n)]
+    deg = gen.integers(dmin, dmax + 1, size=n)
+    stubs = np.repeat(np.arange(n), deg)
+    gen.shuffle(stubs)
+    adj = [set() for _ in range(n)]
+    for u, v in stubs[:len(stubs) // 2 * 2].reshape(-1, 2).tolist():
+        if u != v:
+            adj[u].add(v)
+            adj[v].add(u)
+    # Topping up peers that lost edges to self loops or repeats
+    room = [i for i in range(n) if len(adj[i]) < dmax]
+    for u in range(n):
+        tries = 0
+        while len(adj[u]) < dmin and room and tries < 4 * dmax:
+            tries += 1
+            v = room[gen.integers(len(room))]
+            if v != u and v not in adj[u] and len(adj[v]) < dmax:
+                adj[u].add(v)
+                adj[v].add(u)
+        if len(adj[u]) < dmin:
+            fill(adj, u, gen, dmin, dmax)
+    connect(adj, gen, dmax)
+    return adj
+
+
+def fill(adj, u, gen, dmin, dmax):
+    """
+    Brings a peer up to dmin when random picks did not, first through every peer that still has
+    room, then by splitting an edge (x,y) between two full peers into (u,x),(u,y), which leaves
+    their degrees as they were. Needs dmin < dmax, so u has room for both new edges.
+
+    Args:
+        adj (list): Set of neighbor IDs of every peer, changed in place.
+        u (int): The peer.
+        gen (numpy.random.Generator): Random generator.
+        dmin (int): Minimum degree.
+        dmax (int): Maximum degree.
+    """
+    n = len(adj)
+    for v in gen.permutation(n).tolist():
+        if len(adj[u]) >= dmin:
+            return
+        if v != u and v not in adj[u] and len(adj[v]) < dmax:
+            adj[u].add(v)
+            adj[v].add(u)
+    while len(adj[u]) < dmin:                           # every other peer is a neighbor or full
+        x = next(x for x in gen.permutation(n).tolist() if x != u and x not in adj[u])
+        y = next(y for y in adj[x] if y != u and y not in adj[u])   # x has dmax > deg(u) neighbors
+        adj[x].discard(y)
+        adj[y].discard(x)
+        adj[u].update((x, y))
+        adj[x].add(u)
+        adj[y].add(u)
+
+
+def small_world(n, gen, k=4, beta=0.1):
+    """
+    Watts-Strogatz small world graph: a ring where every peer links to its k nearest peers,
+    then every edge has its far end moved to a random peer with probability beta.
+
+    Args:
+        n (int): Number of peers.
+        gen (numpy.random.Generator): Random generator.
+        k (int, optional): Even number of ring neighbors. Defaults to 4.
+        beta (float, optional): Rewiring probability. Defaults to 0.1.
+
+    Returns:
+        list: Set of neighbor IDs of every peer.
+    """
+    k = min(k, n - 1) // 2 * 2
+    adj = [set() for _ in range(n)]
+    for u in range(n):
+        for j in range(1, k // 2 + 1):
+            v = (u + j) % n
+            adj[u].add(v)
+            adj[v].add(u)
+    rewire = gen.random(n * (k // 2)) < beta
+    targets = gen.integers(n, size=n * (k // 2))
+    e = 0
+    for u in range(n):
+        for j in range(1, k // 2 + 1):
+            v = (u + j) % n
+            w = int(targets[e])
+            if rewire[e] and w != u and w not in adj[u] and len(adj[v]) > 1:
+                adj[u].discard(v)
+                adj[v].discard(u)
+                adj[u].add(w)
+                adj[w].add(u)
+            e += 1
+    connect(adj, gen, n)
+    return adj
+
+
+def scale_free(n, gen, m=3):
+    """
+    Barabasi-Albert scale free graph: peers join one by one and link to m existing peers
+    picked with probability proportional to their degree.
+
+    Args:
+        n (int): Number of peers.
+        gen (numpy.random.Generator): Random generator.
+        m (int, optional): Links made by each new peer. Defaults to 3.
+
+    Returns:
+        list: Set of neighbor IDs of every peer.
+    """
+    m = max(1, min(m, n - 1))
+    adj = [set() for _ in range(n)]
+    for u in range(m + 1):                              # start from a small clique
+        for v in range(u):
+            adj[u].add(v)
+            adj[v].add(u)
+    ends = [u for u in range(m + 1) for _ in range(m)]  # every peer appears once per edge end
+    for u in range(m + 1, n):
+        picked = set()
+        while len(picked) < m:
+            picked.add(ends[gen.integers(len(ends))])
+        for v in picked:
+            adj[u].add(v)
+            adj[v].add(u)
+            ends.append(v)
+        ends.extend([u] * m)
+    return adj
+
+
+def connect(adj, gen, dmax):
+    """
+    Joins all components into one using union-find, in near linear time.
+    Components are linked through peers that still have room, if a component has none an edge
+    from each side is swapped so degrees stay the same.
+
+    Args:
+        adj (list): Set of neighbor IDs of every peer, changed in place.
+        gen (numpy.random.Generator): Random generator.
+        dmax (int): Maximum degree.
+    """
+    n = len(adj)
+    while True:
+        parent = list(range(n))
+
+        def find(x):
+            while parent[x] != x:
+                parent[x] = parent[parent[x]]
+                x = parent[x]
+            return x
+
+        for u in range(n):
+            for v in adj[u]:
+                ru, rv = find(u), find(v)
+                if ru != rv:
+                    parent[ru] = rv
+        comps = {}
+        for u in range(n):
+            comps.setdefault(find(u), []).append(u)
+        if len(comps) <= 1:
+            return
+        comps = list(comps.values())
+        for a, b in zip(comps, comps[1:]):
+            ua = [u for u in a if len(adj[u]) < dmax]
+            ub = [v for v in b if len(adj[v]) < dmax]
+            if ua and ub:
+                u = ua[gen.integers(len(ua))]
+                v = ub[gen.integers(len(ub))]
+                adj[u].add(v)
+                adj[v].add(u)
+                continue
+            # No room on one side, swap (u,x),(v,y) for (u,v),(x,y)
+            u = a[gen.integers(len(a))]
+            v = b[gen.integers(len(b))]
+            if not adj[u] or not adj[v]:
+                continue
+            x = next(iter(adj[u]))
+            y = next(iter(adj[v]))
+            if x in adj[y]:
+                continue
+            adj[u].discard(x)
+            adj[x].discard(u)
+            adj[v].discard(y)
+            adj[y].discard(v)
+            adj[u].add(v)
+            adj[v].add(u)
+            adj[x].add(y)
+            adj[y].add(x)
+
+
+TOPOLOGIES = {
+    'random': bounded_random,
+    'smallworld': small_world,
+    'scalefree': scale_free,
+}
+
+
+def generate(kind, n, gen):
+    """
+    Builds a topology by name.
+
+    Args:
+        kind (str): One of TOPOLOGIES.
+        n (int): Number of peers.
+        gen (numpy.random.Generator): Random generator.
+
+    Returns:
+        list: Sorted neighbor IDs of every peer.
+    """
+    adj = TOPOLOGIES[kind](n, gen)
+    return [sorted(a) for a in adj]
@@ -0,0 +1,87 @@
+import heapq
+import numpy as np
+
+
+class TxPropagation:
+    """
+    Arrival time of a Tx at every peer without flooding it hop by hop.
+    For each source the shortest path tree over the expected Tx delay of every link (propagation,
+    transmission and mean queuing delay) is computed once and cached. A Tx then reaches each peer
+    along its tree path, with a fresh queuing delay drawn for every tree edge in one vectorized
+    call and summed level by level down the tree.
+
+    Attributes:
+        link (LinkModel): Delay tables of the network.
+        gen (numpy.random.Generator): Generator for the queuing delays.
+        trees (dict): Cached (parent, edge, levels) of every source seen so far.
+    """
+
+    def __init__(self, link, gen):
+        """
+        Initializes an empty cache.
+
+        Args:
+            link (LinkModel): Delay tables of the network.
+            gen (numpy.random.Generator): Generator for the queuing delays.
+        """
+        self.link = link
+        self.gen = gen
+        self.n = len(link.indptr) - 1
+        self.weight = (link.txdelay + link.qmean).tolist()
+        self.trees = {}
+
+    def tree(self, src):
+        """
+        Shortest path tree of a source by Dijkstra, cached.
+
+        Args:
+            src (int): Source peer ID.
+
+        Returns:
+            tuple: Parent of every peer, edge from the parent to every peer and the peers at every depth, as arrays.
+        """
+        if src in self.trees:
+            return self.trees[src]
+        indptr = self.link.indptr.tolist()
+        indices = self.link.indices.tolist()
+        weight = self.weight
+        dist = [float('inf')] * self.n
+        parent = [src] * self.n
+        edge = [0] * self.n
+        depth = [0] * self.n
+        dist[src] = 0.0
+        heap = [(0.0, src)]
+        while heap:
+            d, u = heapq.heappop(heap)
+            if d > dist[u]:
+                continue
+            for e in range(indptr[u], indptr[u + 1]):
+                v = indices[e]
+                nd = d + weight[e]
+                if nd < dist[v]:
+                    dist[v] = nd
+                    parent[v] = u
+                    edge[v] = e
+                    depth[v] = depth[u] + 1
+                    heapq.heappush(heap, (nd, v))
+        depth = np.array(depth)
+        levels = [np.flatnonzero(depth == k) for k in range(1, int(depth.max()) + 1)]
+        self.trees[src] = (np.array(parent), np.array(edge), levels)
+        return self.trees[src]
+
+    def arrivals(self, src):
+        """
+        Delay until a new Tx of a source reaches every peer.
+
+        Args:
+            src (int): Source peer ID.
+
+        Returns:
+            numpy.ndarray: float32 delay for every peer, 0 at the source.
+        """
+        parent, edge, levels = self.tree(src)
+        w = self.link.txdelay[edge] + self.gen.standard_exponential(self.n) * self.link.qmean[edge]
+        arr = np.zeros(self.n)
+        for level in levels:                                # parents are one level up, already done
+            arr[level] = arr[parent[level]] + w[level]
+        return arr.astype(np.float32)
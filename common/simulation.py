@@ -0,0 +1,415 @@
+# Event loop shared by Assignment-1 and Assignment-2, their main.py put this folder on sys.path.
+import heapq
+
+# Event opcodes
+GEN_TX = 1          # genrate txn
+RECV_TX = 2         # send txn
+START_MINING = 3    # genrate blk
+SEND_BLK = 4        # send blk
+MINED_BLK = 5       # check blockhash with longest chain before addding block
+RECV_BLK = 6        # updating block chain of a peer
+MINED_PRIVATE = 7   # genrating new block for attacker add_block_attacker
+MINE_RACE = 8       # someone in the network found a block, see race.py
+NUM_OPCODES = 9
+OPNAMES = {GEN_TX: 'GEN_TX', RECV_TX: 'RECV_TX', START_MINING: 'START_MINING', SEND_BLK: 'SEND_BLK', MINED_BLK: 'MINED_BLK',
+           RECV_BLK: 'RECV_BLK', MINED_PRIVATE: 'MINED_PRIVATE', MINE_RACE: 'MINE_RACE'}
+
+
+class Scheduler:
+    """
+    Interface of the event queues the Simulation can run on.
+    Events are flat tuples (timestamp, counter, opcode, peer, msg, extra) popped in (timestamp, counter)
+    order, the counter keeps insertion order among equal timestamps so the rest of the tuple is never
+    compared, and every backend pops the same events in the same order.
+    The counter of an event is also its handle for cancel. Cancelled events stay queued and are
+    skipped when they come up, the queue is rebuilt without them once they are the majority.
+    Only handles of queued events count, cancelling an event already popped or cancelled does nothing.
+
+    Attributes:
+        counter (int): Counter for maintaining the insertion order of elements.
+        size (int): Queued events, cancelled ones included.
+        live (set): Handles of queued events that are not cancelled.
+        ncancelled (int): Events cancelled over the whole run.
+        peak (int): Largest queue size seen.
+    """
+    def __init__(self):
+        """
+        Initializes the bookkeeping shared by all backends.
+        """
+        self.counter = 0
+        self.size = 0
+        self.live = set()
+        self.ncancelled = 0
+        self.peak = 0
+
+    def __len__(self):
+        return len(self.live)
+
+    def push(self, timestamp, op, peer, msg=None, extra=None):
+        """
+        Pushes an event into the queue with a specified timestamp.
+
+        Args:
+            timestamp (float): Time at which the event happens.
+            op (int): Event opcode.
+            peer (Peer): Peer handling the event.
+            msg (optional): Block or Tx of the event. Defaults to None.
+            extra (optional): Anything else the handler needs. Defaults to None.
+
+        Returns:
+            int: Handle to cancel the event.
+        """
+        raise NotImplementedError
+
+    def pop(self):
+        """
+        Pops the live event with the smallest timestamp.
+
+        Returns:
+            tuple: (timestamp, counter, opcode, peer, msg, extra), None if no live event is left.
+        """
+        raise NotImplementedError
+
+    def peek(self):
+        """
+        Timestamp of the next live event without removing it.
+
+        Returns:
+            float: Timestamp, None if no live event is left.
+        """
+        raise NotImplementedError
+
+    def compact(self):
+        """
+        Drops all cancelled events.
+        """
+        raise NotImplementedError
+
+    def events(self):
+        """
+        Live events in no particular order, without removing them.
+
+        Returns:
+            list: Event tuples (timestamp, counter, opcode, peer, msg, extra).
+        """
+        raise NotImplementedError
+
+    def cancel(self, handle):
+        """
+        Cancels a pending event.
+
+        Args:
+            handle (int): Handle returned by push.
+        """
+        if handle not in self.live:                     # already handled, dropped or cancelled
+            return
+        self.live.remove(handle)
+        self.ncancelled += 1
+        if len(self.live) * 2 < self.size:              # mostly dead, drop them in one pass
+            self.compact()
+
+    def stats(self):
+        """
+        Live and dead event counts.
+
+        Returns:
+            dict: live and dead events queued, fraction of dead ones, events pushed and cancelled in total and peak queue size.
+        """
+        size = self.size
+        dead = size - len(self.live)
+        return {'live': size - dead, 'dead': dead, 'deadfrac': dead / size if size else 0.0,
+                'pushed': self.counter, 'cancelled': self.ncancelled, 'peak': self.peak}
+
+
+class TimedPriorityQueue(Scheduler):
+    """
+    Priority queue implementation based on timestamps, a binary heap of event tuples.
+    Push and pop cost O(log n).
+
+    Attributes:
+        heap (list): List representing the priority queue.
+    """
+    def __init__(self):
+        """
+        Initializes a new TimedPriorityQueue object.
+        """
+        super().__init__()
+        self.heap = []
+
+    def push(self, timestamp, op, peer, msg=None, extra=None):
+        handle = self.counter
+        heapq.heappush(self.heap, (timestamp, handle, op, peer, msg, extra))
+        self.live.add(handle)
+        self.counter += 1
+        self.size += 1
+        if self.size > self.peak:
+            self.peak = self.size
+        return handle
+
+    def pop(self):
+        if self.peek() is None:
+            return None
+        self.size -= 1
+        entry = heapq.heappop(self.heap)
+        self.live.remove(entry[1])
+        return entry
+
+    def peek(self):
+        heap = self.heap
+        live = self.live
+        while heap and heap[0][1] not in live:
+            heapq.heappop(heap)
+            self.size -= 1
+        return heap[0][0] if heap else None
+
+    def compact(self):
+        live = self.live
+        self.heap = [e for e in self.heap if e[1] in live]
+        heapq.heapify(self.heap)
+        self.size = len(self.heap)
+
+    def events(self):
+        live = self.live
+        return [e for e in self.heap if e[1] in live]
+
+
+class CalendarQueue(Scheduler):
+    """
+    Calendar queue (Brown, 1988): time is cut into days of equal width and day d goes into bucket
+    d mod nbuckets, like a year of a desk calendar. Each bucket is a small heap, so pop reads the
+    bucket of the current day and moves on to the next day once it holds nothing for today.
+    With a width close to the gap between consecutive events push and pop are amortized O(1).
+    The number of buckets doubles or halves with the queue size and the width is then re-estimated
+    from the gaps between the earliest events.
+
+    Attributes:
+        buckets (list): Heap of events for every bucket.
+        width (float): Length of a day.
+        day (int): Day of the last popped event, no live event is earlier.
+    """
+    MIN_BUCKETS = 16        # never shrink below this
+    SAMPLE = 32             # earliest events used to estimate the day width
+
+    def __init__(self, nbuckets=MIN_BUCKETS, width=1.0):
+        """
+        Initializes an empty calendar.
+
+        Args:
+            nbuckets (int, optional): Initial number of buckets, a power of two. Defaults to MIN_BUCKETS.
+            width (float, optional): Initial day width. Defaults to 1.0.
+        """
+        super().__init__()
+        self.buckets = [[] for _ in range(nbuckets)]
+        self.mask = nbuckets - 1
+        self.width = width
+        self.day = 0
+
+    def push(self, timestamp, op, peer, msg=None, extra=None):
+        handle = self.counter
+        day = int(timestamp / self.width)
+        heapq.heappush(self.buckets[day & self.mask], (timestamp, handle, op, peer, msg, extra))
+        self.live.add(handle)
+        if day < self.day:
+            self.day = day
+        self.counter += 1
+        self.size += 1
+        if self.size > self.peak:
+            self.peak = self.size
+        if self.size > self.mask * 2 + 2:                   # more than two events per bucket
+            self.resize(2 * len(self.buckets))
+        return handle
+
+    def find(self):
+        """
+        Bucket holding the next live event, dropping cancelled events on the way.
+
+        Returns:
+            list: The bucket, None if no live event is left.
+        """
+        buckets = self.buckets
+        mask = self.mask
+        width = self.width
+        live = self.live
+        while live:
+            day = self.day
+            for _ in range(len(buckets)):
+                b = buckets[day & mask]
+                while b and b[0][1] not in live:
+                    heapq.heappop(b)
+                    self.size -= 1
+                if b and int(b[0][0] / width) <= day:
+                    self.day = day
+                    return b
+                day += 1
+            # Nothing within a year, jump straight to the earliest event
+            first = min((b[0] for b in buckets if b), default=None)
+            if first is None:
+                break
+            self.day = int(first[0] / width)
+        return None
+
+    def pop(self):
+        b = self.buckets[self.day & self.mask]
+        if not b or int(b[0][0] / self.width) > self.day or b[0][1] not in self.live:      # nothing ready today, search
+            b = self.find()
+            if b is None:
+                return None
+        self.size -= 1
+        entry = heapq.heappop(b)
+        self.live.remove(entry[1])
+        if self.size <= self.mask // 2 and self.mask >= self.MIN_BUCKETS:       # less than half an event per bucket
+            self.resize(len(self.buckets) // 2)
+        return entry
+
+    def peek(self):
+        b = self.find()
+        return b[0][0] if b is not None else None
+
+    def compact(self):
+        self.resize(len(self.buckets))
+
+    def events(self):
+        live = self.live
+        return [e for b in self.buckets for e in b if e[1] in live]
+
+    def resize(self, nbuckets):
+        """
+        Redistributes all live events over a new number of buckets with a new day width.
+
+        Args:
+            nbuckets (int): New number of buckets, a power of two.
+        """
+        live = self.live
+        events = [e for b in self.buckets for e in b if e[1] in live]
+        self.size = len(events)
+        first = heapq.nsmallest(self.SAMPLE, events)
+        if len(first) > 1:
+            gaps = [b[0] - a[0] for a, b in zip(first, first[1:])]
+            mean = sum(gaps) / len(gaps)
+            near = [g for g in gaps if g <= 2 * mean]         # ignore the odd long gap
+            if sum(near) > 0:
+                self.width = 3 * sum(near) / len(near)
+        self.buckets = [[] for _ in range(nbuckets)]
+        self.mask = nbuckets - 1
+        width = self.width
+        for e in events:
+            self.buckets[int(e[0] / width) & self.mask].append(e)
+        for b in self.buckets:
+            heapq.heapify(b)
+        self.day = int(first[0][0] / width) if first else 0
+
+
+class NullScheduler(Scheduler):
+    """
+    Scheduler that drops every event, for replays where the events come from a recording.
+    """
+    def push(self, timestamp, op, peer, msg=None, extra=None):
+        self.counter += 1
+        return self.counter - 1
+
+    def pop(self):
+        return None
+
+    def peek(self):
+        return None
+
+    def cancel(self, handle):
+        pass
+
+    def compact(self):
+        pass
+
+    def events(self):
+        return []
+
+
+SCHEDULERS = {
+    'heap': TimedPriorityQueue,
+    'calendar': CalendarQueue,
+}
+
+
+class Simulation:
+    """
+    Discrete event loop that hands every event to the handler registered for its opcode.
+
+    Attributes:
+        queue (Scheduler): Pending events.
+        handlers (list): Handler for every opcode, called as handler(timestamp, peer, msg, extra).
+        clock (callable): Called with the timestamp of every event before its handler.
+        record (callable): Called as record(timestamp, opcode, peer, msg) for every handled event, None to skip.
+        profiler (Profiler): Times every handler while set, None to run them as they are.
+        now (float): Time of the last processed event.
+        handled (int): Events handled so far, the index of the next one in a recording of the run.
+    """
+
+    def __init__(self, queue, handlers, clock=None):
+        """
+        Initializes the loop.
+
+        Args:
+            queue (Scheduler): Pending events.
+            handlers (dict): Mapping of opcodes to handlers.
+            clock (callable, optional): Called with the timestamp of every event. Defaults to None.
+        """
+        self.queue = queue
+        self.handlers = [handlers.get(op) for op in range(NUM_OPCODES)]
+        self.clock = clock
+        self.record = None
+        self.profiler = None
+        self.now = 0
+        self.handled = 0
+
+    def run(self, limit=None, counted=(), only=None, until=None, dropped=None):
+        """
+        Processes events in time order till the queue is empty or a stop condition is met.
+
+        Args:
+            limit (int, optional): Stop after these many events with an opcode in counted. Defaults to None.
+            counted (tuple, optional): Opcodes counted towards limit. Defaults to ().
+            only (tuple, optional): Process only these opcodes and drop the rest. Defaults to all.
+            until (float, optional): Stop before the first event later than this time. Defaults to None.
+            dropped (callable, optional): Called with the event tuple of every event only drops. Defaults to None.
+
+        Returns:
+            int: Number of counted events processed.
+        """
+        queue = self.queue
+        pop = queue.pop
+        handlers = self.handlers
+        if only is not None:
+            handlers = [h if op in only else None for op, h in enumerate(handlers)]
+        if self.profiler is not None:
+            handlers = self.profiler.handlers(handlers)
+        counted = [op in counted for op in range(NUM_OPCODES)]
+        clock = self.clock
+        record = self.record
+        count = 0
+        handled = 0
+        while True:
+            if until is not None:
+                t = queue.peek()
+                if t is None or t > until:
+                    break
+            entry = pop()
+            if entry is None:
+                break
+            ts, _, op, peer, msg, extra = entry
+            handler = handlers[op]
+            if handler is None:
+                if dropped is not None:
+                    dropped(entry)
+                continue
+            self.now = ts
+            if clock is not None:
+                clock(ts)
+            if record is not None:
+                record(ts, op, peer, msg)
+            handler(ts, peer, msg, extra)
+            handled += 1
+            if counted[op]:
+                count += 1
+                if count == limit:                  #stopping simulation after genrating certain no of blocks
+                    break
+        self.handled += handled
+        return count